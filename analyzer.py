@@ -3,9 +3,18 @@
 使用本地LLM对爬取的数据进行分析
 """
 
-from typing import Dict, Any
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterator, List, Optional, Sequence, Tuple
 from loguru import logger
 from local_llm import LocalLLMClient
+from context_packer import get_context_packer
+from metrics import traced
+from report_sections import INSIGHT_SECTIONS
+
+# 生成失败时分析结果以该前缀开头，调用方据此区分失败
+ANALYSIS_ERROR_PREFIX = "分析过程中发生错误"
 
 class Analyzer:
     """数据分析器"""
@@ -18,21 +27,272 @@ class Analyzer:
             llm_client: 本地LLM客户端
         """
         self.llm_client = llm_client
+        self.config = llm_client.config
         logger.info("数据分析器初始化完成")
     
-    def analyze(self, topic: str, crawled_content: str) -> str:
+    @traced("analyze")
+    def analyze(self, topic: str, crawled_content: str,
+                crawled_data: Optional[List[Dict[str, Any]]] = None) -> str:
         """
         分析指定主题的爬取内容
         
         Args:
             topic: 分析的主题
             crawled_content: 爬取的内容
+            crawled_data: 爬取到的原始数据列表，提供时内容过长会分段摘要后再分析
             
         Returns:
             分析结果
         """
         logger.info(f"开始分析主题: {topic}")
         
+        crawled_content = self._prepare_content(
+            topic, crawled_content, crawled_data, lambda content: self._build_messages(topic, content),
+            sections=self._output_sections()
+        )
+        messages = self._build_messages(topic, crawled_content)
+        
+        # 调用本地LLM进行分析
+        response = self.llm_client.chat_completion(messages, sections=self._output_sections())
+        
+        if response["choices"][0]["finish_reason"] == "error":
+            error_msg = response["choices"][0]["message"]["content"]
+            logger.error(f"分析过程中发生错误: {error_msg}")
+            return f"{ANALYSIS_ERROR_PREFIX}: {error_msg}"
+        
+        analysis_result = response["choices"][0]["message"]["content"]
+        logger.info(f"主题分析完成: {topic}")
+        
+        return analysis_result
+    
+    def analyze_stream(self, topic: str, crawled_content: str,
+                       crawled_data: Optional[List[Dict[str, Any]]] = None,
+                       stop_event: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        流式分析指定主题的爬取内容
+        
+        Args:
+            topic: 分析的主题
+            crawled_content: 爬取的内容
+            crawled_data: 爬取到的原始数据列表，提供时内容过长会分段摘要后再分析
+            stop_event: 可选的停止事件，设置后中止生成
+            
+        Yields:
+            分析结果的文本片段
+        """
+        logger.info(f"开始流式分析主题: {topic}")
+        
+        try:
+            crawled_content = self._prepare_content(
+                topic, crawled_content, crawled_data, lambda content: self._build_messages(topic, content),
+                sections=self._output_sections()
+            )
+            messages = self._build_messages(topic, crawled_content)
+            for text in self.llm_client.stream_chat_completion(
+                messages, stop_event=stop_event, sections=self._output_sections()
+            ):
+                yield text
+        except Exception as e:
+            logger.error(f"分析过程中发生错误: {e}")
+            yield f"{ANALYSIS_ERROR_PREFIX}: {e}"
+            return
+        
+        logger.info(f"主题分析完成: {topic}")
+    
+    @traced("analyze")
+    def update(self, topic: str, previous_insight: str, delta_content: str,
+               delta_data: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        基于上一次的分析结果和新增内容增量更新分析，生成成本只与新增内容相关
+        
+        Args:
+            topic: 分析的主题
+            previous_insight: 上一次的分析结果
+            delta_content: 新增的爬取内容
+            delta_data: 新增的原始数据列表，提供时内容过长会分段摘要后再分析
+            
+        Returns:
+            更新后的分析结果
+        """
+        logger.info(f"开始增量分析主题: {topic}")
+        
+        delta_content = self._prepare_content(
+            topic, delta_content, delta_data,
+            lambda content: self._build_update_messages(topic, previous_insight, content),
+            sections=self._output_sections()
+        )
+        messages = self._build_update_messages(topic, previous_insight, delta_content)
+        response = self.llm_client.chat_completion(messages, sections=self._output_sections())
+        
+        if response["choices"][0]["finish_reason"] == "error":
+            error_msg = response["choices"][0]["message"]["content"]
+            logger.error(f"增量分析过程中发生错误: {error_msg}")
+            return f"{ANALYSIS_ERROR_PREFIX}: {error_msg}"
+        
+        logger.info(f"主题增量分析完成: {topic}")
+        return response["choices"][0]["message"]["content"]
+    
+    def _output_sections(self) -> Optional[Tuple[str, ...]]:
+        """开启结构化输出时返回分析结果的小节标题，用于约束解码"""
+        return INSIGHT_SECTIONS if self.config.LLM_STRUCTURED_OUTPUT else None
+    
+    def _prepare_content(self, topic: str, crawled_content: str,
+                         crawled_data: Optional[List[Dict[str, Any]]],
+                         build_messages: Callable[[str], List[Dict[str, str]]],
+                         max_new_tokens: Optional[int] = None,
+                         sections: Optional[Sequence[str]] = None) -> str:
+        """
+        将爬取内容整理为可以完整放入prompt的文本：优先在token预算内挑选内容，
+        挑选会丢弃过多内容（或未启用上下文打包且内容过长）时分段摘要
+        
+        Args:
+            topic: 分析的主题
+            crawled_content: 格式化后的爬取内容
+            crawled_data: 爬取到的原始数据列表，为None时原样使用格式化内容
+            build_messages: 由爬取内容构造消息列表的函数，用于计算提示词本身的开销
+            max_new_tokens: 最大生成token数，None表示使用配置值
+            sections: 约束解码的小节标题，追加在prompt末尾的第一个小节标题计入提示词开销
+            
+        Returns:
+            放入prompt的爬取内容
+        """
+        if self.config.CONTEXT_PACKING_ENABLED and crawled_data:
+            # 先在token预算内挑选内容，丢弃比例过高时才分段摘要，保留全部内容的信息
+            packer = get_context_packer(self.llm_client)
+            packed, selected = packer.pack_with_count(
+                crawled_data, packer.budget(build_messages(""), max_new_tokens, sections)
+            )
+            dropped = 1 - selected / len(crawled_data)
+            if not self.config.ANALYZER_MAP_REDUCE_ENABLED or dropped <= self.config.ANALYZER_MAX_DROP_RATIO:
+                return packed
+            logger.info(f"上下文打包将丢弃 {dropped:.0%} 的爬取内容，改为分段摘要")
+            return self._map_reduce_content(topic, crawled_data)
+        if self._needs_map_reduce(crawled_content, crawled_data):
+            return self._map_reduce_content(topic, crawled_data)
+        return crawled_content
+    
+    def _needs_map_reduce(self, crawled_content: str,
+                          crawled_data: Optional[List[Dict[str, Any]]]) -> bool:
+        """
+        判断爬取内容是否超出单段token预算，需要分段分析
+        
+        Args:
+            crawled_content: 格式化后的爬取内容
+            crawled_data: 爬取到的原始数据列表
+            
+        Returns:
+            是否需要分段分析
+        """
+        if not self.config.ANALYZER_MAP_REDUCE_ENABLED or not crawled_data:
+            return False
+        return self.llm_client.count_tokens(crawled_content) > self.config.ANALYZER_CHUNK_TOKENS
+    
+    def _map_reduce_content(self, topic: str, crawled_data: List[Dict[str, Any]]) -> str:
+        """
+        将爬取内容按token预算分段摘要，摘要仍超出预算时逐层合并，直到能放入一段
+        
+        Args:
+            topic: 分析的主题
+            crawled_data: 爬取到的原始数据列表
+            
+        Returns:
+            可放入单段的汇总内容
+        """
+        texts = [
+            f"内容: {item.get('content', '')}  点赞: {item.get('likes', 0)}  评论: {item.get('comments', 0)}"
+            for item in crawled_data
+        ]
+        
+        level = 1
+        chunks = self._chunk_texts(texts)
+        while True:
+            logger.info(f"第 {level} 轮分段摘要: {len(texts)} 条内容分为 {len(chunks)} 段")
+            summaries = self._summarize_chunks(topic, chunks)
+            texts = [f"片段摘要{i}: {summary}" for i, summary in enumerate(summaries, 1)]
+            merged = "\n".join(texts)
+            if self.llm_client.count_tokens(merged) <= self.config.ANALYZER_CHUNK_TOKENS:
+                break
+            
+            # 摘要仍超出预算时继续合并，无法再减少段数时停止
+            chunks = self._chunk_texts(texts)
+            if len(chunks) >= len(texts):
+                logger.warning("分段摘要无法继续合并，汇总内容可能被截断")
+                break
+            level += 1
+        
+        return f"网络爬取结果（共 {len(crawled_data)} 条，已分段摘要）:\n{merged}"
+    
+    def _chunk_texts(self, texts: List[str]) -> List[List[str]]:
+        """
+        按token预算将文本顺序分段
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            分段后的文本列表
+        """
+        budget = self.config.ANALYZER_CHUNK_TOKENS
+        chunks: List[List[str]] = []
+        current: List[str] = []
+        current_tokens = 0
+        for text in texts:
+            tokens = self.llm_client.count_tokens(text) + 1
+            if current and current_tokens + tokens > budget:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def _summarize_chunks(self, topic: str, chunks: List[List[str]]) -> List[str]:
+        """
+        并发摘要各分段，并发请求由LLM客户端的批量调度器合并生成
+        
+        Args:
+            topic: 分析的主题
+            chunks: 分段后的文本列表
+            
+        Returns:
+            各分段的摘要
+        """
+        def summarize(chunk: List[str]) -> str:
+            messages = [
+                {
+                    "role": "system",
+                    "content": "你是一位专业的舆情分析师，请简明扼要地概括提供的网络内容片段，只基于提供内容，不要添加任何额外信息。"
+                },
+                {
+                    "role": "user",
+                    "content": f"请概括以下关于'{topic}'的部分网络内容中的主要观点和公众情绪:\n\n" + "\n".join(chunk) + "\n\n请用中文回答，不超过100字。只输出概括内容。"
+                }
+            ]
+            response = self.llm_client.chat_completion(
+                messages, max_new_tokens=self.config.ANALYZER_CHUNK_SUMMARY_TOKENS
+            )
+            if response["choices"][0]["finish_reason"] == "error":
+                raise RuntimeError(response["choices"][0]["message"]["content"])
+            return response["choices"][0]["message"]["content"].strip()
+        
+        workers = max(1, min(len(chunks), self.config.LLM_BATCH_SIZE))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyzer-map") as executor:
+            # 每个任务复制一份上下文，使分段摘要的生成耗时计入当前请求的追踪
+            futures = [executor.submit(contextvars.copy_context().run, summarize, chunk) for chunk in chunks]
+            return [future.result() for future in futures]
+    
+    def _build_messages(self, topic: str, crawled_content: str) -> List[Dict[str, str]]:
+        """
+        构造分析提示词
+        
+        Args:
+            topic: 分析的主题
+            crawled_content: 爬取的内容
+            
+        Returns:
+            消息列表
+        """
         # 构造分析提示词，明确输出格式并严格限定范围
         messages = [
             {
@@ -51,15 +311,27 @@ class Analyzer:
             }
         ]
         
-        # 调用本地LLM进行分析
-        response = self.llm_client.chat_completion(messages)
-        
-        if response["choices"][0]["finish_reason"] == "error":
-            error_msg = response["choices"][0]["message"]["content"]
-            logger.error(f"分析过程中发生错误: {error_msg}")
-            return f"分析过程中发生错误: {error_msg}"
-        
-        analysis_result = response["choices"][0]["message"]["content"]
-        logger.info(f"主题分析完成: {topic}")
+        return messages
+    
+    def _build_update_messages(self, topic: str, previous_insight: str,
+                               delta_content: str) -> List[Dict[str, str]]:
+        """
+        构造增量分析提示词
         
-        return analysis_result
\ No newline at end of file
+        Args:
+            topic: 分析的主题
+            previous_insight: 上一次的分析结果
+            delta_content: 新增的爬取内容
+            
+        Returns:
+            消息列表
+        """
+        # 系统提示词与全量分析相同，可复用前缀KV缓存
+        messages = self._build_messages(topic, delta_content)
+        messages[1]["content"] = (
+            f"以下是此前对'{topic}'的分析结论:\n\n{previous_insight}\n\n"
+            f"此后新增的网络内容如下:\n\n{delta_content}\n\n"
+            "请结合新增内容更新此前的分析结论，保留仍然成立的观点，补充新的观点和情绪变化。"
+            "请用中文回答，按照指定格式输出，总字数不超过200字。只输出更新后的分析结果，不要包含任何其他内容。"
+        )
+        return messages
@@ -8,14 +8,19 @@
 
 import os
 import sys
+import json
+import time
 import argparse
 from loguru import logger
 
 from config import Settings
 from simple_crawler import SimpleCrawler
-from local_llm import LocalLLMClient
-from analyzer import Analyzer
-from reporter import Reporter
+from model_manager import get_model_manager
+from fused_pipeline import analyze_and_report
+from db import get_database
+from topic_monitor import get_topic_monitor
+from batch_runner import BatchRunner
+from sentiment import summarize_sentiment
 
 def setup_logging():
     """设置日志配置"""
@@ -37,27 +42,20 @@ def analyze_topic(topic: str, config: Settings):
     """
     logger.info(f"开始分析主题: {topic}")
     
-    # 初始化组件
-    crawler = SimpleCrawler()
-    llm_client = LocalLLMClient(config)
-    analyzer = Analyzer(llm_client)
-    reporter = Reporter(llm_client)
+    # 初始化组件，复用进程内驻留的模型
+    crawler = SimpleCrawler(config)
+    llm_client = get_model_manager(config).get_client()
     
     # 1. 网络爬虫阶段
     logger.info("启动网络爬虫...")
-    crawled_data = crawler.crawl_topic(topic)
+    crawled_data = crawler.crawl_topic(topic, config.CRAWLER_MAX_ITEMS)
     crawled_content = crawler.format_crawled_data(crawled_data)
     logger.info(f"网络爬虫完成，获取到 {len(crawled_data)} 条数据")
     
-    # 2. 分析阶段
-    logger.info("开始分析数据...")
-    analysis_result = analyzer.analyze(topic, crawled_content)
-    logger.info("数据分析完成")
-    
-    # 3. 生成报告阶段
-    logger.info("生成分析报告...")
-    report = reporter.generate(topic, crawled_content, analysis_result)
-    logger.info("报告生成完成")
+    # 2. 分析和生成报告阶段（开启合并生成时一次完成）
+    logger.info("开始分析数据并生成报告...")
+    analysis_result, report, _ = analyze_and_report(llm_client, topic, crawled_content, crawled_data)
+    logger.info("数据分析和报告生成完成")
     
     # 输出结果
     print("\n" + "="*50)
@@ -65,6 +63,14 @@ def analyze_topic(topic: str, config: Settings):
     print("="*50)
     print("\n[网络爬虫结果]")
     print(crawled_content)
+    if config.SENTIMENT_ENABLED and crawled_data:
+        sentiment = summarize_sentiment(crawled_data)
+        print(
+            f"\n[情感分布] 正面 {sentiment['ratios']['positive']:.0%}  "
+            f"中性 {sentiment['ratios']['neutral']:.0%}  "
+            f"负面 {sentiment['ratios']['negative']:.0%}  "
+            f"加权情感分 {sentiment['weighted_mean']:+.2f}"
+        )
     print("\n[分析结果]")
     print(analysis_result)
     print("\n[分析报告]")
@@ -73,11 +79,258 @@ def analyze_topic(topic: str, config: Settings):
     
     logger.info(f"主题 {topic} 分析完成")
 
+def print_monitor_result(result: dict):
+    """
+    输出一轮监控结果
+    
+    Args:
+        result: TopicMonitor.run_cycle 的返回值
+    """
+    print("\n" + "="*50)
+    print(f"监控主题: {result['topic']}  新内容: {result['new_items']}/{result['crawled_items']} 条")
+    print("="*50)
+    if not result['new_items']:
+        print("没有新内容，沿用上一次的分析结论。")
+        return
+    if result['error']:
+        print(f"本轮分析失败，新内容将在下一轮重新分析: {result['error']}")
+        return
+    print("\n[新增内容]")
+    print(result['crawled_content'])
+    print("\n[更新后的分析结果]" if result['incremental'] else "\n[分析结果]")
+    print(result['insight_result'])
+    print("\n[分析报告]")
+    print(result['report'])
+    print("="*50)
+
+def monitor_main(argv: list):
+    """
+    monitor 子命令：周期性增量监控主题
+    
+    Args:
+        argv: 子命令参数
+    """
+    parser = argparse.ArgumentParser(prog="app.py monitor", description="增量监控主题")
+    parser.add_argument("topics", nargs="*", help="要加入监控列表的主题，不指定时监控已有列表")
+    parser.add_argument("--interval", type=int, help="监控周期（秒）")
+    parser.add_argument("--remove", action="store_true", help="从监控列表中移除指定主题")
+    parser.add_argument("--list", action="store_true", help="列出监控主题")
+    parser.add_argument("--once", action="store_true", help="立即执行一轮后退出")
+    args = parser.parse_args(argv)
+    
+    config = Settings()
+    database = get_database()
+    
+    if args.remove:
+        for topic in args.topics:
+            database.delete_monitor(topic)
+            print(f"已移除监控主题: {topic}")
+        return
+    
+    for topic in args.topics:
+        database.save_monitor(topic, args.interval or config.MONITOR_DEFAULT_INTERVAL)
+    
+    if args.list:
+        for monitor in database.list_monitors():
+            print(f"{monitor['topic']}\t周期 {monitor['interval']}s\t上次执行 {monitor['last_run_at']}"
+                  f"\t新内容 {monitor['last_new_items']}\t下次执行 {monitor['next_run_at']}")
+        return
+    
+    model_manager = get_model_manager(config)
+    if config.LLM_EAGER_LOAD:
+        model_manager.start(background=False)
+    monitor = get_topic_monitor(config, database, model_manager.get_client)
+    
+    if args.once:
+        topics = args.topics or [item['topic'] for item in database.list_monitors()]
+        for topic in topics:
+            print_monitor_result(monitor.run_cycle(topic))
+        return
+    
+    logger.info("进入监控模式，按 Ctrl+C 退出")
+    try:
+        while True:
+            for result in monitor.run_pending():
+                print_monitor_result(result)
+            time.sleep(config.MONITOR_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print("\n\n监控已停止")
+
+def batch_main(argv: list):
+    """
+    batch 子命令：从文件或标准输入读取主题，以流水线方式批量分析
+    
+    Args:
+        argv: 子命令参数
+    """
+    parser = argparse.ArgumentParser(prog="app.py batch", description="批量分析主题")
+    parser.add_argument("input", nargs="?", default="-", help="主题文件，每行一个主题，'-' 表示标准输入")
+    parser.add_argument("-o", "--output", help="JSONL结果文件，不指定时输出到标准输出")
+    parser.add_argument("--crawl-workers", type=int, help="爬虫阶段线程数")
+    parser.add_argument("--llm-workers", type=int, help="分析阶段线程数")
+    args = parser.parse_args(argv)
+    
+    if args.input == "-":
+        topics = sys.stdin.read().splitlines()
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            topics = f.read().splitlines()
+    
+    config = Settings()
+    model_manager = get_model_manager(config)
+    model_manager.start(background=False)
+    runner = BatchRunner(
+        config, get_database(), model_manager.get_client(),
+        crawl_workers=args.crawl_workers, llm_workers=args.llm_workers
+    )
+    
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as output:
+            stats = runner.run(topics, output)
+    else:
+        stats = runner.run(topics, sys.stdout)
+    
+    print(
+        f"共 {stats['total']} 个主题，成功 {stats['succeeded']}，失败 {stats['failed']}；"
+        f"耗时 {stats['elapsed']}s，{stats['topics_per_min']} 主题/分钟，"
+        f"生成 {stats['completion_tokens']} tokens，{stats['tokens_per_sec']} tokens/s",
+        file=sys.stderr
+    )
+
+def bench_backends_main(argv: list):
+    """
+    bench-backends 子命令：在固定prompt上比较各推理后端
+    
+    Args:
+        argv: 子命令参数
+    """
+    from backend_benchmark import compare_backends
+    
+    parser = argparse.ArgumentParser(prog="app.py bench-backends", description="比较推理后端")
+    parser.add_argument("--backends", default="cpu-fp32,cpu-bf16,cpu-int8",
+                        help="逗号分隔的推理后端，第一个作为输出一致性基准")
+    parser.add_argument("--max-new-tokens", type=int, default=64, help="每次生成的最大token数")
+    parser.add_argument("--runs", type=int, default=2, help="每个prompt的生成次数")
+    parser.add_argument("-o", "--output", help="将结果保存为JSON文件")
+    args = parser.parse_args(argv)
+    
+    results = compare_backends(
+        Settings(), [name.strip() for name in args.backends.split(",") if name.strip()],
+        max_new_tokens=args.max_new_tokens, runs=args.runs
+    )
+    
+    print(f"{'后端':<10}{'dtype':<10}{'线程':>6}{'加载(s)':>10}{'权重(MB)':>12}{'tokens/s':>10}{'一致率':>8}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:<10}失败: {result['error']}")
+            continue
+        print(f"{result['backend']:<10}{result['dtype']:<10}{result['threads']:>6}{result['load_seconds']:>10}"
+              f"{result['memory_mb']:>12}{result['tokens_per_second']:>10}{result['output_match']:>8}")
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+def bench_pipeline_main(argv: list):
+    """
+    bench-pipeline 子命令：使用桩爬取服务器和模拟LLM测试端到端流水线
+    
+    Args:
+        argv: 子命令参数
+    """
+    from pipeline_benchmark import compare_results, run_pipeline_benchmark
+    
+    parser = argparse.ArgumentParser(prog="app.py bench-pipeline", description="端到端流水线基准测试")
+    parser.add_argument("--mode", choices=["cli", "web"], default="cli",
+                        help="cli 驱动 analyze_topic，web 驱动 /analyze 接口")
+    parser.add_argument("--topics", type=int, default=20, help="分析的主题数")
+    parser.add_argument("--clients", type=int, default=1, help="并发客户端数")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="模拟LLM每个生成token的耗时（秒）")
+    parser.add_argument("--prefill-latency", type=float, default=0.0002, help="模拟LLM每个prompt token的耗时（秒）")
+    parser.add_argument("--server-latency", type=float, default=0.0, help="桩服务器每个请求的延迟（秒）")
+    parser.add_argument("--pages", help="录制页面目录（包含 douyin.html 和 baidu.html）")
+    parser.add_argument("--fused", action="store_true", help="使用合并生成（一次生成分析结果和报告）")
+    parser.add_argument("--fused-failure-rate", type=float, default=0.0,
+                        help="模拟LLM合并生成输出无法拆分的比例（0~1），失败时退回两次调用")
+    parser.add_argument("--structured", action="store_true", help="分析和报告使用结构化约束解码")
+    parser.add_argument("--overrun-tokens", type=int, default=0,
+                        help="模拟LLM未约束解码时在最后一个小节之后继续输出的token数")
+    parser.add_argument("-o", "--output", help="将结果保存为JSON文件")
+    parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    args = parser.parse_args(argv)
+    
+    # 流水线的逐条日志会淹没结果，基准测试期间只输出警告
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    result = run_pipeline_benchmark(
+        mode=args.mode, topics=args.topics, clients=args.clients,
+        token_latency=args.token_latency, prefill_latency=args.prefill_latency,
+        server_latency=args.server_latency, pages_dir=args.pages, fused=args.fused,
+        fused_failure_rate=args.fused_failure_rate, structured=args.structured,
+        overrun_tokens=args.overrun_tokens
+    )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n与 {args.compare} 对比:")
+        for line in compare_results(result, baseline):
+            print(line)
+
+def bench_parser_main(argv: list):
+    """
+    bench-parser 子命令：比较BeautifulSoup与快速提取的页面解析耗时
+    
+    Args:
+        argv: 子命令参数
+    """
+    from parser_benchmark import compare_parsers
+    
+    parser = argparse.ArgumentParser(prog="app.py bench-parser", description="页面解析基准测试")
+    parser.add_argument("--pages", help="保存页面目录（包含 douyin.html 和 baidu.html），不指定时使用生成的页面")
+    parser.add_argument("--max-items", type=int, default=10, help="最大提取条数")
+    parser.add_argument("--repeat", type=int, default=50, help="每个页面的解析次数")
+    args = parser.parse_args(argv)
+    
+    results = compare_parsers(args.pages, max_items=args.max_items, repeat=args.repeat)
+    print(f"快速提取使用: {results['parser']}")
+    for name, result in results["sources"].items():
+        print(
+            f"{name:<8} 页面 {result['page_kb']} KB  BeautifulSoup {result['soup_ms']} ms  "
+            f"快速提取 {result['fast_ms']} ms  加速 {result['speedup']}x  "
+            f"内容一致: {'是' if result['same_content'] else '否'}"
+        )
+
 def main():
     """主函数"""
     setup_logging()
     
-    parser = argparse.ArgumentParser(description="简化版BettaFish舆情分析工具")
+    if len(sys.argv) > 1 and sys.argv[1] == "monitor":
+        monitor_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "bench-backends":
+        bench_backends_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "bench-pipeline":
+        bench_pipeline_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "bench-parser":
+        bench_parser_main(sys.argv[2:])
+        return
+    
+    parser = argparse.ArgumentParser(
+        description="简化版BettaFish舆情分析工具",
+        epilog="使用 'app.py monitor -h' 查看增量监控子命令，'app.py batch -h' 查看批量分析子命令，"
+               "'app.py bench-backends -h'、'app.py bench-pipeline -h' 和 'app.py bench-parser -h' 查看基准测试"
+    )
     parser.add_argument("topic", nargs="?", help="要分析的主题")
     parser.add_argument("--config", help="配置文件路径")
     
@@ -87,6 +340,10 @@ def main():
     config = Settings()
     logger.info("配置加载完成")
     
+    # 预加载并预热模型，交互模式下各主题共用同一个模型
+    if config.LLM_EAGER_LOAD:
+        get_model_manager(config).start(background=False)
+    
     if args.topic:
         # 直接分析指定主题
         analyze_topic(args.topic, config)
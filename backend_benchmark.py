@@ -0,0 +1,118 @@
+"""
+推理后端基准测试模块
+依次以各推理后端加载模型，在固定的prompt上比较加载耗时、权重内存、生成速度以及与基准后端输出的一致程度
+"""
+
+import copy
+import gc
+import time
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from config import Settings
+
+# 固定的测试prompt，覆盖洞察分析和报告生成两类典型请求
+BENCHMARK_PROMPTS = [
+    [
+        {"role": "system", "content": "你是一位专业的舆情分析师。"},
+        {"role": "user", "content": "请用三句话概括近期新能源汽车降价引发的讨论，包括主要观点和情感倾向。"}
+    ],
+    [
+        {"role": "system", "content": "你是一位专业的舆情报告撰写专家。"},
+        {"role": "user", "content": "请为主题“高校食堂涨价”写一份简短的舆情报告，包含热点话题、主要观点和建议。"}
+    ],
+    [
+        {"role": "system", "content": "你是一位专业的舆情分析师。"},
+        {"role": "user", "content": "网友评论：“服务态度很好，但价格有点贵。”请判断这条评论的情感倾向并说明理由。"}
+    ],
+]
+
+
+def benchmark_backend(config: Settings, backend: str, max_new_tokens: int,
+                      runs: int) -> Dict[str, Any]:
+    """
+    以指定后端加载模型并在固定prompt上测试生成速度
+
+    Args:
+        config: 配置对象
+        backend: 推理后端名
+        max_new_tokens: 每次生成的最大token数
+        runs: 每个prompt的生成次数
+
+    Returns:
+        后端信息及生成速度，outputs为各prompt的生成结果
+    """
+    from local_llm import LocalLLMClient
+
+    # 关闭缓存和批量调度，每次调用都完整生成
+    config = copy.copy(config)
+    config.LLM_BACKEND = backend
+    config.LLM_CACHE_ENABLED = False
+    config.LLM_BATCH_SIZE = 1
+    config.LLM_DO_SAMPLE = False
+
+    client = LocalLLMClient(config)
+    try:
+        client.warm_up()
+        completion_tokens = 0
+        elapsed = 0.0
+        latencies: List[float] = []
+        outputs: List[str] = []
+        for messages in BENCHMARK_PROMPTS:
+            for run in range(runs):
+                start_time = time.time()
+                response = client.chat_completion(messages, max_new_tokens=max_new_tokens)
+                latency = time.time() - start_time
+                latencies.append(latency)
+                elapsed += latency
+                completion_tokens += response["usage"]["completion_tokens"]
+                if run == 0:
+                    outputs.append(response["choices"][0]["message"]["content"])
+
+        result = dict(client.backend_info)
+        result.update({
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": round(completion_tokens / elapsed, 2) if elapsed else 0.0,
+            "mean_latency": round(sum(latencies) / len(latencies), 3),
+            "outputs": outputs
+        })
+        return result
+    finally:
+        del client
+        gc.collect()
+
+
+def compare_backends(config: Settings, backends: List[str], max_new_tokens: int = 64,
+                     runs: int = 2) -> List[Dict[str, Any]]:
+    """
+    比较多个推理后端，第一个成功的后端作为输出一致性的基准
+
+    Args:
+        config: 配置对象
+        backends: 推理后端名列表
+        max_new_tokens: 每次生成的最大token数
+        runs: 每个prompt的生成次数
+
+    Returns:
+        各后端的测试结果，失败的后端带有error字段
+    """
+    results = []
+    reference: Optional[List[str]] = None
+    for backend in backends:
+        logger.info(f"开始测试推理后端: {backend}")
+        try:
+            result = benchmark_backend(config, backend, max_new_tokens, runs)
+        except Exception as e:
+            logger.exception(f"推理后端 {backend} 测试失败: {e}")
+            results.append({"backend": backend, "error": str(e)})
+            continue
+
+        outputs = result.pop("outputs")
+        if reference is None:
+            reference = outputs
+        # 贪心解码下与基准后端输出完全相同的prompt占比，衡量量化/低精度带来的偏差
+        result["output_match"] = round(
+            sum(a == b for a, b in zip(outputs, reference)) / len(reference), 2
+        )
+        results.append(result)
+    return results
@@ -0,0 +1,226 @@
+"""
+批量主题分析模块
+以分阶段流水线批量分析主题：爬虫阶段与LLM分析阶段并行，阶段之间使用有界队列衔接，
+多个主题的LLM请求由批量调度器合并生成，结果写入SQLite和JSONL文件
+"""
+
+import json
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+from loguru import logger
+
+from config import Settings
+from analyzer import ANALYSIS_ERROR_PREFIX
+from db import SimpleDatabase
+from simple_crawler import SimpleCrawler
+from fused_pipeline import analyze_and_report
+from reporter import REPORT_ERROR_PREFIX
+
+# 阶段结束标记
+_DONE = object()
+
+
+class UsageMeter:
+    """包装LLM客户端，累计各次生成的token用量"""
+
+    def __init__(self, llm_client: Any):
+        """
+        初始化用量统计
+
+        Args:
+            llm_client: LocalLLMClient 或 LLMWorkerPool 实例
+        """
+        self.llm_client = llm_client
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """调用chat.completion并累计token用量"""
+        response = self.llm_client.chat_completion(messages, **kwargs)
+        usage = response.get("usage", {})
+        with self._lock:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm_client, name)
+
+
+class BatchRunner:
+    """批量主题分析流水线"""
+
+    def __init__(self, config: Settings, database: SimpleDatabase, llm_client: Any,
+                 crawl_workers: Optional[int] = None, llm_workers: Optional[int] = None,
+                 queue_size: Optional[int] = None):
+        """
+        初始化批量分析流水线
+
+        Args:
+            config: 配置对象
+            database: 数据库实例
+            llm_client: 就绪的LLM客户端
+            crawl_workers: 爬虫阶段线程数
+            llm_workers: 分析阶段线程数，默认与批大小一致，使并发请求可以合并生成
+            queue_size: 阶段之间队列的容量
+        """
+        self.config = config
+        self.database = database
+        self.meter = UsageMeter(llm_client)
+        self.crawl_workers = crawl_workers or config.BATCH_CRAWL_WORKERS
+        self.llm_workers = llm_workers or max(1, config.LLM_BATCH_SIZE)
+        self.queue_size = queue_size or config.BATCH_QUEUE_SIZE
+        self.crawler = SimpleCrawler(config, database)
+
+    def run(self, topics: Iterable[str], output: Optional[TextIO] = None) -> Dict[str, Any]:
+        """
+        批量分析主题
+
+        Args:
+            topics: 主题列表
+            output: JSONL输出流，每个主题一行
+
+        Returns:
+            运行统计信息
+        """
+        topics = [topic.strip() for topic in topics if topic.strip()]
+        total = len(topics)
+        start_time = time.time()
+
+        topic_queue: "queue.Queue" = queue.Queue()
+        crawled_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        result_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        for index, topic in enumerate(topics):
+            topic_queue.put((index, topic))
+
+        stats = {"total": total, "succeeded": 0, "failed": 0}
+        crawl_threads = self._start_stage("batch-crawl", self.crawl_workers,
+                                          self._crawl_stage, topic_queue, crawled_queue)
+        llm_threads = self._start_stage("batch-llm", self.llm_workers,
+                                        self._analyze_stage, crawled_queue, result_queue)
+        writer = threading.Thread(
+            target=self._write_stage, args=(result_queue, output, stats, start_time),
+            name="batch-writer", daemon=True
+        )
+        writer.start()
+
+        # 上游阶段全部结束后，向下游每个线程发送结束标记
+        for _ in crawl_threads:
+            topic_queue.put(_DONE)
+        for thread in crawl_threads:
+            thread.join()
+        for _ in llm_threads:
+            crawled_queue.put(_DONE)
+        for thread in llm_threads:
+            thread.join()
+        result_queue.put(_DONE)
+        writer.join()
+
+        elapsed = time.time() - start_time
+        stats.update({
+            "elapsed": round(elapsed, 2),
+            "topics_per_min": round(total / elapsed * 60, 2) if elapsed else 0.0,
+            "prompt_tokens": self.meter.prompt_tokens,
+            "completion_tokens": self.meter.completion_tokens,
+            "tokens_per_sec": round(self.meter.completion_tokens / elapsed, 2) if elapsed else 0.0
+        })
+        logger.info(
+            f"批量分析完成: 成功 {stats['succeeded']}/{total}，耗时 {stats['elapsed']}s，"
+            f"{stats['topics_per_min']} 主题/分钟，{stats['tokens_per_sec']} tokens/s"
+        )
+        return stats
+
+    @staticmethod
+    def _start_stage(name: str, workers: int, target, *args) -> List[threading.Thread]:
+        """启动一个阶段的工作线程"""
+        threads = []
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=target, args=args, name=f"{name}-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def _crawl_stage(self, inbox: "queue.Queue", outbox: "queue.Queue"):
+        """爬虫阶段：爬取主题并格式化内容"""
+        while True:
+            task = inbox.get()
+            if task is _DONE:
+                break
+            index, topic = task
+            item = {"index": index, "topic": topic}
+            try:
+                crawled_data = self.crawler.crawl_topic(topic, self.config.CRAWLER_MAX_ITEMS)
+                item["crawled_data"] = crawled_data
+                item["crawled_content"] = self.crawler.format_crawled_data(crawled_data)
+            except Exception as e:
+                logger.exception(f"批量分析爬取失败: {topic}: {e}")
+                item["error"] = f"爬取失败: {e}"
+            # 队列已满时阻塞，避免爬虫远远领先于LLM
+            outbox.put(item)
+
+    def _analyze_stage(self, inbox: "queue.Queue", outbox: "queue.Queue"):
+        """分析阶段：洞察分析和报告生成，多个线程的请求由批量调度器合并"""
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            if "error" not in item:
+                try:
+                    item["insight_result"], item["report"], item["report_sections"] = analyze_and_report(
+                        self.meter, item["topic"], item["crawled_content"], item["crawled_data"]
+                    )
+                    # 分析器和报告生成器在LLM出错时返回错误文本而不抛出异常
+                    for result, prefix in ((item["insight_result"], ANALYSIS_ERROR_PREFIX),
+                                           (item["report"], REPORT_ERROR_PREFIX)):
+                        if result.startswith(prefix):
+                            logger.error(f"批量分析失败: {item['topic']}: {result}")
+                            item["error"] = result
+                            break
+                except Exception as e:
+                    logger.exception(f"批量分析失败: {item['topic']}: {e}")
+                    item["error"] = f"分析失败: {e}"
+            outbox.put(item)
+
+    def _write_stage(self, inbox: "queue.Queue", output: Optional[TextIO],
+                     stats: Dict[str, Any], start_time: float):
+        """写入阶段：保存到数据库并输出JSONL，单线程写入避免写锁竞争"""
+        done = 0
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            done += 1
+            if "error" in item:
+                stats["failed"] += 1
+            elif self.database.save_analysis_result(
+                item["topic"], item["crawled_data"], item["crawled_content"],
+                item["insight_result"], item["report"], item["report_sections"]
+            ):
+                stats["succeeded"] += 1
+            else:
+                stats["failed"] += 1
+                item["error"] = "保存分析结果失败"
+
+            if output is not None:
+                record = {
+                    "index": item["index"],
+                    "topic": item["topic"],
+                    "status": "failed" if "error" in item else "succeeded",
+                    "items": len(item.get("crawled_data") or []),
+                    "insight_result": item.get("insight_result"),
+                    "report": item.get("report"),
+                    "report_sections": item.get("report_sections"),
+                    "error": item.get("error")
+                }
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+
+            elapsed = time.time() - start_time
+            logger.info(
+                f"[{done}/{stats['total']}] {item['topic']} "
+                f"{'失败' if 'error' in item else '完成'}，"
+                f"已用时 {elapsed:.1f}s，{done / elapsed * 60:.1f} 主题/分钟"
+            )
@@ -0,0 +1,151 @@
+"""
+批量生成调度模块
+在短时间窗口内收集并发的生成请求，合并为一次批量生成调用
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+from loguru import logger
+
+
+class _BatchRequest:
+    """待处理的单个生成请求"""
+
+    __slots__ = ("prompt", "generation_kwargs", "key", "cost", "future")
+
+    def __init__(self, prompt: str, generation_kwargs: Dict[str, Any], cost: int):
+        self.prompt = prompt
+        self.generation_kwargs = generation_kwargs
+        # 只有生成参数完全一致的请求才能合并到同一批次
+        self.key = tuple(sorted(generation_kwargs.items()))
+        self.cost = cost
+        self.future: Future = Future()
+
+
+class BatchScheduler:
+    """批量生成调度器"""
+
+    def __init__(self, run_batch: Callable[[List[str], Dict[str, Any]], List[Any]],
+                 max_batch_size: int = 4, window: float = 0.05,
+                 token_budget: int = 4096):
+        """
+        初始化批量生成调度器
+
+        Args:
+            run_batch: 批量生成函数，接收(prompt列表, 生成参数)，按顺序返回每个prompt的结果
+            max_batch_size: 单批次最大请求数
+            window: 收集请求的时间窗口（秒）
+            token_budget: 单批次的token预算（prompt tokens + max_new_tokens 之和）
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = window
+        self.token_budget = token_budget
+        self._pending: List[_BatchRequest] = []
+        self._cond = threading.Condition()
+        
+        # 统计信息
+        self.batches = 0
+        self.requests = 0
+
+        self._thread = threading.Thread(target=self._loop, name="llm-batch-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"批量生成调度器已启动，批大小: {self.max_batch_size}，窗口: {window}s，token预算: {token_budget}")
+
+    def submit(self, prompt: str, generation_kwargs: Dict[str, Any], cost: int) -> Future:
+        """
+        提交生成请求
+
+        Args:
+            prompt: 构建好的prompt
+            generation_kwargs: 生成参数
+            cost: 请求的token开销估计
+
+        Returns:
+            结果Future
+        """
+        request = _BatchRequest(prompt, generation_kwargs, cost)
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify()
+        return request.future
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取调度统计信息
+
+        Returns:
+            等待中的请求数、已执行的批次数和请求数
+        """
+        with self._cond:
+            return {"pending": len(self._pending), "batches": self.batches, "requests": self.requests}
+
+    def _loop(self):
+        """调度线程主循环"""
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                # 在时间窗口内等待更多请求，批次已满时提前结束
+                deadline = time.monotonic() + self.window
+                while self._count_compatible() < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._take_batch()
+                self.batches += 1
+                self.requests += len(batch)
+
+            self._run(batch)
+
+    def _count_compatible(self) -> int:
+        """统计可与队首请求合并的请求数"""
+        key = self._pending[0].key
+        return sum(1 for request in self._pending if request.key == key)
+
+    def _take_batch(self) -> List[_BatchRequest]:
+        """
+        从等待列表中取出一个批次，受批大小和token预算限制
+
+        Returns:
+            批次请求列表
+        """
+        first = self._pending[0]
+        batch = [first]
+        total_cost = first.cost
+        for request in self._pending[1:]:
+            if len(batch) >= self.max_batch_size:
+                break
+            if request.key != first.key or total_cost + request.cost > self.token_budget:
+                continue
+            batch.append(request)
+            total_cost += request.cost
+
+        taken = set(map(id, batch))
+        self._pending = [request for request in self._pending if id(request) not in taken]
+        return batch
+
+    def _run(self, batch: List[_BatchRequest]):
+        """
+        执行一个批次并将结果分发给各个请求
+
+        Args:
+            batch: 批次请求列表
+        """
+        if len(batch) > 1:
+            logger.debug(f"合并 {len(batch)} 个请求进行批量生成")
+        try:
+            results: List[Tuple] = self.run_batch(
+                [request.prompt for request in batch],
+                batch[0].generation_kwargs
+            )
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
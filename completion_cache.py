@@ -0,0 +1,140 @@
+"""
+LLM生成结果缓存模块
+确定性生成下相同的prompt和生成参数总是得到相同结果，按内容寻址缓存生成结果
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from loguru import logger
+
+from db import SimpleDatabase
+
+
+class CompletionCache:
+    """两级（内存LRU + SQLite）生成结果缓存"""
+
+    def __init__(self, database: Optional[SimpleDatabase] = None,
+                 memory_size: int = 256, db_max_entries: int = 10000,
+                 ttl: int = 7 * 24 * 3600):
+        """
+        初始化生成结果缓存
+
+        Args:
+            database: 数据库实例，为None时只使用内存缓存
+            memory_size: 内存缓存的最大条目数
+            db_max_entries: SQLite缓存的最大条目数
+            ttl: 缓存有效期（秒）
+        """
+        self.database = database
+        self.memory_size = memory_size
+        self.db_max_entries = db_max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 命中统计
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_path: str, prompt: str, generation_kwargs: Dict[str, Any]) -> str:
+        """
+        计算缓存键
+
+        Args:
+            model_path: 模型路径
+            prompt: 构建好的prompt
+            generation_kwargs: 生成参数
+
+        Returns:
+            缓存键（SHA-256）
+        """
+        payload = json.dumps(
+            {"model": model_path, "prompt": prompt, "kwargs": generation_kwargs},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存内容（content/prompt_tokens/completion_tokens），未命中时返回None
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.time() - stored_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+        if self.database is not None:
+            value = self.database.get_cached_completion(key, self.ttl)
+            if value:
+                self._remember(key, value)
+                with self._lock:
+                    self.db_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, content: str, prompt_tokens: int, completion_tokens: int):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            content: 生成内容
+            prompt_tokens: prompt token数
+            completion_tokens: 生成token数
+        """
+        value = {
+            "content": content,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens
+        }
+        self._remember(key, value)
+        if self.database is not None:
+            self.database.save_cached_completion(
+                key, content, prompt_tokens, completion_tokens,
+                max_entries=self.db_max_entries, ttl=self.ttl
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中/未命中计数及内存缓存大小
+        """
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory)
+            }
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        """写入内存LRU缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._memory[key] = (time.time(), value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                evicted_key, _ = self._memory.popitem(last=False)
+                logger.debug(f"淘汰内存缓存条目: {evicted_key[:12]}")
@@ -3,7 +3,7 @@
 """
 
 import os
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings:
     """应用配置类"""
@@ -17,8 +17,101 @@ class Settings:
         
         # 爬虫配置
         self.CRAWLER_MAX_ITEMS: int = 10
+        self.CRAWLER_DOUYIN_URL: str = "https://www.douyin.com/search/{topic}"
+        self.CRAWLER_BAIDU_URL: str = "https://www.baidu.com/s?wd={topic}"
+        self.CRAWLER_TIMEOUT: float = 10
+        self.CRAWLER_DEADLINE: float = 15
+        self.CRAWLER_POOL_SIZE: int = 10
+        # 使用增量快速提取解析搜索结果页面（安装lxml时使用lxml），关闭时使用BeautifulSoup
+        self.CRAWLER_FAST_PARSER: bool = True
+        
+        # 爬取结果缓存配置（秒），过期后在 MAX_STALE 内先返回旧数据并后台刷新
+        self.CRAWLER_CACHE_ENABLED: bool = True
+        self.CRAWLER_CACHE_DEFAULT_TTL: int = 900
+        self.CRAWLER_CACHE_TTL: Dict[str, int] = {"douyin": 600, "baidu": 1800}
+        self.CRAWLER_CACHE_MAX_STALE: int = 24 * 3600
+        
+        # 近似重复内容合并：MinHash估计的相似度（字符3-gram的Jaccard系数）不低于阈值视为重复
+        self.DEDUP_ENABLED: bool = True
+        self.DEDUP_SIMILARITY: float = 0.7
+        
+        # 词典情感/相关度预分类：在LLM之前为每条内容打分，相关度低于阈值的内容不进入分析
+        self.SENTIMENT_ENABLED: bool = True
+        self.RELEVANCE_MIN: float = 0.25
         
         # LLM配置
         self.LLM_MAX_TOKENS: int = 200
+        self.LLM_MAX_INPUT_TOKENS: int = 512
         self.LLM_TEMPERATURE: float = 0.1
         self.LLM_DO_SAMPLE: bool = False
+        
+        # 模型生命周期配置：启动时预加载并预热；副本数大于1时以多个工作进程各自加载模型
+        self.LLM_EAGER_LOAD: bool = True
+        self.LLM_WARMUP_TOKENS: int = 8
+        self.LLM_REPLICAS: int = 1
+        # 多副本CPU推理时，各工作进程通过内存映射的safetensors共享同一份权重
+        self.LLM_SHARED_WEIGHTS: bool = True
+        
+        # 推理后端：auto / cuda / cpu-fp32 / cpu-bf16 / cpu-int8（线性层int8动态量化）；
+        # auto在有GPU时使用cuda，否则在CPU支持bfloat16指令时使用cpu-bf16
+        self.LLM_BACKEND: str = "auto"
+        # 每个模型副本的计算线程数，0表示使用默认值（多副本时平分CPU核心）
+        self.LLM_NUM_THREADS: int = 0
+        # 是否用torch.compile编译模型前向计算，首次生成会因编译变慢
+        self.LLM_TORCH_COMPILE: bool = False
+        
+        # LLM生成结果缓存配置（仅对确定性生成生效）
+        self.LLM_CACHE_ENABLED: bool = True
+        self.LLM_CACHE_MEMORY_SIZE: int = 256
+        self.LLM_CACHE_DB_MAX_ENTRIES: int = 10000
+        self.LLM_CACHE_TTL: int = 7 * 24 * 3600
+        
+        # 系统提示词前缀KV缓存配置
+        self.LLM_PREFIX_CACHE_ENABLED: bool = True
+        self.LLM_PREFIX_CACHE_SIZE: int = 8
+        
+        # 批量生成配置，批大小为1时关闭批量调度
+        self.LLM_BATCH_SIZE: int = 4
+        self.LLM_BATCH_WINDOW: float = 0.05
+        self.LLM_BATCH_TOKEN_BUDGET: int = 4096
+        
+        # 投机解码配置：草稿模型须与主模型共用词表（如Qwen2.5-0.5B-Instruct），为空时不启用；
+        # 仅对贪心解码生效，输出与普通解码一致
+        self.LLM_DRAFT_MODEL_PATH: Optional[str] = None
+        self.LLM_DRAFT_NUM_TOKENS: int = 5
+        
+        # 结构化输出配置：分析和报告按小节标题约束解码，每个小节一行，最后一个小节完成即停止生成；
+        # 约束解码的请求不参与批量合并
+        self.LLM_STRUCTURED_OUTPUT: bool = False
+        
+        # 任务队列配置，多个工作线程的LLM请求由批量调度器合并生成
+        self.JOB_WORKERS: int = 4
+        self.JOB_QUEUE_MAX_SIZE: int = 8
+        
+        # 指标配置：是否开放Prometheus格式的 /metrics 接口
+        self.METRICS_ENABLED: bool = True
+        
+        # 长文本分段（map-reduce）分析配置：爬取内容超过单段token预算时，先分段摘要再汇总分析
+        self.ANALYZER_MAP_REDUCE_ENABLED: bool = True
+        self.ANALYZER_CHUNK_TOKENS: int = 320
+        self.ANALYZER_CHUNK_SUMMARY_TOKENS: int = 120
+        # 启用上下文打包时先按预算挑选内容，被丢弃的条数超过该比例才改为分段摘要
+        self.ANALYZER_MAX_DROP_RATIO: float = 0.5
+        
+        # 上下文打包配置：在prompt的token预算内按互动量和多样性挑选爬取内容
+        self.CONTEXT_PACKING_ENABLED: bool = True
+        self.CONTEXT_TOKEN_CACHE_SIZE: int = 4096
+        self.CONTEXT_DIVERSITY_WEIGHT: float = 1.0
+        
+        # 合并生成配置：一次生成同时输出分析结果和报告（爬取内容只预填充一次），输出无法拆分时退回两次调用；
+        # 最大生成token数为0时按提示词要求的字数估算
+        self.PIPELINE_FUSED_ENABLED: bool = False
+        self.PIPELINE_FUSED_MAX_TOKENS: int = 0
+        
+        # 主题监控配置：按周期增量爬取，只对新内容做增量分析；周期应大于爬取缓存TTL
+        self.MONITOR_DEFAULT_INTERVAL: int = 1800
+        self.MONITOR_POLL_INTERVAL: float = 30
+        
+        # 批量分析配置：爬虫阶段线程数及阶段之间的队列容量（分析阶段线程数与LLM_BATCH_SIZE一致）
+        self.BATCH_CRAWL_WORKERS: int = 4
+        self.BATCH_QUEUE_SIZE: int = 8
@@ -0,0 +1,213 @@
+"""
+上下文打包模块
+按模型tokenizer计算每条爬取内容的token开销，按互动量和多样性挑选内容，
+在精确的token预算内组装prompt中的爬取内容，避免输入被截断
+"""
+
+import hashlib
+import math
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+
+from dedup import minhash, similarity
+
+
+class ContextPacker:
+    """在token预算内挑选并格式化爬取内容"""
+
+    def __init__(self, llm_client: Any, cache_size: int = 4096, diversity_weight: float = 1.0):
+        """
+        初始化上下文打包器
+
+        Args:
+            llm_client: 提供count_tokens的LLM客户端
+            cache_size: 缓存的单条内容token数条目上限
+            diversity_weight: 与已选内容相似时的降权系数，0表示只看互动量
+        """
+        self.llm_client = llm_client
+        self.cache_size = cache_size
+        self.diversity_weight = diversity_weight
+        self._token_counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def budget(self, messages: List[Dict[str, str]], max_new_tokens: Optional[int] = None,
+               sections: Optional[Sequence[str]] = None) -> int:
+        """
+        计算可用于爬取内容的token预算：prompt上限减去不含爬取内容的提示词开销
+
+        Args:
+            messages: 爬取内容留空时构造的消息列表
+            max_new_tokens: 最大生成token数，None表示使用配置值
+            sections: 约束解码的小节标题，第一个小节标题会追加在prompt末尾，同样计入开销
+
+        Returns:
+            token预算
+        """
+        limit = self.llm_client.input_token_limit(max_new_tokens)
+        overhead = self.llm_client.count_prompt_tokens(messages)
+        if sections:
+            overhead += self.llm_client.count_tokens(f"{sections[0]}：")
+        return max(0, limit - overhead)
+
+    def pack(self, crawled_data: List[Dict[str, Any]], budget: int) -> str:
+        """
+        在token预算内挑选爬取内容并格式化
+
+        每一步选择"价值/token"最高的内容，价值由互动量决定，并按与已选内容的相似度降权
+
+        Args:
+            crawled_data: 爬取到的数据列表
+            budget: token预算
+
+        Returns:
+            格式化后的爬取内容，token数不超过预算
+        """
+        return self.pack_with_count(crawled_data, budget)[0]
+
+    def pack_with_count(self, crawled_data: List[Dict[str, Any]], budget: int) -> Tuple[str, int]:
+        """
+        在token预算内挑选爬取内容并格式化，同时返回选用的条数
+
+        Args:
+            crawled_data: 爬取到的数据列表
+            budget: token预算
+
+        Returns:
+            (格式化后的爬取内容, 选用的条数)
+        """
+        if not crawled_data:
+            return "未爬取到相关数据。", 0
+
+        candidates = [
+            {
+                "item": item,
+                "body": self._format_body(item),
+                "value": math.log1p((item.get("likes") or 0) + (item.get("comments") or 0)) + 1.0,
+                "signature": item.get("minhash") or minhash(" ".join(item.get("content", "").split()))
+            }
+            for item in crawled_data
+        ]
+        for candidate in candidates:
+            candidate["tokens"] = self._count_tokens(candidate["body"])
+
+        selected = self._select(candidates, budget)
+
+        # 拼接处的分词可能与逐条统计略有出入，超出预算时去掉价值最低的内容
+        while True:
+            text = self._render(selected, len(crawled_data))
+            if not selected or self._count_tokens(text) <= budget:
+                break
+            selected.pop()
+
+        if not selected:
+            logger.warning(f"token预算 {budget} 不足以容纳任何爬取内容")
+            return f"网络爬取结果（共 {len(crawled_data)} 条，超出输入长度限制未能放入）。", 0
+        if len(selected) < len(crawled_data):
+            logger.info(
+                f"上下文预算 {budget} tokens，选用 {len(selected)}/{len(crawled_data)} 条爬取内容"
+            )
+        return text, len(selected)
+
+    def _select(self, candidates: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """
+        贪心挑选内容，直到预算内放不下剩余任何一条
+
+        Args:
+            candidates: 候选内容
+            budget: token预算
+
+        Returns:
+            按选择顺序排列的内容
+        """
+        remaining = budget - self._count_tokens(self._render([], len(candidates)))
+        selected: List[Dict[str, Any]] = []
+        pool = list(candidates)
+        while pool:
+            best, best_score = None, 0.0
+            for candidate in pool:
+                # 序号行的token开销按最多3位数估计
+                if candidate["tokens"] + 3 > remaining:
+                    continue
+                redundancy = max(
+                    (similarity(candidate["signature"], chosen["signature"]) for chosen in selected),
+                    default=0.0
+                )
+                score = candidate["value"] * (1 - self.diversity_weight * redundancy) / candidate["tokens"]
+                if best is None or score > best_score:
+                    best, best_score = candidate, score
+            if best is None:
+                break
+            selected.append(best)
+            pool.remove(best)
+            remaining -= best["tokens"] + 3
+        return selected
+
+    @staticmethod
+    def _format_body(item: Dict[str, Any]) -> str:
+        """单条内容去掉序号后的格式化文本，与format_crawled_data一致"""
+        content = " ".join(item.get("content", "").split())
+        return f"内容: {content}\n   点赞: {item.get('likes', 0)}  评论: {item.get('comments', 0)}\n\n"
+
+    @staticmethod
+    def _render(selected: List[Dict[str, Any]], total: int) -> str:
+        """组装选中的内容"""
+        if len(selected) < total:
+            header = f"网络爬取结果（共 {total} 条，按互动量和多样性选取 {len(selected)} 条）:\n"
+        else:
+            header = "网络爬取结果:\n"
+        return header + "".join(
+            f"{i}. {candidate['body']}" for i, candidate in enumerate(selected, 1)
+        )
+
+    def _count_tokens(self, text: str) -> int:
+        """
+        统计token数，按文本哈希缓存
+
+        Args:
+            text: 文本
+
+        Returns:
+            token数
+        """
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            count = self._token_counts.get(key)
+            if count is not None:
+                self._token_counts.move_to_end(key)
+                return count
+
+        count = self.llm_client.count_tokens(text)
+        with self._lock:
+            self._token_counts[key] = count
+            while len(self._token_counts) > self.cache_size:
+                self._token_counts.popitem(last=False)
+        return count
+
+
+# 各LLM客户端对应的上下文打包器，客户端被释放时随之释放
+_context_packers: "weakref.WeakKeyDictionary[Any, ContextPacker]" = weakref.WeakKeyDictionary()
+_context_packers_lock = threading.Lock()
+
+def get_context_packer(llm_client: Any) -> ContextPacker:
+    """
+    获取LLM客户端对应的上下文打包器，同一客户端的多次请求共用token数缓存
+
+    Args:
+        llm_client: LLM客户端
+
+    Returns:
+        ContextPacker实例
+    """
+    with _context_packers_lock:
+        packer = _context_packers.get(llm_client)
+        if packer is None:
+            config = llm_client.config
+            packer = _context_packers[llm_client] = ContextPacker(
+                llm_client,
+                cache_size=config.CONTEXT_TOKEN_CACHE_SIZE,
+                diversity_weight=config.CONTEXT_DIVERSITY_WEIGHT
+            )
+    return packer
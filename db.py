@@ -3,12 +3,69 @@
 使用SQLite数据库存储分析结果
 """
 
+import json
 import os
 import sqlite3
+import hashlib
+import threading
+import zlib
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from loguru import logger
 
+from sentiment import score_items, summarize_sentiment
+from metrics import traced
+from dedup import MINHASH_BANDS, minhash, pack_signature, signature_bands, similarity, unpack_signature
+
+# 分析记录中可按需加载的大字段
+RECORD_BODY_FIELDS = ("crawled_data", "insight_result", "report")
+
+def _compress(text: Optional[str]) -> Optional[bytes]:
+    """压缩大文本字段"""
+    if text is None:
+        return None
+    return zlib.compress(text.encode("utf-8"), 6)
+
+def _decompress(blob: Optional[bytes]) -> Optional[str]:
+    """解压大文本字段"""
+    if blob is None:
+        return None
+    return zlib.decompress(blob).decode("utf-8")
+
+def content_hash(content: str) -> str:
+    """
+    计算爬取内容的哈希，忽略空白差异，用于识别已见过的内容
+    
+    Args:
+        content: 爬取内容
+        
+    Returns:
+        内容哈希（SHA-1）
+    """
+    normalized = " ".join(content.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+def content_minhash(content: str) -> List[int]:
+    """
+    计算爬取内容的MinHash签名，与content_hash使用相同的空白规范化
+    
+    Args:
+        content: 爬取内容
+        
+    Returns:
+        MinHash签名
+    """
+    return minhash(" ".join(content.split()))
+
+# 任务阶段与时间戳字段的对应关系
+JOB_STAGE_COLUMNS = {
+    "running": "started_at",
+    "crawled": "crawled_at",
+    "analyzed": "analyzed_at",
+    "succeeded": "finished_at",
+    "failed": "finished_at",
+}
+
 class SimpleDatabase:
     """简化版数据库操作类"""
     
@@ -20,12 +77,37 @@ class SimpleDatabase:
             db_path: 数据库文件路径
         """
         self.db_path = db_path
+        # 每个线程复用一个连接，避免每次操作都重新打开数据库
+        self._local = threading.local()
+        self.fts_enabled = False
         self.init_database()
     
+    def _connection(self) -> sqlite3.Connection:
+        """
+        获取当前线程的数据库连接，首次使用时创建并设置WAL等参数
+        
+        连接可直接用于with语句：正常退出时提交事务，异常时回滚
+        
+        Returns:
+            sqlite3连接
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL模式下读写互不阻塞，NORMAL同步级别在WAL下仍能保证一致性
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-16000")
+            self._local.conn = conn
+        return conn
+    
     def init_database(self):
         """初始化数据库表"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 
                 # 创建分析记录表
@@ -36,6 +118,8 @@ class SimpleDatabase:
                         crawled_data TEXT,
                         insight_result TEXT,
                         report TEXT,
+                        sentiment TEXT,
+                        report_sections TEXT,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
@@ -48,16 +132,280 @@ class SimpleDatabase:
                         content TEXT NOT NULL,
                         likes INTEGER DEFAULT 0,
                         comments INTEGER DEFAULT 0,
+                        content_hash TEXT,
+                        minhash BLOB,
+                        sentiment REAL,
+                        sentiment_label TEXT,
+                        relevance REAL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # 创建MinHash签名的LSH分段索引表，用于跨批次查找近似重复内容
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS crawled_minhash_bands (
+                        topic TEXT NOT NULL,
+                        band INTEGER NOT NULL,
+                        value INTEGER NOT NULL,
+                        item_id INTEGER NOT NULL
+                    )
+                ''')
+                self._migrate_crawled_data(cursor)
+                
+                # 创建分析记录正文表：大文本字段压缩存储，只在需要时加载
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS analysis_bodies (
+                        record_id INTEGER PRIMARY KEY,
+                        crawled_content BLOB,
+                        insight_result BLOB,
+                        report BLOB
+                    )
+                ''')
+                
+                # 创建分析记录与爬虫数据的关联表，爬取内容按ID引用而不重复存储
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS analysis_items (
+                        record_id INTEGER NOT NULL,
+                        position INTEGER NOT NULL,
+                        item_id INTEGER NOT NULL,
+                        PRIMARY KEY (record_id, position)
+                    )
+                ''')
+                
+                # 创建爬取结果缓存表
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS crawl_cache (
+                        source TEXT NOT NULL,
+                        topic TEXT NOT NULL,
+                        max_items INTEGER NOT NULL,
+                        items TEXT NOT NULL,
+                        etag TEXT,
+                        last_modified TEXT,
+                        fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (source, topic, max_items)
+                    )
+                ''')
+                
+                # 创建分析任务表
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        topic TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'queued',
+                        result TEXT,
+                        error TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        started_at TIMESTAMP,
+                        crawled_at TIMESTAMP,
+                        analyzed_at TIMESTAMP,
+                        finished_at TIMESTAMP
+                    )
+                ''')
+                
+                # 创建主题监控表
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS monitors (
+                        topic TEXT PRIMARY KEY,
+                        interval INTEGER NOT NULL,
+                        last_run_at TIMESTAMP,
+                        next_run_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        last_new_items INTEGER,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
                 
+                # 创建LLM生成结果缓存表
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        content TEXT NOT NULL,
+                        prompt_tokens INTEGER DEFAULT 0,
+                        completion_tokens INTEGER DEFAULT 0,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # 创建索引，支撑按时间倒序分页和按主题查询
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_analysis_records_created_at
+                    ON analysis_records (created_at, id)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_analysis_records_topic
+                    ON analysis_records (topic, created_at, id)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_crawled_data_created_at
+                    ON crawled_data (created_at)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_crawled_data_topic
+                    ON crawled_data (topic, created_at)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_crawled_data_hash
+                    ON crawled_data (topic, content_hash)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_crawled_minhash_bands
+                    ON crawled_minhash_bands (topic, band, value)
+                ''')
+                
+                migrated = self._migrate_inline_bodies(cursor)
+                self.fts_enabled = self._init_search_index(cursor)
+                
                 conn.commit()
-                logger.info("数据库初始化完成")
+            if migrated:
+                # 迁移后回收内联正文占用的页面
+                self._connection().execute("VACUUM")
+            logger.info("数据库初始化完成")
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
             raise
     
+    def _migrate_crawled_data(self, cursor: sqlite3.Cursor):
+        """
+        为旧版表补充content_hash、minhash、情感分等列并回填已有数据
+        
+        Args:
+            cursor: 数据库游标
+        """
+        cursor.execute("PRAGMA table_info(analysis_records)")
+        record_columns = {row["name"] for row in cursor.fetchall()}
+        if "sentiment" not in record_columns:
+            cursor.execute("ALTER TABLE analysis_records ADD COLUMN sentiment TEXT")
+        if "report_sections" not in record_columns:
+            cursor.execute("ALTER TABLE analysis_records ADD COLUMN report_sections TEXT")
+        
+        cursor.execute("PRAGMA table_info(crawled_data)")
+        columns = {row["name"] for row in cursor.fetchall()}
+        
+        if "content_hash" not in columns:
+            cursor.execute("ALTER TABLE crawled_data ADD COLUMN content_hash TEXT")
+            cursor.execute("SELECT id, content FROM crawled_data")
+            cursor.executemany(
+                "UPDATE crawled_data SET content_hash = ? WHERE id = ?",
+                [(content_hash(row["content"]), row["id"]) for row in cursor.fetchall()]
+            )
+            logger.info("已为爬虫数据回填内容哈希")
+        
+        if "minhash" not in columns:
+            cursor.execute("ALTER TABLE crawled_data ADD COLUMN minhash BLOB")
+            cursor.execute("SELECT id, topic, content FROM crawled_data")
+            rows = [
+                (row["id"], row["topic"], content_minhash(row["content"]))
+                for row in cursor.fetchall()
+            ]
+            cursor.executemany(
+                "UPDATE crawled_data SET minhash = ? WHERE id = ?",
+                [(pack_signature(signature), item_id) for item_id, _, signature in rows]
+            )
+            self._insert_minhash_bands(cursor, rows)
+            logger.info("已为爬虫数据回填MinHash签名")
+        
+        if "sentiment" not in columns:
+            cursor.execute("ALTER TABLE crawled_data ADD COLUMN sentiment REAL")
+            cursor.execute("ALTER TABLE crawled_data ADD COLUMN sentiment_label TEXT")
+            cursor.execute("ALTER TABLE crawled_data ADD COLUMN relevance REAL")
+            cursor.execute("SELECT id, topic, content FROM crawled_data")
+            rows = cursor.fetchall()
+            cursor.executemany(
+                "UPDATE crawled_data SET sentiment = ?, sentiment_label = ?, relevance = ? WHERE id = ?",
+                [
+                    (item["sentiment"], item["sentiment_label"], item["relevance"], row["id"])
+                    for row in rows
+                    for item in score_items(row["topic"], [dict(row)])
+                ]
+            )
+            logger.info("已为爬虫数据回填情感分和相关度")
+    
+    def _migrate_inline_bodies(self, cursor: sqlite3.Cursor) -> int:
+        """
+        将旧版内联存储在analysis_records中的大文本字段迁移到压缩的正文表
+        
+        Args:
+            cursor: 数据库游标
+            
+        Returns:
+            迁移的记录数
+        """
+        # 旧版全文索引依赖内联字段的触发器，先行删除
+        for trigger in ("analysis_search_ai", "analysis_search_ad", "analysis_search_au"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute("DROP TABLE IF EXISTS analysis_search")
+        
+        cursor.execute('''
+            SELECT id, crawled_data, insight_result, report FROM analysis_records
+            WHERE crawled_data IS NOT NULL OR insight_result IS NOT NULL OR report IS NOT NULL
+        ''')
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        
+        cursor.executemany('''
+            INSERT OR REPLACE INTO analysis_bodies
+            (record_id, crawled_content, insight_result, report)
+            VALUES (?, ?, ?, ?)
+        ''', [
+            (row["id"], _compress(row["crawled_data"]),
+             _compress(row["insight_result"]), _compress(row["report"]))
+            for row in rows
+        ])
+        cursor.execute('''
+            UPDATE analysis_records SET crawled_data = NULL, insight_result = NULL, report = NULL
+            WHERE crawled_data IS NOT NULL OR insight_result IS NOT NULL OR report IS NOT NULL
+        ''')
+        logger.info(f"已将 {len(rows)} 条分析记录的正文迁移为压缩存储")
+        return len(rows)
+    
+    def _init_search_index(self, cursor: sqlite3.Cursor) -> bool:
+        """
+        创建分析记录的FTS5全文索引
+        
+        正文以压缩形式存储，索引使用无内容（contentless）表，只保存倒排索引，由写入时同步更新。
+        中文没有空格分词，优先使用trigram分词器；SQLite不支持FTS5时返回False，搜索退化为逐条匹配
+        
+        Args:
+            cursor: 数据库游标
+            
+        Returns:
+            全文索引是否可用
+        """
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analysis_fts'"
+        )
+        if cursor.fetchone():
+            return True
+        
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                cursor.execute(f'''
+                    CREATE VIRTUAL TABLE analysis_fts USING fts5(
+                        topic, insight_result, report,
+                        content='', tokenize='{tokenizer}'
+                    )
+                ''')
+                break
+            except sqlite3.OperationalError as e:
+                logger.warning(f"创建全文索引失败（分词器 {tokenizer}）: {e}")
+        else:
+            return False
+        
+        # 为已有记录建立索引
+        cursor.execute('''
+            SELECT r.id, r.topic, b.insight_result, b.report
+            FROM analysis_records r LEFT JOIN analysis_bodies b ON b.record_id = r.id
+        ''')
+        cursor.executemany('''
+            INSERT INTO analysis_fts (rowid, topic, insight_result, report) VALUES (?, ?, ?, ?)
+        ''', [
+            (row["id"], row["topic"], _decompress(row["insight_result"]), _decompress(row["report"]))
+            for row in cursor.fetchall()
+        ])
+        logger.info("分析记录全文索引已创建")
+        return True
+    
     def save_analysis_record(self, topic: str, crawled_data: str, 
                            insight_result: str, report: str) -> bool:
         """
@@ -73,16 +421,10 @@ class SimpleDatabase:
             是否保存成功
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO analysis_records 
-                    (topic, crawled_data, insight_result, report)
-                    VALUES (?, ?, ?, ?)
-                ''', (topic, crawled_data, insight_result, report))
-                conn.commit()
-                logger.info(f"分析记录已保存到数据库: {topic}")
-                return True
+            with self._connection() as conn:
+                self._insert_analysis_record(conn, topic, crawled_data, insight_result, report)
+            logger.info(f"分析记录已保存到数据库: {topic}")
+            return True
         except Exception as e:
             logger.error(f"保存分析记录失败: {e}")
             return False
@@ -99,68 +441,762 @@ class SimpleDatabase:
             是否保存成功
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                for item in data_list:
-                    cursor.execute('''
-                        INSERT INTO crawled_data (topic, content, likes, comments)
-                        VALUES (?, ?, ?, ?)
-                    ''', (topic, item.get("content", ""), 
-                          item.get("likes", 0), item.get("comments", 0)))
-                conn.commit()
-                logger.info(f"爬虫数据已保存到数据库: {topic}")
-                return True
+            with self._connection() as conn:
+                self._insert_crawled_data(conn, topic, data_list)
+            logger.info(f"爬虫数据已保存到数据库: {topic}")
+            return True
         except Exception as e:
             logger.error(f"保存爬虫数据失败: {e}")
             return False
     
-    def get_analysis_history(self, limit: int = 10) -> List[Dict[str, Any]]:
+    @traced("db_write")
+    def save_analysis_result(self, topic: str, data_list: List[Dict[str, Any]],
+                             crawled_content: str, insight_result: str, report: str,
+                             report_sections: Optional[Dict[str, str]] = None) -> bool:
+        """
+        在同一个事务中保存一次分析的爬虫数据和分析记录
+        
+        分析记录按ID引用本次保存的爬虫数据，不再重复存储格式化后的爬取内容
+        
+        Args:
+            topic: 分析主题
+            data_list: 爬虫数据列表
+            crawled_content: 格式化后的爬虫数据（没有爬虫数据时保存）
+            insight_result: 洞察结果
+            report: 最终报告
+            report_sections: 按小节结构生成的报告字段
+            
+        Returns:
+            是否保存成功
+        """
+        try:
+            with self._connection() as conn:
+                item_ids = self._insert_crawled_data(conn, topic, data_list)
+                # 爬虫已为内容打过情感分时，随记录保存情感分布
+                sentiment = None
+                if any(item.get("sentiment") is not None for item in data_list):
+                    sentiment = summarize_sentiment(data_list)
+                self._insert_analysis_record(
+                    conn, topic, None if item_ids else crawled_content,
+                    insight_result, report, item_ids, sentiment, report_sections
+                )
+            logger.info(f"爬虫数据和分析记录已保存到数据库: {topic}")
+            return True
+        except Exception as e:
+            logger.error(f"保存分析结果失败: {e}")
+            return False
+    
+    def _insert_analysis_record(self, conn: sqlite3.Connection, topic: str,
+                                crawled_content: Optional[str], insight_result: str, report: str,
+                                item_ids: Optional[List[int]] = None,
+                                sentiment: Optional[Dict[str, Any]] = None,
+                                report_sections: Optional[Dict[str, str]] = None) -> int:
+        """
+        在当前事务中插入分析记录：记录头、压缩正文、爬虫数据引用及全文索引
+        
+        Returns:
+            记录ID
+        """
+        cursor = conn.execute('''
+            INSERT INTO analysis_records (topic, sentiment, report_sections) VALUES (?, ?, ?)
+        ''', (
+            topic,
+            json.dumps(sentiment, ensure_ascii=False) if sentiment else None,
+            json.dumps(report_sections, ensure_ascii=False) if report_sections else None
+        ))
+        record_id = cursor.lastrowid
+        conn.execute('''
+            INSERT INTO analysis_bodies (record_id, crawled_content, insight_result, report)
+            VALUES (?, ?, ?, ?)
+        ''', (record_id, _compress(crawled_content), _compress(insight_result), _compress(report)))
+        if item_ids:
+            conn.executemany('''
+                INSERT INTO analysis_items (record_id, position, item_id) VALUES (?, ?, ?)
+            ''', [(record_id, position, item_id) for position, item_id in enumerate(item_ids)])
+        if self.fts_enabled:
+            conn.execute('''
+                INSERT INTO analysis_fts (rowid, topic, insight_result, report) VALUES (?, ?, ?, ?)
+            ''', (record_id, topic, insight_result, report))
+        return record_id
+    
+    def _insert_crawled_data(self, conn: sqlite3.Connection, topic: str,
+                             data_list: List[Dict[str, Any]]) -> List[int]:
+        """
+        在当前事务中批量插入爬虫数据
+        
+        Returns:
+            插入的记录ID列表
+        """
+        if not data_list:
+            return []
+        # 爬虫去重时已计算的签名直接复用
+        signatures = [
+            item.get("minhash") or content_minhash(item.get("content", ""))
+            for item in data_list
+        ]
+        conn.executemany('''
+            INSERT INTO crawled_data
+            (topic, content, likes, comments, content_hash, minhash, sentiment, sentiment_label, relevance)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (topic, item.get("content", ""), item.get("likes", 0), item.get("comments", 0),
+             content_hash(item.get("content", "")), pack_signature(signature),
+             item.get("sentiment"), item.get("sentiment_label"), item.get("relevance"))
+            for item, signature in zip(data_list, signatures)
+        ])
+        # 同一写事务内的自增ID是连续的，由最后一个ID反推整批ID
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        item_ids = list(range(last_id - len(data_list) + 1, last_id + 1))
+        self._insert_minhash_bands(
+            conn, [(item_id, topic, signature) for item_id, signature in zip(item_ids, signatures)]
+        )
+        return item_ids
+    
+    @staticmethod
+    def _insert_minhash_bands(conn, rows: List[Tuple[int, str, List[int]]]):
+        """
+        写入MinHash签名的LSH分段索引
+        
+        Args:
+            conn: 数据库连接或游标
+            rows: (爬虫数据ID, 主题, 签名) 列表
+        """
+        conn.executemany('''
+            INSERT INTO crawled_minhash_bands (topic, band, value, item_id) VALUES (?, ?, ?, ?)
+        ''', [
+            (topic, band, value, item_id)
+            for item_id, topic, signature in rows
+            for band, value in enumerate(signature_bands(signature))
+        ])
+    
+    def filter_unseen_items(self, topic: str, data_list: List[Dict[str, Any]],
+                            threshold: Optional[float] = None) -> List[Dict[str, Any]]:
         """
-        获取分析历史记录
+        过滤掉该主题下已经保存过的爬取内容
+        
+        Args:
+            topic: 主题
+            data_list: 爬虫数据列表
+            threshold: 提供时同时过滤与已保存内容相似度不低于该值的近似重复内容
+            
+        Returns:
+            未见过的爬虫数据（同批次内重复的内容只保留一条）
+        """
+        hashes = [content_hash(item.get("content", "")) for item in data_list]
+        if not hashes:
+            return []
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                placeholders = ", ".join("?" * len(hashes))
+                cursor.execute(f'''
+                    SELECT DISTINCT content_hash FROM crawled_data
+                    WHERE topic = ? AND content_hash IN ({placeholders})
+                ''', [topic] + hashes)
+                seen = {row["content_hash"] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"查询已见内容失败: {e}")
+            seen = set()
+        
+        unseen = []
+        for item, item_hash in zip(data_list, hashes):
+            if item_hash not in seen:
+                seen.add(item_hash)
+                unseen.append(item)
+        
+        if threshold is not None and unseen:
+            unseen = [
+                item for item in unseen
+                if not self._has_near_duplicate(topic, item, threshold)
+            ]
+        return unseen
+    
+    def _has_near_duplicate(self, topic: str, item: Dict[str, Any], threshold: float) -> bool:
+        """
+        通过LSH分段索引查找该主题下是否已保存过近似重复的内容
+        
+        Args:
+            topic: 主题
+            item: 爬虫数据
+            threshold: 视为重复的最小相似度
+            
+        Returns:
+            是否存在近似重复内容
+        """
+        signature = item.get("minhash") or content_minhash(item.get("content", ""))
+        bands = signature_bands(signature)
+        try:
+            with self._connection() as conn:
+                # 任一分段相同的内容才是候选，再逐条估计相似度
+                cursor = conn.execute(f'''
+                    SELECT DISTINCT c.id, c.minhash FROM crawled_minhash_bands b
+                    JOIN crawled_data c ON c.id = b.item_id
+                    WHERE b.topic = ? AND ({" OR ".join(["(b.band = ? AND b.value = ?)"] * MINHASH_BANDS)})
+                ''', [topic] + [v for band, value in enumerate(bands) for v in (band, value)])
+                return any(
+                    similarity(signature, unpack_signature(row["minhash"])) >= threshold
+                    for row in cursor.fetchall()
+                )
+        except Exception as e:
+            logger.error(f"查询近似重复内容失败: {e}")
+            return False
+    
+    def get_analysis_history(self, limit: int = 10,
+                             before: Optional[Tuple[str, int]] = None,
+                             topic: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按时间倒序获取分析历史记录，使用键集分页
         
         Args:
             limit: 限制返回记录数
+            before: 上一页最后一条记录的(created_at, id)，只返回更早的记录
+            topic: 只返回指定主题的记录
             
         Returns:
             历史记录列表
         """
+        conditions = []
+        params: List[Any] = []
+        if topic:
+            conditions.append("topic = ?")
+            params.append(topic)
+        if before:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
+                cursor.execute(f'''
                     SELECT id, topic, created_at FROM analysis_records 
-                    ORDER BY created_at DESC LIMIT ?
-                ''', (limit,))
+                    {where}
+                    ORDER BY created_at DESC, id DESC LIMIT ?
+                ''', params)
                 rows = cursor.fetchall()
                 return [dict(row) for row in rows]
         except Exception as e:
             logger.error(f"获取分析历史记录失败: {e}")
             return []
     
-    def get_analysis_record(self, record_id: int) -> Dict[str, Any]:
+    def search_analysis_records(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        全文搜索分析记录的主题、洞察结果和报告
+        
+        Args:
+            query: 搜索关键词
+            limit: 限制返回记录数
+            
+        Returns:
+            按相关度排序的记录列表（包含匹配片段）
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                # trigram分词至少需要3个字符，更短的关键词（如两字中文词）逐条解压正文匹配
+                if self.fts_enabled and len(query) >= 3:
+                    phrase = '"' + query.replace('"', '""') + '"'
+                    cursor.execute('''
+                        SELECT r.id, r.topic, r.created_at
+                        FROM analysis_fts
+                        JOIN analysis_records r ON r.id = analysis_fts.rowid
+                        WHERE analysis_fts MATCH ?
+                        ORDER BY rank LIMIT ?
+                    ''', (phrase, limit))
+                    records = [dict(row) for row in cursor.fetchall()]
+                else:
+                    records = self._scan_analysis_records(cursor, query, limit)
+            
+            # 只为返回的记录解压正文并截取匹配片段
+            for record in records:
+                body = self.get_analysis_record(record["id"], ("insight_result", "report"))
+                record["snippet"] = self._make_snippet(
+                    query, body.get("insight_result") or "", body.get("report") or ""
+                )
+            return records
+        except Exception as e:
+            logger.error(f"搜索分析记录失败: {e}")
+            return []
+    
+    @staticmethod
+    def _scan_analysis_records(cursor: sqlite3.Cursor, query: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        从新到旧逐条匹配主题和解压后的正文，找到足够的记录即停止
+        
+        Args:
+            cursor: 数据库游标
+            query: 搜索关键词
+            limit: 限制返回记录数
+            
+        Returns:
+            按时间倒序的记录列表
+        """
+        cursor.execute('''
+            SELECT r.id, r.topic, r.created_at, b.insight_result, b.report
+            FROM analysis_records r LEFT JOIN analysis_bodies b ON b.record_id = r.id
+            ORDER BY r.created_at DESC, r.id DESC
+        ''')
+        records = []
+        for row in cursor:
+            if (
+                query in row["topic"]
+                or query in (_decompress(row["insight_result"]) or "")
+                or query in (_decompress(row["report"]) or "")
+            ):
+                records.append({"id": row["id"], "topic": row["topic"], "created_at": row["created_at"]})
+                if len(records) >= limit:
+                    break
+        return records
+    
+    def delete_analysis_record(self, record_id: int) -> bool:
+        """
+        删除分析记录及其正文、爬虫数据引用和全文索引条目
+        
+        全文索引为无内容表，删除索引条目需要提供原始内容，因此先解压正文再删除
+        
+        Args:
+            record_id: 记录ID
+            
+        Returns:
+            是否删除了记录
+        """
+        try:
+            with self._connection() as conn:
+                row = conn.execute('''
+                    SELECT r.topic, b.insight_result, b.report
+                    FROM analysis_records r LEFT JOIN analysis_bodies b ON b.record_id = r.id
+                    WHERE r.id = ?
+                ''', (record_id,)).fetchone()
+                if row is None:
+                    return False
+                if self.fts_enabled:
+                    conn.execute('''
+                        INSERT INTO analysis_fts (analysis_fts, rowid, topic, insight_result, report)
+                        VALUES ('delete', ?, ?, ?, ?)
+                    ''', (record_id, row["topic"], _decompress(row["insight_result"]), _decompress(row["report"])))
+                conn.execute("DELETE FROM analysis_items WHERE record_id = ?", (record_id,))
+                conn.execute("DELETE FROM analysis_bodies WHERE record_id = ?", (record_id,))
+                conn.execute("DELETE FROM analysis_records WHERE id = ?", (record_id,))
+            logger.info(f"分析记录已删除: {record_id}")
+            return True
+        except Exception as e:
+            logger.error(f"删除分析记录失败: {e}")
+            return False
+    
+    @staticmethod
+    def _make_snippet(query: str, *texts: str, width: int = 24) -> str:
+        """
+        截取关键词附近的文本片段
+        
+        Args:
+            query: 搜索关键词
+            texts: 候选文本
+            width: 关键词两侧保留的字符数
+            
+        Returns:
+            匹配片段，关键词用[]标出
+        """
+        for text in texts:
+            index = text.find(query)
+            if index >= 0:
+                start = max(0, index - width)
+                end = min(len(text), index + len(query) + width)
+                return (
+                    ("..." if start > 0 else "")
+                    + text[start:index] + f"[{query}]" + text[index + len(query):end]
+                    + ("..." if end < len(text) else "")
+                )
+        return next((text[:width * 2] for text in texts if text), "")
+    
+    def get_analysis_record(self, record_id: int,
+                            fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
         """
-        获取特定分析记录的详细信息
+        获取特定分析记录的详细信息，正文字段按需解压加载
         
         Args:
             record_id: 记录ID
+            fields: 需要加载的正文字段（crawled_data/insight_result/report），None表示全部
             
         Returns:
-            记录详细信息
+            记录详细信息；引用了爬虫数据的记录以crawled_items返回原始条目，
+            由调用方格式化为crawled_data
         """
+        fields = RECORD_BODY_FIELDS if fields is None else fields
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT * FROM analysis_records WHERE id = ?
+                    SELECT id, topic, sentiment, report_sections, created_at FROM analysis_records WHERE id = ?
                 ''', (record_id,))
                 row = cursor.fetchone()
-                return dict(row) if row else {}
+                if not row:
+                    return {}
+                record = dict(row)
+                for field in ("sentiment", "report_sections"):
+                    record[field] = json.loads(record[field]) if record[field] else None
+                
+                columns = [
+                    "crawled_content" if field == "crawled_data" else field
+                    for field in fields if field in RECORD_BODY_FIELDS
+                ]
+                if columns:
+                    cursor.execute(f'''
+                        SELECT {", ".join(columns)} FROM analysis_bodies WHERE record_id = ?
+                    ''', (record_id,))
+                    body = cursor.fetchone()
+                    for field, column in zip([f for f in fields if f in RECORD_BODY_FIELDS], columns):
+                        record[field] = _decompress(body[column]) if body else None
+                
+                if "crawled_data" in fields and record.get("crawled_data") is None:
+                    cursor.execute('''
+                        SELECT c.id, c.content, c.likes, c.comments,
+                               c.sentiment, c.sentiment_label, c.relevance
+                        FROM analysis_items i JOIN crawled_data c ON c.id = i.item_id
+                        WHERE i.record_id = ? ORDER BY i.position
+                    ''', (record_id,))
+                    record["crawled_items"] = [dict(item) for item in cursor.fetchall()]
+                
+                return record
         except Exception as e:
             logger.error(f"获取分析记录详情失败: {e}")
             return {}
 
+    def create_job(self, job_id: str, topic: str) -> bool:
+        """
+        创建分析任务
+        
+        Args:
+            job_id: 任务ID
+            topic: 分析主题
+            
+        Returns:
+            是否创建成功
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO jobs (id, topic) VALUES (?, ?)
+                ''', (job_id, topic))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"创建分析任务失败: {e}")
+            return False
+    
+    def update_job_status(self, job_id: str, status: str,
+                          result: Optional[str] = None,
+                          error: Optional[str] = None) -> bool:
+        """
+        更新分析任务状态，并记录对应阶段的时间戳
+        
+        Args:
+            job_id: 任务ID
+            status: 新状态（queued/running/crawled/analyzed/succeeded/failed）
+            result: 任务结果（JSON字符串）
+            error: 错误信息
+            
+        Returns:
+            是否更新成功
+        """
+        assignments = ["status = ?"]
+        params: List[Any] = [status]
+        column = JOB_STAGE_COLUMNS.get(status)
+        if column:
+            assignments.append(f"{column} = CURRENT_TIMESTAMP")
+        if result is not None:
+            assignments.append("result = ?")
+            params.append(result)
+        if error is not None:
+            assignments.append("error = ?")
+            params.append(error)
+        params.append(job_id)
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"UPDATE jobs SET {', '.join(assignments)} WHERE id = ?",
+                    params
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"更新分析任务状态失败: {e}")
+            return False
+    
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        获取分析任务信息
+        
+        Args:
+            job_id: 任务ID
+            
+        Returns:
+            任务信息
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT * FROM jobs WHERE id = ?
+                ''', (job_id,))
+                row = cursor.fetchone()
+                return dict(row) if row else {}
+        except Exception as e:
+            logger.error(f"获取分析任务失败: {e}")
+            return {}
+
+    def get_cached_completion(self, cache_key: str, ttl: int) -> Dict[str, Any]:
+        """
+        获取未过期的LLM生成结果缓存
+        
+        Args:
+            cache_key: 缓存键
+            ttl: 缓存有效期（秒）
+            
+        Returns:
+            缓存内容，未命中时返回空字典
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT content, prompt_tokens, completion_tokens FROM llm_cache
+                    WHERE cache_key = ? AND created_at > datetime('now', ?)
+                ''', (cache_key, f"-{int(ttl)} seconds"))
+                row = cursor.fetchone()
+                if not row:
+                    return {}
+                cursor.execute('''
+                    UPDATE llm_cache SET accessed_at = CURRENT_TIMESTAMP WHERE cache_key = ?
+                ''', (cache_key,))
+                conn.commit()
+                return dict(row)
+        except Exception as e:
+            logger.error(f"获取LLM缓存失败: {e}")
+            return {}
+    
+    def save_cached_completion(self, cache_key: str, content: str,
+                               prompt_tokens: int, completion_tokens: int,
+                               max_entries: int, ttl: int) -> bool:
+        """
+        保存LLM生成结果缓存，并淘汰过期及超出容量的条目
+        
+        Args:
+            cache_key: 缓存键
+            content: 生成内容
+            prompt_tokens: prompt token数
+            completion_tokens: 生成token数
+            max_entries: 最大缓存条目数
+            ttl: 缓存有效期（秒）
+            
+        Returns:
+            是否保存成功
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO llm_cache
+                    (cache_key, content, prompt_tokens, completion_tokens)
+                    VALUES (?, ?, ?, ?)
+                ''', (cache_key, content, prompt_tokens, completion_tokens))
+                cursor.execute('''
+                    DELETE FROM llm_cache WHERE created_at <= datetime('now', ?)
+                ''', (f"-{int(ttl)} seconds",))
+                cursor.execute('''
+                    DELETE FROM llm_cache WHERE cache_key NOT IN (
+                        SELECT cache_key FROM llm_cache ORDER BY accessed_at DESC, rowid DESC LIMIT ?
+                    )
+                ''', (max_entries,))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"保存LLM缓存失败: {e}")
+            return False
+
+    def get_crawl_cache(self, source: str, topic: str, max_items: int) -> Dict[str, Any]:
+        """
+        获取爬取结果缓存
+        
+        Args:
+            source: 数据源名称
+            topic: 主题
+            max_items: 最大爬取条数
+            
+        Returns:
+            缓存条目（items/etag/last_modified/age），未命中时返回空字典
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT items, etag, last_modified,
+                           (julianday('now') - julianday(fetched_at)) * 86400 AS age
+                    FROM crawl_cache WHERE source = ? AND topic = ? AND max_items = ?
+                ''', (source, topic, max_items))
+                row = cursor.fetchone()
+                if not row:
+                    return {}
+                entry = dict(row)
+                entry["items"] = json.loads(entry["items"])
+                return entry
+        except Exception as e:
+            logger.error(f"获取爬取缓存失败: {e}")
+            return {}
+    
+    def save_crawl_cache(self, source: str, topic: str, max_items: int,
+                         items: List[Dict[str, Any]], etag: Optional[str] = None,
+                         last_modified: Optional[str] = None) -> bool:
+        """
+        保存爬取结果缓存
+        
+        Args:
+            source: 数据源名称
+            topic: 主题
+            max_items: 最大爬取条数
+            items: 爬取到的内容列表
+            etag: 响应的ETag
+            last_modified: 响应的Last-Modified
+            
+        Returns:
+            是否保存成功
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO crawl_cache
+                    (source, topic, max_items, items, etag, last_modified)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (source, topic, max_items, json.dumps(items, ensure_ascii=False),
+                      etag, last_modified))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"保存爬取缓存失败: {e}")
+            return False
+    
+    def touch_crawl_cache(self, source: str, topic: str, max_items: int) -> bool:
+        """
+        刷新爬取缓存的时间戳（条件请求返回304时使用）
+        
+        Args:
+            source: 数据源名称
+            topic: 主题
+            max_items: 最大爬取条数
+            
+        Returns:
+            是否更新成功
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE crawl_cache SET fetched_at = CURRENT_TIMESTAMP
+                    WHERE source = ? AND topic = ? AND max_items = ?
+                ''', (source, topic, max_items))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"更新爬取缓存失败: {e}")
+            return False
+
+    def save_monitor(self, topic: str, interval: int) -> bool:
+        """
+        添加或更新监控主题，新主题会在下一次调度时立即执行
+        
+        Args:
+            topic: 主题
+            interval: 监控周期（秒）
+            
+        Returns:
+            是否保存成功
+        """
+        try:
+            with self._connection() as conn:
+                conn.execute('''
+                    INSERT INTO monitors (topic, interval) VALUES (?, ?)
+                    ON CONFLICT(topic) DO UPDATE SET interval = excluded.interval
+                ''', (topic, interval))
+            return True
+        except Exception as e:
+            logger.error(f"保存监控主题失败: {e}")
+            return False
+    
+    def delete_monitor(self, topic: str) -> bool:
+        """
+        删除监控主题
+        
+        Args:
+            topic: 主题
+            
+        Returns:
+            是否删除了该主题
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute("DELETE FROM monitors WHERE topic = ?", (topic,))
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"删除监控主题失败: {e}")
+            return False
+    
+    def list_monitors(self, due_only: bool = False) -> List[Dict[str, Any]]:
+        """
+        获取监控主题列表
+        
+        Args:
+            due_only: 只返回已到执行时间的主题
+            
+        Returns:
+            监控主题列表
+        """
+        where = "WHERE next_run_at <= CURRENT_TIMESTAMP" if due_only else ""
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute(f'''
+                    SELECT topic, interval, last_run_at, next_run_at, last_new_items, created_at
+                    FROM monitors {where} ORDER BY next_run_at
+                ''')
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"获取监控主题失败: {e}")
+            return []
+    
+    def schedule_monitor(self, topic: str, delay: Optional[int] = None,
+                         new_items: Optional[int] = None) -> bool:
+        """
+        安排监控主题的下一次执行
+        
+        Args:
+            topic: 主题
+            delay: 距下一次执行的秒数，None表示按监控周期
+            new_items: 本轮发现的新内容数，提供时同时记录本轮执行时间
+            
+        Returns:
+            是否更新成功
+        """
+        try:
+            with self._connection() as conn:
+                if new_items is not None:
+                    conn.execute('''
+                        UPDATE monitors SET last_run_at = CURRENT_TIMESTAMP, last_new_items = ?
+                        WHERE topic = ?
+                    ''', (new_items, topic))
+                cursor = conn.execute('''
+                    UPDATE monitors
+                    SET next_run_at = datetime('now', '+' || COALESCE(?, interval) || ' seconds')
+                    WHERE topic = ?
+                ''', (delay, topic))
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"更新监控计划失败: {e}")
+            return False
+
 # 全局数据库实例
 _database_instance = None
 
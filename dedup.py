@@ -0,0 +1,155 @@
+"""
+近似重复内容检测模块
+使用MinHash签名估计内容之间的Jaccard相似度，识别转载、搬运等近似重复的爬取内容；
+签名按LSH分段索引，在大量历史数据中只需比较分段相同的候选内容
+"""
+
+import hashlib
+import random
+import struct
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 签名长度及LSH分段：16段×每段4个值，相似度0.7时成为候选的概率约为99%
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+MINHASH_ROWS = MINHASH_PERMUTATIONS // MINHASH_BANDS
+
+# 字符n-gram长度，中文没有空格分词，按字符切分
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# 固定种子生成哈希函数参数，保证签名在不同进程、不同运行之间一致
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+_SIGNATURE_FORMAT = f"<{MINHASH_PERMUTATIONS}I"
+_BAND_FORMAT = f"<{MINHASH_ROWS}I"
+
+
+def minhash(text: str) -> List[int]:
+    """
+    计算文本的MinHash签名
+
+    Args:
+        text: 已清理的文本
+
+    Returns:
+        长度为 MINHASH_PERMUTATIONS 的签名
+    """
+    text = text.lower()
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+        for shingle in shingles
+    ]
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """
+    由签名估计两段内容的Jaccard相似度
+
+    Args:
+        a: 签名
+        b: 签名
+
+    Returns:
+        0~1之间的相似度
+    """
+    return sum(x == y for x, y in zip(a, b)) / MINHASH_PERMUTATIONS
+
+
+def signature_bands(signature: List[int]) -> List[int]:
+    """
+    将签名按LSH分段并哈希，任一分段相同的内容才需要比较
+
+    Args:
+        signature: 签名
+
+    Returns:
+        各分段的64位有符号哈希（可直接存入SQLite）
+    """
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                struct.pack(_BAND_FORMAT, *signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]),
+                digest_size=8
+            ).digest(),
+            "little", signed=True
+        )
+        for band in range(MINHASH_BANDS)
+    ]
+
+
+def pack_signature(signature: List[int]) -> bytes:
+    """将签名序列化为二进制"""
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+
+def unpack_signature(data: bytes) -> List[int]:
+    """从二进制还原签名"""
+    return list(struct.unpack(_SIGNATURE_FORMAT, data))
+
+
+def engagement(item: Dict[str, Any]) -> int:
+    """内容的互动量（点赞 + 评论）"""
+    return (item.get("likes") or 0) + (item.get("comments") or 0)
+
+
+def deduplicate(items: List[Dict[str, Any]], threshold: float,
+                normalize: Optional[Callable[[str], str]] = None) -> List[Dict[str, Any]]:
+    """
+    合并近似重复的内容，每组只保留互动量最高的一条
+
+    各组按首条内容的签名建立LSH分段索引，每条内容只与分段相同的组比较；
+    代表内容被互动量更高的内容替换时，组的匹配签名保持不变，避免组的中心随替换漂移
+
+    Args:
+        items: 爬取到的内容列表
+        threshold: 视为重复的最小相似度
+        normalize: 计算签名前的文本清理函数
+
+    Returns:
+        去重后的内容列表，按每组首次出现的位置排列；每条内容附带自身的minhash签名
+    """
+    groups: List[Dict[str, Any]] = []
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for item in items:
+        text = item.get("content", "")
+        signature = minhash(normalize(text) if normalize else text)
+        bands = signature_bands(signature)
+
+        # 与最早出现的匹配组合并，与逐组比较的结果一致
+        candidates = sorted({
+            index for band, value in enumerate(bands) for index in buckets.get((band, value), ())
+        })
+        for index in candidates:
+            group = groups[index]
+            if similarity(signature, group["signature"]) >= threshold:
+                if engagement(item) > engagement(group["item"]):
+                    group["item"] = item
+                    group["item_signature"] = signature
+                break
+        else:
+            for band, value in enumerate(bands):
+                buckets.setdefault((band, value), []).append(len(groups))
+            groups.append({"item": item, "signature": signature, "item_signature": signature})
+
+    deduplicated = []
+    for group in groups:
+        item = dict(group["item"])
+        item["minhash"] = group["item_signature"]
+        deduplicated.append(item)
+    return deduplicated
@@ -0,0 +1,259 @@
+"""
+合并生成模块
+用一个prompt、一次生成同时输出洞察分析和舆情报告，爬取内容只需预填充一次；
+输出按分段标记拆分回分析结果和报告，拆分失败时退回分析、报告两次调用
+"""
+
+import itertools
+import threading
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+from loguru import logger
+from local_llm import LocalLLMClient
+from analyzer import Analyzer
+from reporter import Reporter
+from metrics import traced
+from report_sections import INSIGHT_SECTIONS, REPORT_SECTIONS, parse_sections, format_sections
+
+# 合并输出中分析结果和报告的分段标记
+INSIGHT_MARKER = "【洞察分析】"
+REPORT_MARKER = "【舆情报告】"
+
+# 提示词中要求的分析结果和报告字数上限，未配置生成长度时据此估算
+INSIGHT_MAX_CHARS = 200
+REPORT_MAX_CHARS = 500
+
+
+class FusedGenerator:
+    """分析与报告合并生成器"""
+
+    def __init__(self, llm_client: LocalLLMClient):
+        """
+        初始化合并生成器
+
+        Args:
+            llm_client: 本地LLM客户端
+        """
+        self.llm_client = llm_client
+        self.config = llm_client.config
+        # 复用分析器的内容整理（分段摘要、上下文打包）
+        self.analyzer = Analyzer(llm_client)
+
+    @traced("fused")
+    def generate(self, topic: str, crawled_content: str,
+                 crawled_data: Optional[List[Dict[str, Any]]] = None) -> Optional[Dict[str, str]]:
+        """
+        一次生成分析结果和报告
+
+        Args:
+            topic: 分析的主题
+            crawled_content: 爬取的内容
+            crawled_data: 爬取到的原始数据列表
+
+        Returns:
+            {'insight_result': 分析结果, 'report': 报告, 'report_sections': 报告小节字段}，
+            生成失败或输出无法拆分时返回None
+        """
+        logger.info(f"开始合并生成分析和报告: {topic}")
+
+        max_new_tokens = self._max_new_tokens()
+        messages = self._prepare_messages(topic, crawled_content, crawled_data, max_new_tokens)
+        response = self.llm_client.chat_completion(messages, max_new_tokens=max_new_tokens)
+
+        if response["choices"][0]["finish_reason"] == "error":
+            logger.error(f"合并生成过程中发生错误: {response['choices'][0]['message']['content']}")
+            return None
+
+        result = split_fused_output(response["choices"][0]["message"]["content"])
+        if result is None:
+            logger.warning(f"合并生成的输出无法拆分为分析结果和报告: {topic}")
+            return None
+
+        logger.info(f"合并生成完成: {topic}")
+        return result
+
+    def generate_stream(self, topic: str, crawled_content: str,
+                        crawled_data: Optional[List[Dict[str, Any]]] = None,
+                        stop_event: Optional[threading.Event] = None) -> Iterator[Tuple[str, str]]:
+        """
+        流式合并生成，按分段标记将输出片段分到分析结果和报告
+
+        Args:
+            topic: 分析的主题
+            crawled_content: 爬取的内容
+            crawled_data: 爬取到的原始数据列表
+            stop_event: 可选的停止事件，设置后中止生成
+
+        Yields:
+            ('insight' 或 'report', 文本片段)，分段标记及其之前的开场白不输出；
+            由调用方在生成结束后拆分小节，拆分失败时另行生成分析和报告
+        """
+        logger.info(f"开始流式合并生成分析和报告: {topic}")
+
+        max_new_tokens = self._max_new_tokens()
+        messages = self._prepare_messages(topic, crawled_content, crawled_data, max_new_tokens)
+        text = ""
+        emitted = {'insight': 0, 'report': 0}
+        stream = self.llm_client.stream_chat_completion(
+            messages, max_new_tokens=max_new_tokens, stop_event=stop_event
+        )
+        # 生成结束后再输出一次，补上末尾暂缓输出的文本
+        for chunk, final in itertools.chain(((chunk, False) for chunk in stream), [("", True)]):
+            text += chunk
+            for part, content in zip(('insight', 'report'), route_fused_output(text, final)):
+                if len(content) > emitted[part]:
+                    yield part, content[emitted[part]:]
+                    emitted[part] = len(content)
+
+        logger.info(f"流式合并生成完成: {topic}")
+
+    def _max_new_tokens(self) -> int:
+        """
+        合并生成的最大token数：未配置时按提示词要求的分段标记、小节标题和字数上限估算
+
+        Returns:
+            最大生成token数
+        """
+        if self.config.PIPELINE_FUSED_MAX_TOKENS > 0:
+            return self.config.PIPELINE_FUSED_MAX_TOKENS
+        skeleton = "\n".join(
+            [INSIGHT_MARKER] + [f"{section}：" for section in INSIGHT_SECTIONS]
+            + [REPORT_MARKER] + [f"{section}：" for section in REPORT_SECTIONS]
+        )
+        # 中文内容按一字一token估算，留出余量保证最后一个小节不被截断
+        return self.llm_client.count_tokens(skeleton) + INSIGHT_MAX_CHARS + REPORT_MAX_CHARS
+
+    def _prepare_messages(self, topic: str, crawled_content: str,
+                          crawled_data: Optional[List[Dict[str, Any]]],
+                          max_new_tokens: int) -> List[Dict[str, str]]:
+        """复用分析器的内容整理，按生成长度留出的预算构造提示词"""
+        crawled_content = self.analyzer._prepare_content(
+            topic, crawled_content, crawled_data,
+            lambda content: self._build_messages(topic, content), max_new_tokens
+        )
+        return self._build_messages(topic, crawled_content)
+
+    def _build_messages(self, topic: str, crawled_content: str) -> List[Dict[str, str]]:
+        """
+        构造合并生成提示词
+
+        Args:
+            topic: 分析的主题
+            crawled_content: 爬取的内容
+
+        Returns:
+            消息列表
+        """
+        insight_format = "\n".join(f"{section}：[{section}，严格基于提供内容]" for section in INSIGHT_SECTIONS)
+        report_format = "\n".join(f"{section}：[{section}]" for section in REPORT_SECTIONS)
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "你是一位专业的舆情分析师和舆情报告撰写专家，请根据提供的网络内容先进行简明扼要的分析，再生成一份结构清晰的舆情分析报告。\n"
+                    "严格按照以下格式输出：\n"
+                    f"{INSIGHT_MARKER}\n{insight_format}\n"
+                    f"{REPORT_MARKER}\n{report_format}\n"
+                    "注意：只基于提供的内容，不要添加任何额外信息，不要回答其他问题，不要引入任何外部对话或内容。"
+                )
+            },
+            {
+                "role": "user",
+                "content": f"""请基于以下关于"{topic}"的网络内容，先输出洞察分析，再输出舆情分析报告:
+
+{crawled_content}
+
+要求:
+1. 洞察分析包含{"、".join(INSIGHT_SECTIONS)}，总字数不超过{INSIGHT_MAX_CHARS}字
+2. 舆情报告包含以下部分：{"、".join(REPORT_SECTIONS)}，总字数控制在{REPORT_MAX_CHARS}字以内
+3. 必须输出{INSIGHT_MARKER}和{REPORT_MARKER}两个分段标记
+4. 每个部分用简练的语言表述，避免使用markdown格式，不要使用特殊符号如#、*等
+5. 使用中文撰写，严格基于提供的内容，只输出分析和报告内容
+"""
+            }
+        ]
+
+        return messages
+
+
+def split_fused_output(text: str) -> Optional[Dict[str, str]]:
+    """
+    将合并生成的输出拆分为分析结果和报告
+
+    Args:
+        text: 合并生成的文本
+
+    Returns:
+        {'insight_result': 分析结果, 'report': 报告, 'report_sections': 报告小节字段}，
+        分段标记或小节缺失时返回None
+    """
+    insight_start = text.find(INSIGHT_MARKER)
+    report_start = text.find(REPORT_MARKER, max(insight_start, 0))
+    if insight_start < 0 or report_start < 0:
+        return None
+
+    insight = parse_sections(text[insight_start + len(INSIGHT_MARKER):report_start], INSIGHT_SECTIONS)
+    report = parse_sections(text[report_start + len(REPORT_MARKER):], REPORT_SECTIONS)
+    if insight is None or report is None:
+        return None
+    return {
+        'insight_result': format_sections(insight),
+        'report': format_sections(report),
+        'report_sections': report
+    }
+
+
+def route_fused_output(text: str, final: bool = False) -> Tuple[str, str]:
+    """
+    将（可能尚未生成完的）合并输出分为分析部分和报告部分
+
+    Args:
+        text: 目前为止生成的文本
+        final: 是否已生成完毕；未完成时末尾可能是不完整的分段标记，暂不计入
+
+    Returns:
+        (分析部分, 报告部分)，报告分段标记尚未出现时报告部分为空；
+        分析分段标记出现之前的文本（模型的开场白）不计入，生成完毕仍没有分析分段标记时整段作为分析部分
+    """
+    insight_start = text.find(INSIGHT_MARKER)
+    if insight_start < 0 and not final:
+        return "", ""
+    insight_start = insight_start + len(INSIGHT_MARKER) if insight_start >= 0 else 0
+    report_start = text.find(REPORT_MARKER, insight_start)
+    if report_start >= 0:
+        return text[insight_start:report_start].lstrip(), text[report_start + len(REPORT_MARKER):].lstrip()
+    holdback = 0 if final else len(REPORT_MARKER) - 1
+    return text[insight_start:max(insight_start, len(text) - holdback)].lstrip(), ""
+
+
+def analyze_and_report(llm_client: LocalLLMClient, topic: str, crawled_content: str,
+                       crawled_data: Optional[List[Dict[str, Any]]] = None,
+                       on_analyzed: Optional[Callable[[], None]] = None
+                       ) -> Tuple[str, str, Optional[Dict[str, str]]]:
+    """
+    生成分析结果和报告：开启合并生成时先尝试一次生成，失败时退回分析、报告两次调用
+
+    Args:
+        llm_client: 本地LLM客户端
+        topic: 分析的主题
+        crawled_content: 爬取的内容
+        crawled_data: 爬取到的原始数据列表
+        on_analyzed: 得到分析结果后的回调，用于更新任务状态
+
+    Returns:
+        (分析结果, 报告, 报告小节字段)，报告不是按小节结构生成时小节字段为None
+    """
+    if llm_client.config.PIPELINE_FUSED_ENABLED:
+        result = FusedGenerator(llm_client).generate(topic, crawled_content, crawled_data)
+        if result is not None:
+            if on_analyzed:
+                on_analyzed()
+            return result['insight_result'], result['report'], result['report_sections']
+        logger.info("退回分析、报告分别生成")
+
+    insight_result = Analyzer(llm_client).analyze(topic, crawled_content, crawled_data)
+    if on_analyzed:
+        on_analyzed()
+    report, report_sections = Reporter(llm_client).generate_sections(
+        topic, crawled_content, insight_result, crawled_data
+    )
+    return insight_result, report, report_sections
@@ -0,0 +1,273 @@
+"""
+搜索结果页面快速提取模块
+按数据源预先定义结果容器和标题/正文的选择规则，增量解析页面，取满所需条数后立即停止；
+安装了lxml时使用lxml的增量解析器和预编译XPath，否则使用标准库HTMLParser，
+只为结果容器内部建立节点，页面其余部分（导航、脚本等）不建树
+"""
+
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# 每次喂给解析器的字符数，取满结果后剩余部分不再解析
+FEED_CHUNK_SIZE = 16 * 1024
+
+# 文本不计入get_text的元素，与BeautifulSoup的行为一致
+_SKIPPED_TEXT_TAGS = frozenset(("script", "style", "template"))
+
+# 没有结束标签的元素
+_VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr"
+))
+
+
+class ResultSelector:
+    """一个数据源搜索结果的提取规则"""
+
+    def __init__(self, container: Tuple[str, Dict[str, str]],
+                 title: List[Tuple[str, Optional[str]]],
+                 content: List[Tuple[str, Optional[str]]]):
+        """
+        初始化提取规则
+
+        Args:
+            container: 结果容器 (标签, {属性: 值})，属性为class时匹配任一class
+            title: 标题元素候选 [(标签, class或None)]，按顺序取第一个存在的
+            content: 正文元素候选，均不存在时使用整个容器的文本；为空列表表示不提取正文
+        """
+        self.container_tag, self.container_attrs = container
+        self.title = title
+        self.content = content
+        if etree is not None:
+            self._title_xpaths = [etree.XPath(_xpath(tag, cls)) for tag, cls in title]
+            self._content_xpaths = [etree.XPath(_xpath(tag, cls)) for tag, cls in content]
+
+    def matches(self, tag: str, attrs: Dict[str, str]) -> bool:
+        """判断元素是否为结果容器"""
+        if tag != self.container_tag:
+            return False
+        for name, value in self.container_attrs.items():
+            if name == "class":
+                if value not in (attrs.get("class") or "").split():
+                    return False
+            elif attrs.get(name) != value:
+                return False
+        return True
+
+
+def _xpath(tag: str, cls: Optional[str]) -> str:
+    """第一个匹配的后代元素的XPath"""
+    if cls is None:
+        return f"(.//{tag})[1]"
+    return f"(.//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')])[1]"
+
+
+class _Node:
+    """结果容器内的轻量节点"""
+
+    __slots__ = ("tag", "cls", "children")
+
+    def __init__(self, tag: str, attrs: Dict[str, str]):
+        self.tag = tag
+        self.cls = (attrs.get("class") or "").split()
+        self.children: List[Any] = []
+
+    def find(self, tag: str, cls: Optional[str]) -> Optional["_Node"]:
+        """深度优先查找第一个匹配的后代元素"""
+        for child in self.children:
+            if isinstance(child, _Node):
+                if child.tag == tag and (cls is None or cls in child.cls):
+                    return child
+                found = child.find(tag, cls)
+                if found is not None:
+                    return found
+        return None
+
+    def text(self) -> str:
+        """各段文本去除首尾空白后拼接，等同于BeautifulSoup的get_text(strip=True)"""
+        parts: List[str] = []
+        self._collect(parts)
+        return "".join(parts)
+
+    def _collect(self, parts: List[str]):
+        for child in self.children:
+            if isinstance(child, _Node):
+                if child.tag not in _SKIPPED_TEXT_TAGS:
+                    child._collect(parts)
+            else:
+                text = child.strip()
+                if text:
+                    parts.append(text)
+
+
+class _ResultParser(HTMLParser):
+    """只为结果容器建立节点的增量解析器"""
+
+    def __init__(self, selector: ResultSelector, max_items: int):
+        super().__init__(convert_charrefs=True)
+        self.selector = selector
+        self.max_items = max_items
+        self.results: List[_Node] = []
+        self._stack: List[_Node] = []
+
+    @property
+    def done(self) -> bool:
+        return len(self.results) >= self.max_items
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if self.done:
+            return
+        attrs = dict(attrs)
+        if not self._stack:
+            if not self.selector.matches(tag, attrs):
+                return
+        node = _Node(tag, attrs)
+        if self._stack:
+            self._stack[-1].children.append(node)
+        if tag not in _VOID_TAGS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if self._stack and not self.done:
+            self._stack[-1].children.append(_Node(tag, dict(attrs)))
+
+    def handle_endtag(self, tag: str):
+        if not self._stack:
+            return
+        # 未闭合的元素随其父元素一起结束
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth].tag == tag:
+                closed = self._stack[depth]
+                del self._stack[depth:]
+                if not self._stack and not self.done:
+                    self.results.append(closed)
+                return
+
+    def handle_data(self, data: str):
+        if self._stack:
+            self._stack[-1].children.append(data)
+
+    def close(self):
+        super().close()
+        # 页面结束时仍未闭合的结果容器随文档一起结束，与BeautifulSoup的行为一致
+        if self._stack and not self.done:
+            self.results.append(self._stack[0])
+        self._stack = []
+
+
+def _extract_stdlib(html: str, selector: ResultSelector, max_items: int) -> List[Tuple[str, str]]:
+    """使用标准库HTMLParser提取"""
+    parser = _ResultParser(selector, max_items)
+    for start in range(0, len(html), FEED_CHUNK_SIZE):
+        parser.feed(html[start:start + FEED_CHUNK_SIZE])
+        if parser.done:
+            break
+    else:
+        parser.close()
+
+    items = []
+    for container in parser.results:
+        title_node = None
+        for tag, cls in selector.title:
+            title_node = container.find(tag, cls)
+            if title_node is not None:
+                break
+        if title_node is None:
+            items.append(None)
+            continue
+        content = ""
+        if selector.content:
+            content_node = container
+            for tag, cls in selector.content:
+                found = container.find(tag, cls)
+                if found is not None:
+                    content_node = found
+                    break
+            content = content_node.text()
+        items.append((title_node.text(), content))
+    return items
+
+
+def _lxml_text(element: Any) -> str:
+    """lxml元素的文本，规则与_Node.text一致"""
+    parts: List[str] = []
+
+    def collect(node: Any):
+        if node.text:
+            text = node.text.strip()
+            if text:
+                parts.append(text)
+        for child in node:
+            # 注释、处理指令的tag不是字符串，其文本不计入，但其后的tail文本计入
+            if isinstance(child.tag, str) and child.tag not in _SKIPPED_TEXT_TAGS:
+                collect(child)
+            if child.tail:
+                tail = child.tail.strip()
+                if tail:
+                    parts.append(tail)
+
+    collect(element)
+    return "".join(parts)
+
+
+def _extract_lxml(html: str, selector: ResultSelector, max_items: int) -> List[Tuple[str, str]]:
+    """使用lxml增量解析器提取"""
+    parser = etree.HTMLPullParser(events=("end",), tag=selector.container_tag)
+    items = []
+
+    def read_events():
+        for _, element in parser.read_events():
+            if len(items) >= max_items or not selector.matches(element.tag, element.attrib):
+                continue
+            # 嵌套在另一个结果容器中的容器由外层容器处理
+            if any(selector.matches(parent.tag, parent.attrib) for parent in element.iterancestors()):
+                continue
+            title_element = next((found for xpath in selector._title_xpaths for found in xpath(element)), None)
+            if title_element is None:
+                items.append(None)
+                continue
+            content = ""
+            if selector.content:
+                content_element = next(
+                    (found for xpath in selector._content_xpaths for found in xpath(element)), element
+                )
+                content = _lxml_text(content_element)
+            items.append((_lxml_text(title_element), content))
+
+    for start in range(0, len(html), FEED_CHUNK_SIZE):
+        parser.feed(html[start:start + FEED_CHUNK_SIZE])
+        read_events()
+        if len(items) >= max_items:
+            return items
+    parser.close()
+    read_events()
+    return items
+
+
+def extract_results(html: str, selector: ResultSelector, max_items: int) -> List[Optional[Tuple[str, str]]]:
+    """
+    提取搜索结果，取满max_items个结果容器后停止解析
+
+    Args:
+        html: 页面HTML
+        selector: 提取规则
+        max_items: 最多处理的结果容器数
+
+    Returns:
+        每个结果容器的(标题, 正文)，没有标题元素的容器为None
+    """
+    if max_items <= 0:
+        return []
+    if etree is not None:
+        return _extract_lxml(html, selector, max_items)
+    return _extract_stdlib(html, selector, max_items)
+
+
+def parser_name() -> str:
+    """当前使用的解析器名称"""
+    return "lxml" if etree is not None else "html.parser-incremental"
@@ -0,0 +1,174 @@
+"""
+推理后端模块
+按配置选择模型的加载方式：GPU上使用半精度+8位量化，CPU上可选float32、bfloat16或int8动态量化，
+并统一处理计算线程数和torch.compile
+"""
+
+from typing import Any, Dict, Optional, Tuple
+import torch
+from transformers import AutoModelForCausalLM
+from loguru import logger
+
+from config import Settings
+
+# 可选的推理后端，auto在有GPU时选cuda，否则在CPU支持时选cpu-bf16，再退回cpu-fp32
+BACKENDS = ("auto", "cuda", "cpu-fp32", "cpu-bf16", "cpu-int8")
+
+
+def cpu_supports_bf16() -> bool:
+    """
+    判断CPU是否有bfloat16加速指令（AVX512-BF16/AMX），没有时bfloat16反而比float32慢
+
+    Returns:
+        是否支持
+    """
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def resolve_backend(name: str) -> str:
+    """
+    将配置的后端名解析为实际使用的后端
+
+    Args:
+        name: 配置的后端名
+
+    Returns:
+        实际后端名
+
+    Raises:
+        ValueError: 后端名无效
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"未知的推理后端: {name}，可选: {', '.join(BACKENDS)}")
+    if name == "auto":
+        if torch.cuda.is_available():
+            return "cuda"
+        return "cpu-bf16" if cpu_supports_bf16() else "cpu-fp32"
+    if name == "cuda" and not torch.cuda.is_available():
+        logger.warning("未检测到GPU，推理后端cuda退回cpu-fp32")
+        return "cpu-fp32"
+    return name
+
+
+def configure_threads(num_threads: int):
+    """
+    设置CPU推理的计算线程数
+
+    Args:
+        num_threads: 线程数，0表示保持torch默认值
+    """
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+
+def load_model(config: Settings, model_path: str, backend: str) -> Tuple[Any, Any, bool]:
+    """
+    按后端加载模型
+
+    Args:
+        config: 配置对象
+        model_path: 模型目录
+        backend: 已解析的后端名
+
+    Returns:
+        (模型, 加载使用的dtype, 是否已编译)
+    """
+    if backend == "cuda":
+        torch_dtype = torch.float16
+    elif backend == "cpu-bf16":
+        torch_dtype = torch.bfloat16
+    else:
+        torch_dtype = torch.float32
+
+    # 加载模型，使用更多优化参数减少内存使用
+    model = AutoModelForCausalLM.from_pretrained(
+        model_path,
+        torch_dtype=torch_dtype,
+        device_map="auto",
+        trust_remote_code=True,
+        low_cpu_mem_usage=True,  # 减少CPU内存使用
+        load_in_8bit=backend == "cuda",  # GPU上使用8位量化
+    )
+
+    if backend == "cpu-int8":
+        # 线性层权重量化为int8，激活在运行时动态量化，主要的矩阵乘法开销减少约一半
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    compiled = False
+    if config.LLM_TORCH_COMPILE:
+        try:
+            model.forward = torch.compile(model.forward, dynamic=True)
+            compiled = True
+        except Exception as e:
+            logger.warning(f"torch.compile不可用，使用未编译的模型: {e}")
+
+    return model, torch_dtype, compiled
+
+
+def model_memory_bytes(model: Any) -> int:
+    """
+    统计模型权重占用的内存，包括量化模块中打包的权重
+
+    Args:
+        model: 模型
+
+    Returns:
+        字节数
+    """
+    def tensor_bytes(value: Any) -> int:
+        if isinstance(value, torch.Tensor):
+            return value.element_size() * value.nelement()
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_bytes(item) for item in value)
+        return 0
+
+    return sum(tensor_bytes(value) for value in model.state_dict().values())
+
+
+def backend_info(backend: str, model: Any, compiled: bool, load_seconds: float) -> Dict[str, Any]:
+    """
+    汇总推理后端信息，用于启动日志和模型状态接口
+
+    Args:
+        backend: 后端名
+        model: 已加载的模型
+        compiled: 是否已编译
+        load_seconds: 加载耗时
+
+    Returns:
+        后端信息
+    """
+    return {
+        "backend": backend,
+        "dtype": str(next(model.parameters()).dtype).replace("torch.", ""),
+        "threads": torch.get_num_threads(),
+        "compiled": compiled,
+        "load_seconds": round(load_seconds, 2),
+        "memory_mb": round(model_memory_bytes(model) / 1024 ** 2, 1),
+        "warmup_tokens_per_second": None
+    }
+
+
+def backend_summary(info: Optional[Dict[str, Any]]) -> str:
+    """
+    将后端信息格式化为一行日志
+
+    Args:
+        info: backend_info返回的信息
+
+    Returns:
+        日志文本
+    """
+    if not info:
+        return "推理后端未知"
+    summary = (
+        f"推理后端 {info['backend']}（{info['dtype']}，{info['threads']} 线程"
+        f"{'，已编译' if info['compiled'] else ''}），加载 {info['load_seconds']}s，"
+        f"权重 {info['memory_mb']} MB"
+    )
+    if info.get("warmup_tokens_per_second") is not None:
+        summary += f"，预热 {info['warmup_tokens_per_second']} tokens/s"
+    return summary
@@ -0,0 +1,176 @@
+"""
+分析任务队列模块
+使用有界的进程内工作线程池异步执行 爬虫 → 分析 → 报告 流程
+"""
+
+import json
+import queue
+import threading
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+from db import SimpleDatabase
+from metrics import get_metrics
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+
+
+class JobQueue:
+    """有界分析任务队列"""
+
+    def __init__(self, handler: Callable[[str, str], Dict[str, Any]],
+                 database: SimpleDatabase, workers: int = 1, max_size: int = 8):
+        """
+        初始化任务队列
+
+        Args:
+            handler: 任务处理函数，接收(job_id, topic)，返回结果字典
+            database: 数据库实例，用于持久化任务状态
+            workers: 工作线程数
+            max_size: 等待队列的最大长度
+        """
+        self.handler = handler
+        self.database = database
+        self.max_size = max_size
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_size)
+        self._submit_lock = threading.Lock()
+        # 不经过队列、在请求线程中直接执行的流式分析数，与排队任务共用上限
+        self._reserved = 0
+        self._workers: List[threading.Thread] = []
+
+        for i in range(max(1, workers)):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"job-worker-{i}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+        logger.info(f"任务队列初始化完成，工作线程数: {len(self._workers)}，队列上限: {max_size}")
+
+    def submit(self, topic: str) -> str:
+        """
+        提交分析任务
+
+        Args:
+            topic: 分析主题
+
+        Returns:
+            任务ID
+
+        Raises:
+            QueueFullError: 等待队列已满
+        """
+        with self._submit_lock:
+            if self._queue.qsize() + self._reserved >= self.max_size:
+                raise QueueFullError(f"任务队列已满（上限 {self.max_size}）")
+
+            job_id = uuid.uuid4().hex
+            if not self.database.create_job(job_id, topic):
+                raise RuntimeError("创建分析任务失败")
+            self._queue.put_nowait((job_id, topic))
+
+        logger.info(f"分析任务已入队: {job_id} ({topic})，当前排队数: {self.depth()}")
+        return job_id
+
+    def reserve(self) -> Callable[[], None]:
+        """
+        为不经过队列的流式分析占用一个名额，与排队任务共用上限
+
+        Returns:
+            释放名额的函数，可重复调用
+
+        Raises:
+            QueueFullError: 名额已满
+        """
+        with self._submit_lock:
+            if self._queue.qsize() + self._reserved >= self.max_size:
+                raise QueueFullError(f"任务队列已满（上限 {self.max_size}）")
+            self._reserved += 1
+
+        released = threading.Event()
+
+        def release():
+            with self._submit_lock:
+                if not released.is_set():
+                    released.set()
+                    self._reserved -= 1
+        return release
+
+    def reserved(self) -> int:
+        """
+        获取当前占用名额的流式分析数
+
+        Returns:
+            流式分析数
+        """
+        return self._reserved
+
+    def depth(self) -> int:
+        """
+        获取当前排队中的任务数
+
+        Returns:
+            排队任务数
+        """
+        return self._queue.qsize()
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        while True:
+            job_id, topic = self._queue.get()
+            try:
+                self._run_job(job_id, topic)
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job_id: str, topic: str):
+        """
+        执行单个分析任务
+
+        Args:
+            job_id: 任务ID
+            topic: 分析主题
+        """
+        logger.info(f"开始执行分析任务: {job_id} ({topic})")
+        self.database.update_job_status(job_id, "running")
+        try:
+            result = self.handler(job_id, topic)
+            self.database.update_job_status(
+                job_id, "succeeded",
+                result=json.dumps(result, ensure_ascii=False)
+            )
+            logger.info(f"分析任务完成: {job_id}")
+            get_metrics().inc("bettafish_jobs_total", help="已执行的分析任务数", status="succeeded")
+        except Exception as e:
+            logger.exception(f"分析任务执行失败: {job_id}: {e}")
+            self.database.update_job_status(job_id, "failed", error=str(e))
+            get_metrics().inc("bettafish_jobs_total", help="已执行的分析任务数", status="failed")
+
+
+# 全局任务队列实例
+_job_queue_instance: Optional[JobQueue] = None
+
+def get_job_queue(handler: Callable[[str, str], Dict[str, Any]],
+                  database: SimpleDatabase, workers: int = 1,
+                  max_size: int = 8) -> JobQueue:
+    """
+    获取任务队列实例（单例模式）
+
+    Args:
+        handler: 任务处理函数
+        database: 数据库实例
+        workers: 工作线程数
+        max_size: 等待队列的最大长度
+
+    Returns:
+        JobQueue实例
+    """
+    global _job_queue_instance
+    if _job_queue_instance is None:
+        _job_queue_instance = JobQueue(handler, database, workers, max_size)
+    return _job_queue_instance
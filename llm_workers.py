@@ -0,0 +1,279 @@
+"""
+LLM工作进程池模块
+在多核CPU服务器上以多个工作进程各自驻留一个模型副本（权重通过内存映射共享），
+经本地管道将生成请求路由到负载最低的工作进程
+"""
+
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+from loguru import logger
+
+from config import Settings
+from metrics import observe_completion
+
+
+def _worker_main(config: Settings, conn, replicas: int):
+    """
+    工作进程入口：加载模型，循环处理父进程发来的请求
+
+    Args:
+        config: 配置对象
+        conn: 与父进程通信的管道
+        replicas: 副本总数，用于分配每个进程的计算线程数
+    """
+    import torch
+    from local_llm import LocalLLMClient
+
+    # 未指定每个副本的线程数时，各副本平分CPU核心，避免线程间互相争抢
+    torch.set_num_threads(config.LLM_NUM_THREADS or max(1, (os.cpu_count() or 1) // replicas))
+
+    try:
+        client = LocalLLMClient(config)
+        client.warm_up()
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+    conn.send(("ready", (os.getpid(), client.backend_info)))
+
+    send_lock = threading.Lock()
+
+    def handle(request_id: int, method: str, args: tuple, kwargs: dict):
+        try:
+            result = ("ok", getattr(client, method)(*args, **kwargs))
+        except Exception as e:
+            result = ("error", str(e))
+        with send_lock:
+            conn.send((request_id,) + result)
+
+    # 用线程并发处理请求，使进程内的批量调度器可以合并生成
+    with ThreadPoolExecutor(max_workers=max(1, config.LLM_BATCH_SIZE)) as executor:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            executor.submit(handle, *message)
+
+
+class _WorkerHandle:
+    """父进程中对单个工作进程的引用"""
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.pending: Dict[int, Future] = {}
+        self.lock = threading.Lock()
+
+    def call(self, request_id: int, method: str, *args, **kwargs) -> Future:
+        """向工作进程发送请求，返回结果Future"""
+        future: Future = Future()
+        with self.lock:
+            self.pending[request_id] = future
+            self.conn.send((request_id, method, args, kwargs))
+        return future
+
+    def receive_loop(self):
+        """接收工作进程的响应并完成对应的Future"""
+        while True:
+            try:
+                request_id, status, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                future = self.pending.pop(request_id, None)
+            if future is None:
+                continue
+            if status == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+        # 工作进程退出时，让等待中的请求失败而不是一直阻塞
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("LLM工作进程已退出"))
+
+
+class LLMWorkerPool:
+    """LLM工作进程池，对外提供与LocalLLMClient相同的调用接口"""
+
+    def __init__(self, config: Settings, replicas: int):
+        """
+        启动工作进程并等待所有副本加载完成
+
+        Args:
+            config: 配置对象
+            replicas: 工作进程数
+        """
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.config = config
+        self.model_path = config.LOCAL_LLM_PATH
+        # 父进程只加载tokenizer和模型配置，用于统计token数和计算输入上限
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path, trust_remote_code=True)
+        model_config = AutoConfig.from_pretrained(self.model_path, trust_remote_code=True)
+        self.context_size: Optional[int] = getattr(model_config, "max_position_embeddings", None)
+        self._request_ids = itertools.count()
+        self._dispatch_lock = threading.Lock()
+        self.workers: List[_WorkerHandle] = []
+        # 各副本使用相同的推理后端，取第一个副本上报的后端信息
+        self.backend_info: Optional[Dict[str, Any]] = None
+
+        # 逐个启动工作进程：每个进程加载时会先持有一份私有权重，待共享映射后才释放，
+        # 同时加载会使峰值内存达到副本数倍的模型大小
+        context = multiprocessing.get_context("spawn")
+        for i in range(replicas):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(config, child_conn, replicas),
+                name=f"llm-worker-{i}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            worker = _WorkerHandle(process, parent_conn)
+            self.workers.append(worker)
+
+            try:
+                status, payload = worker.conn.recv()
+            except EOFError:
+                status, payload = "error", "工作进程意外退出"
+            if status != "ready":
+                self.close()
+                raise RuntimeError(f"LLM工作进程 {i} 启动失败: {payload}")
+            pid, info = payload
+            self.backend_info = self.backend_info or info
+            logger.info(f"LLM工作进程 {i} 已就绪 (pid={pid})")
+            threading.Thread(target=worker.receive_loop, name=f"llm-worker-recv-{i}", daemon=True).start()
+
+    def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """
+        将chat.completion请求分发给工作进程
+
+        Args:
+            messages: 对话历史消息列表
+
+        Returns:
+            模拟的OpenAI响应格式
+        """
+        response = self._dispatch("chat_completion", messages, **kwargs).result()
+        # 工作进程中的指标不会导出，在父进程中按返回的usage重新记录
+        observe_completion(response["usage"])
+        return response
+
+    def _dispatch(self, method: str, *args, **kwargs) -> Future:
+        """
+        将请求发送给进行中请求最少的存活工作进程
+
+        Args:
+            method: 工作进程中LocalLLMClient的方法名
+
+        Returns:
+            结果Future
+        """
+        with self._dispatch_lock:
+            alive = [worker for worker in self.workers if worker.process.is_alive()]
+            if not alive:
+                raise RuntimeError("没有可用的LLM工作进程")
+            worker = min(alive, key=lambda worker: len(worker.pending))
+            return worker.call(next(self._request_ids), method, *args, **kwargs)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        获取各工作进程的状态
+
+        Returns:
+            每个工作进程的pid、存活状态和进行中请求数
+        """
+        return [
+            {
+                "pid": worker.process.pid,
+                "alive": worker.process.is_alive(),
+                "in_flight": len(worker.pending)
+            }
+            for worker in self.workers
+        ]
+
+    def stream_chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """
+        跨进程不支持逐token流式返回，生成完成后一次性返回完整结果
+
+        Args:
+            messages: 对话历史消息列表
+
+        Yields:
+            完整的回复文本
+        """
+        # 停止事件无法传递给工作进程，已分发的生成无法中止
+        kwargs.pop("stop_event", None)
+        response = self.chat_completion(messages, **kwargs)
+        if response["choices"][0]["finish_reason"] == "error":
+            raise RuntimeError(response["choices"][0]["message"]["content"])
+        yield response["choices"][0]["message"]["content"]
+
+    def count_tokens(self, text: str) -> int:
+        """
+        统计文本的token数
+
+        Args:
+            text: 文本
+
+        Returns:
+            token数
+        """
+        return len(self.tokenizer(text, add_special_tokens=False).input_ids)
+
+    def count_prompt_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """
+        统计消息构造出的完整prompt的token数
+
+        Args:
+            messages: 消息列表
+
+        Returns:
+            token数
+        """
+        from local_llm import build_prompt
+        return len(self.tokenizer(build_prompt(messages)).input_ids)
+
+    def input_token_limit(self, max_new_tokens: Optional[int] = None) -> int:
+        """
+        计算prompt可用的token上限
+
+        Args:
+            max_new_tokens: 最大生成token数，None表示使用配置值
+
+        Returns:
+            prompt的token上限
+        """
+        from local_llm import input_token_limit
+        return input_token_limit(self.config, self.context_size, max_new_tokens)
+
+    def warm_up(self) -> float:
+        """
+        各工作进程在启动时已完成预热
+
+        Returns:
+            预热耗时（秒），父进程无需额外预热
+        """
+        return 0.0
+
+    def close(self):
+        """关闭所有工作进程"""
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
@@ -4,18 +4,85 @@
 
 import json
 import os
+import threading
+import time
 import warnings
-from typing import Dict, Any, List, Optional
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from transformers import (
+    AutoTokenizer, AutoModelForCausalLM, BatchEncoding, LogitsProcessorList,
+    StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+)
 import torch
 from loguru import logger
 from config import Settings
+from batch_scheduler import BatchScheduler
+from completion_cache import CompletionCache
+from db import get_database
+from prefix_cache import PrefixCache
+from metrics import observe_completion
+from inference_backend import backend_info, backend_summary, configure_threads, load_model, resolve_backend
+from report_sections import parse_sections
+from structured_decoding import SectionConstraint, SectionStoppingCriteria
+from shared_weights import checkpoint_dtype, share_model_weights
 
 # 设置环境变量以禁用transformers库的警告
 os.environ["TRANSFORMERS_VERBOSITY"] = "error"
 # 过滤掉特定的警告信息
 warnings.filterwarnings("ignore")
 
+class _PrefillTimer:
+    """在model.generate期间记录第一次前向计算的结束时间，以此区分预填充和逐token解码的耗时"""
+    
+    def __init__(self, model: Any, start: Optional[float] = None):
+        """
+        Args:
+            model: 主模型
+            start: 预填充的开始时间，默认为进入上下文的时间
+        """
+        self.model = model
+        self.start = start
+        self.prefill_end: Optional[float] = None
+        self.end: Optional[float] = None
+    
+    def __enter__(self) -> "_PrefillTimer":
+        self.start = self.start or time.perf_counter()
+        self._handle = self.model.register_forward_hook(self._hook)
+        return self
+    
+    def _hook(self, module, args, output):
+        if self.prefill_end is None:
+            self.prefill_end = time.perf_counter()
+    
+    def __exit__(self, *exc_info):
+        self._handle.remove()
+        self.end = time.perf_counter()
+    
+    def timings(self) -> Dict[str, float]:
+        """预填充和解码耗时（秒）"""
+        prefill_end = self.prefill_end or self.end
+        return {"prefill": prefill_end - self.start, "decode": self.end - prefill_end}
+
+class _StopOnEvent(StoppingCriteria):
+    """流式生成的中止条件：调用方设置停止事件或消费端关闭流时，在下一个token处结束生成"""
+    
+    def __init__(self, stop_event: Optional[threading.Event] = None):
+        """
+        Args:
+            stop_event: 调用方的停止事件，可在多次生成之间共用
+        """
+        self.stop_event = stop_event
+        self._cancelled = threading.Event()
+        self.stopped = False
+    
+    def cancel(self):
+        """中止本次生成"""
+        self._cancelled.set()
+    
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        if self._cancelled.is_set() or (self.stop_event is not None and self.stop_event.is_set()):
+            self.stopped = True
+        return self.stopped
+
 class LocalLLMClient:
     """本地LLM客户端"""
     
@@ -46,20 +113,109 @@ class LocalLLMClient:
                 else:
                     self.tokenizer.add_special_tokens({'pad_token': '[PAD]'})
             
-            # 加载模型，使用更多优化参数减少内存使用
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_path,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                device_map="auto",
-                trust_remote_code=True,
-                low_cpu_mem_usage=True,  # 减少CPU内存使用
-                load_in_8bit=True if torch.cuda.is_available() else False,  # 如果有GPU则使用8位量化
+            # 按配置选择推理后端，CPU服务器上可使用bfloat16或int8动态量化
+            configure_threads(config.LLM_NUM_THREADS)
+            self.backend = resolve_backend(config.LLM_BACKEND)
+            
+            # 多副本CPU推理时通过内存映射共享权重；int8量化后的线性层权重为进程私有，无法共享
+            share_weights = (
+                config.LLM_SHARED_WEIGHTS
+                and config.LLM_REPLICAS > 1
+                and self.backend in ("cpu-fp32", "cpu-bf16")
             )
+            if config.LLM_SHARED_WEIGHTS and config.LLM_REPLICAS > 1 and self.backend == "cpu-int8":
+                logger.warning("推理后端cpu-int8不支持多副本共享权重，各副本将各自持有量化后的权重")
+            # 只有文件中的权重dtype与后端一致时参数才能绑定到映射视图，否则所有参数都会被跳过；
+            # 不按文件dtype加载，CPU上的float16缺少矩阵乘法实现
+            if share_weights:
+                backend_dtype = torch.bfloat16 if self.backend == "cpu-bf16" else torch.float32
+                file_dtype = checkpoint_dtype(self.model_path)
+                if file_dtype != backend_dtype:
+                    logger.warning(
+                        f"模型文件的权重dtype为{file_dtype}，与推理后端{self.backend}不一致，"
+                        f"已关闭多副本共享权重，各副本将各自持有一份转换后的权重"
+                    )
+                    share_weights = False
             
-            logger.info("本地模型加载成功")
+            start_time = time.time()
+            self.model, torch_dtype, compiled = load_model(config, self.model_path, self.backend)
+            
+            self._mapped_weights = None
+            if share_weights:
+                self._mapped_weights, _ = share_model_weights(self.model, self.model_path)
+            
+            # 模型的上下文长度，输入与生成的token总数不能超过该值
+            self.context_size: Optional[int] = getattr(self.model.config, "max_position_embeddings", None)
+            
+            self.backend_info = backend_info(self.backend, self.model, compiled, time.time() - start_time)
+            logger.info(f"本地模型加载成功，{backend_summary(self.backend_info)}")
         except Exception as e:
             logger.error(f"本地模型加载失败: {e}")
             raise
+        
+        # 投机解码使用的草稿模型
+        self.draft_model = None
+        if config.LLM_DRAFT_MODEL_PATH:
+            self.draft_model = self._load_draft_model(config.LLM_DRAFT_MODEL_PATH, torch_dtype)
+        
+        # 同一时间只允许一次model.generate调用，避免模型被超额占用
+        self._generate_lock = threading.Lock()
+        
+        # 生成结果缓存，只对确定性生成生效
+        self.completion_cache: Optional[CompletionCache] = None
+        if config.LLM_CACHE_ENABLED:
+            self.completion_cache = CompletionCache(
+                get_database(),
+                memory_size=config.LLM_CACHE_MEMORY_SIZE,
+                db_max_entries=config.LLM_CACHE_DB_MAX_ENTRIES,
+                ttl=config.LLM_CACHE_TTL
+            )
+        
+        # 系统提示词前缀KV缓存
+        self.prefix_cache: Optional[PrefixCache] = None
+        if config.LLM_PREFIX_CACHE_ENABLED:
+            self.prefix_cache = PrefixCache(config.LLM_PREFIX_CACHE_SIZE)
+        
+        # 批量生成调度器，批大小为1时直接逐条生成
+        self.batch_scheduler: Optional[BatchScheduler] = None
+        if config.LLM_BATCH_SIZE > 1:
+            self.batch_scheduler = BatchScheduler(
+                self._generate_batch,
+                max_batch_size=config.LLM_BATCH_SIZE,
+                window=config.LLM_BATCH_WINDOW,
+                token_budget=config.LLM_BATCH_TOKEN_BUDGET
+            )
+    
+    def _load_draft_model(self, draft_path: str, torch_dtype: Any):
+        """
+        加载投机解码的草稿模型，草稿模型必须与主模型使用相同的词表
+        
+        Args:
+            draft_path: 草稿模型路径
+            torch_dtype: 与主模型一致的dtype
+            
+        Returns:
+            草稿模型，加载失败或词表不一致时返回None（退回普通解码）
+        """
+        try:
+            draft_tokenizer = AutoTokenizer.from_pretrained(draft_path, trust_remote_code=True)
+            if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+                logger.warning(f"草稿模型与主模型的词表不一致，不启用投机解码: {draft_path}")
+                return None
+            
+            draft_model = AutoModelForCausalLM.from_pretrained(
+                draft_path,
+                torch_dtype=torch_dtype,
+                device_map="auto",
+                trust_remote_code=True,
+                low_cpu_mem_usage=True
+            )
+            draft_model.generation_config.num_assistant_tokens = self.config.LLM_DRAFT_NUM_TOKENS
+            logger.info(f"草稿模型加载成功，启用投机解码: {draft_path}")
+            return draft_model
+        except Exception as e:
+            logger.error(f"草稿模型加载失败，不启用投机解码: {e}")
+            return None
     
     def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
         """
@@ -67,6 +223,8 @@ class LocalLLMClient:
         
         Args:
             messages: 对话历史消息列表
+            sections: 可选，小节标题列表；指定时按小节结构约束解码，
+                      响应的message中附带解析后的小节字段parsed
             
         Returns:
             模拟的OpenAI响应格式
@@ -74,55 +232,68 @@ class LocalLLMClient:
         try:
             # 构造prompt
             prompt = self._build_prompt(messages)
+            sections = kwargs.get("sections")
             
-            # 编码输入，包含attention_mask
-            inputs = self.tokenizer(
-                prompt, 
-                return_tensors="pt", 
-                padding=True,
-                truncation=True,
-                max_length=512
-            ).to(self.model.device)
-            
-            # 确保有attention_mask
-            if 'attention_mask' not in inputs:
-                inputs['attention_mask'] = torch.ones_like(inputs['input_ids'])
-            
-            # 设置默认参数和覆盖特定参数，优化处理速度
-            generation_kwargs = {
-                "max_new_tokens": kwargs.get("max_new_tokens", self.config.LLM_MAX_TOKENS),
-                "do_sample": kwargs.get("do_sample", self.config.LLM_DO_SAMPLE),
-                "temperature": kwargs.get("temperature", self.config.LLM_TEMPERATURE),
-                "pad_token_id": self.tokenizer.pad_token_id,
-                "eos_token_id": self.tokenizer.eos_token_id
-            }
+            generation_kwargs = self._build_generation_kwargs(**kwargs)
             
-            logger.debug(f"模型生成参数: {generation_kwargs}")
+            # 命中缓存时直接返回
+            cache_key = self._cache_key(
+                prompt, dict(generation_kwargs, sections=list(sections)) if sections else generation_kwargs
+            )
+            if cache_key is not None:
+                cached = self.completion_cache.get(cache_key)
+                if cached:
+                    logger.debug("LLM生成结果缓存命中")
+                    response = self._build_response(
+                        cached["content"], cached["prompt_tokens"], cached["completion_tokens"],
+                        {"cached": True}, sections
+                    )
+                    observe_completion(response["usage"])
+                    return response
             
-            # 生成回复，使用更高效的参数
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    **generation_kwargs
+            start_time = time.perf_counter()
+            draft_stats = None
+            if sections:
+                # 约束解码的状态按单条序列维护，不经过批量调度器；第一个小节标题会追加在prompt末尾
+                self._check_prompt_length(prompt + f"{sections[0]}：")
+                response_text, prompt_tokens, completion_tokens, timings = self._generate_structured(
+                    prompt, generation_kwargs, sections
+                )
+            elif self._use_draft_model(generation_kwargs):
+                # 投机解码只支持单条生成，不经过批量调度器
+                self._check_prompt_length(prompt)
+                response_text, prompt_tokens, completion_tokens, timings, draft_stats = self._generate_assisted(
+                    prompt, generation_kwargs
                 )
+            elif self.batch_scheduler is not None:
+                # 交给调度器与其他并发请求合并生成
+                prompt_tokens = min(self._check_prompt_length(prompt), self.config.LLM_MAX_INPUT_TOKENS)
+                future = self.batch_scheduler.submit(
+                    prompt, generation_kwargs,
+                    cost=prompt_tokens + generation_kwargs["max_new_tokens"]
+                )
+                response_text, prompt_tokens, completion_tokens, timings = future.result()
+            else:
+                self._check_prompt_length(prompt)
+                response_text, prompt_tokens, completion_tokens, timings = self._generate_batch(
+                    [prompt], generation_kwargs
+                )[0]
             
-            # 解码输出
-            response_text = self.tokenizer.decode(outputs[0][inputs.input_ids.shape[1]:], skip_special_tokens=True)
+            if cache_key is not None:
+                self.completion_cache.put(cache_key, response_text, prompt_tokens, completion_tokens)
             
-            return {
-                "choices": [{
-                    "message": {
-                        "role": "assistant",
-                        "content": response_text
-                    },
-                    "finish_reason": "stop"
-                }],
-                "usage": {
-                    "prompt_tokens": inputs.input_ids.shape[1],
-                    "completion_tokens": outputs.shape[1] - inputs.input_ids.shape[1],
-                    "total_tokens": outputs.shape[1]
-                }
+            # 除分词、预填充和解码外的耗时为在调度器中等待合批或等待生成锁的时间
+            generation_time = timings["prefill"] + timings["decode"]
+            timings["queue"] = max(0.0, time.perf_counter() - start_time - generation_time - timings["tokenize"])
+            usage = {
+                "tokens_per_second": round(completion_tokens / generation_time, 2) if generation_time else 0.0,
+                "timings": {phase: round(seconds, 4) for phase, seconds in timings.items()}
             }
+            if draft_stats is not None:
+                usage.update(draft_stats)
+            response = self._build_response(response_text, prompt_tokens, completion_tokens, usage, sections)
+            observe_completion(response["usage"])
+            return response
         except Exception as e:
             logger.error(f"本地模型调用失败: {e}")
             return {
@@ -140,6 +311,551 @@ class LocalLLMClient:
                 }
             }
     
+    def stream_chat_completion(self, messages: List[Dict[str, str]],
+                               stop_event: Optional[threading.Event] = None, **kwargs) -> Iterator[str]:
+        """
+        流式生成回复，每生成一段文本即返回
+        
+        Args:
+            messages: 对话历史消息列表
+            stop_event: 可选的停止事件，设置后生成在下一个token处结束；
+                        流被提前关闭时同样会结束生成
+            sections: 可选，小节标题列表；指定时按小节结构约束解码，第一个片段为第一个小节标题
+            
+        Yields:
+            新生成的文本片段
+        """
+        prompt = self._build_prompt(messages)
+        sections = kwargs.get("sections")
+        generation_kwargs = self._build_generation_kwargs(**kwargs)
+        
+        # 命中缓存时一次性返回完整结果
+        cache_key = self._cache_key(
+            prompt, dict(generation_kwargs, sections=list(sections)) if sections else generation_kwargs
+        )
+        if cache_key is not None:
+            cached = self.completion_cache.get(cache_key)
+            if cached:
+                logger.debug("LLM生成结果缓存命中")
+                observe_completion({
+                    "prompt_tokens": cached["prompt_tokens"],
+                    "completion_tokens": cached["completion_tokens"],
+                    "cached": True
+                })
+                yield cached["content"]
+                return
+        
+        start_time = time.perf_counter()
+        # 约束解码时第一个小节标题作为回复开头放入prompt，先返回给调用方
+        header = f"{sections[0]}：" if sections else ""
+        self._check_prompt_length(prompt + header)
+        use_draft_model = not sections and self._use_draft_model(generation_kwargs)
+        tokenize_start = time.perf_counter()
+        if use_draft_model:
+            # 投机解码不支持传入前缀KV缓存，完整编码prompt
+            inputs, prefix = self._encode_plain([prompt]), None
+        else:
+            inputs, prefix = self._encode([prompt + header])
+        tokenize_time = time.perf_counter() - tokenize_start
+        
+        streamer = TextIteratorStreamer(
+            self.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True
+        )
+        stopper = _StopOnEvent(stop_event)
+        stopping_criteria = StoppingCriteriaList([stopper])
+        constraint_kwargs = {}
+        if sections:
+            constraint = SectionConstraint(
+                self.tokenizer, sections, inputs.input_ids.shape[1],
+                generation_kwargs["max_new_tokens"], generation_kwargs.get("eos_token_id")
+            )
+            constraint_kwargs["logits_processor"] = LogitsProcessorList([constraint])
+            stopping_criteria.append(SectionStoppingCriteria(constraint))
+        errors: List[Exception] = []
+        # 在取得生成锁后开始计时，等待锁的时间计入排队耗时
+        timer = _PrefillTimer(self.model)
+        
+        def run_generate():
+            try:
+                with self._generate_lock, torch.no_grad(), timer:
+                    self.model.generate(
+                        **inputs,
+                        **self._prefix_kwargs(inputs, prefix),
+                        **generation_kwargs,
+                        **constraint_kwargs,
+                        **({"assistant_model": self.draft_model} if use_draft_model else {}),
+                        streamer=streamer,
+                        stopping_criteria=stopping_criteria
+                    )
+            except Exception as e:
+                errors.append(e)
+                # 结束流，避免消费端一直等待
+                streamer.end()
+        
+        thread = threading.Thread(target=run_generate, name="llm-stream", daemon=True)
+        thread.start()
+        
+        parts = [header] if header else []
+        if header:
+            yield header
+        try:
+            for text in streamer:
+                if text:
+                    parts.append(text)
+                    yield text
+        finally:
+            # 消费端提前关闭流（如客户端断开）时中止生成，避免继续占用生成锁直到max_new_tokens
+            stopper.cancel()
+        
+        thread.join()
+        if errors:
+            logger.error(f"本地模型流式调用失败: {errors[0]}")
+            raise errors[0]
+        
+        response_text = "".join(parts)
+        prompt_tokens = inputs.input_ids.shape[1]
+        completion_tokens = len(self.tokenizer(response_text, add_special_tokens=False).input_ids)
+        timings = dict(timer.timings(), tokenize=tokenize_time)
+        generation_time = timings["prefill"] + timings["decode"]
+        timings["queue"] = max(0.0, time.perf_counter() - start_time - generation_time - tokenize_time)
+        observe_completion({
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": round(completion_tokens / generation_time, 2) if generation_time else 0.0,
+            "timings": timings
+        })
+        
+        if stopper.stopped:
+            # 被中止的生成结果不完整，不写入缓存
+            logger.info("流式生成已中止")
+            return
+        
+        if cache_key is not None:
+            self.completion_cache.put(cache_key, response_text, prompt_tokens, completion_tokens)
+    
+    def warm_up(self) -> float:
+        """
+        执行一次简短的生成以预热模型，不经过生成结果缓存
+        
+        Returns:
+            预热耗时（秒）
+        """
+        start_time = time.time()
+        prompt = self._build_prompt([
+            {"role": "system", "content": "你是一位专业的舆情分析师。"},
+            {"role": "user", "content": "你好"}
+        ])
+        _, _, completion_tokens, _ = self._generate_batch([prompt], self._build_generation_kwargs(
+            max_new_tokens=self.config.LLM_WARMUP_TOKENS
+        ))[0]
+        elapsed = time.time() - start_time
+        if elapsed:
+            self.backend_info["warmup_tokens_per_second"] = round(completion_tokens / elapsed, 2)
+        logger.info(f"模型预热完成，耗时 {elapsed:.2f}s，{backend_summary(self.backend_info)}")
+        return elapsed
+    
+    def runtime_stats(self) -> Dict[str, Any]:
+        """
+        获取生成结果缓存、前缀KV缓存和批量调度器的统计信息
+        
+        Returns:
+            各组件的统计信息，未启用的组件不包含在内
+        """
+        stats = {}
+        if self.completion_cache is not None:
+            stats["completion_cache"] = self.completion_cache.stats()
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = self.prefix_cache.stats()
+        if self.batch_scheduler is not None:
+            stats["batch_scheduler"] = self.batch_scheduler.stats()
+        return stats
+    
+    def count_tokens(self, text: str) -> int:
+        """
+        统计文本的token数
+        
+        Args:
+            text: 文本
+            
+        Returns:
+            token数
+        """
+        return len(self.tokenizer(text, add_special_tokens=False).input_ids)
+    
+    def count_prompt_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """
+        统计消息构造出的完整prompt的token数
+        
+        Args:
+            messages: 消息列表
+            
+        Returns:
+            token数
+        """
+        return len(self.tokenizer(self._build_prompt(messages)).input_ids)
+    
+    def input_token_limit(self, max_new_tokens: Optional[int] = None) -> int:
+        """
+        计算prompt可用的token上限：输入截断长度，且为生成预留足够的上下文
+        
+        Args:
+            max_new_tokens: 最大生成token数，None表示使用配置值
+            
+        Returns:
+            prompt的token上限
+        """
+        return input_token_limit(self.config, self.context_size, max_new_tokens)
+    
+    def _check_prompt_length(self, prompt: str) -> int:
+        """
+        统计prompt的token数，超出输入上限时记录警告（超出部分会被截断）
+        
+        Args:
+            prompt: prompt字符串
+            
+        Returns:
+            截断前的token数
+        """
+        prompt_tokens = len(self.tokenizer(prompt).input_ids)
+        if prompt_tokens > self.config.LLM_MAX_INPUT_TOKENS:
+            logger.warning(
+                f"prompt长度 {prompt_tokens} tokens 超过输入上限 {self.config.LLM_MAX_INPUT_TOKENS}，"
+                f"末尾 {prompt_tokens - self.config.LLM_MAX_INPUT_TOKENS} tokens 将被截断"
+            )
+        return prompt_tokens
+    
+    def _build_generation_kwargs(self, **kwargs) -> Dict[str, Any]:
+        """
+        构建生成参数
+        
+        Returns:
+            生成参数字典
+        """
+        # 设置默认参数和覆盖特定参数，优化处理速度
+        generation_kwargs = {
+            "max_new_tokens": kwargs.get("max_new_tokens", self.config.LLM_MAX_TOKENS),
+            "do_sample": kwargs.get("do_sample", self.config.LLM_DO_SAMPLE),
+            "temperature": kwargs.get("temperature", self.config.LLM_TEMPERATURE),
+            "pad_token_id": self.tokenizer.pad_token_id,
+            "eos_token_id": self.tokenizer.eos_token_id
+        }
+        
+        logger.debug(f"模型生成参数: {generation_kwargs}")
+        return generation_kwargs
+    
+    def _cache_key(self, prompt: str, generation_kwargs: Dict[str, Any]) -> Optional[str]:
+        """
+        计算生成结果缓存键，采样生成的结果不确定，不使用缓存
+        
+        Args:
+            prompt: 构建好的prompt
+            generation_kwargs: 生成参数
+            
+        Returns:
+            缓存键，不可缓存时返回None
+        """
+        if self.completion_cache is None or generation_kwargs.get("do_sample"):
+            return None
+        # 不同后端、dtype和草稿模型的输出可能不同，一并计入缓存键
+        key_kwargs = dict(
+            generation_kwargs,
+            backend=self.backend,
+            dtype=self.backend_info["dtype"],
+            draft_model=self.config.LLM_DRAFT_MODEL_PATH if self.draft_model is not None else None
+        )
+        return CompletionCache.make_key(self.model_path, prompt, key_kwargs)
+    
+    def _build_response(self, content: str, prompt_tokens: int, completion_tokens: int,
+                        extra_usage: Optional[Dict[str, Any]] = None,
+                        sections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        构造OpenAI格式的响应
+        
+        Args:
+            content: 回复内容
+            prompt_tokens: prompt token数
+            completion_tokens: 生成token数
+            extra_usage: 附加到usage中的统计信息（生成速度、投机解码接受率等）
+            sections: 约束解码的小节标题，指定时在message中附带解析后的小节字段
+            
+        Returns:
+            模拟的OpenAI响应格式
+        """
+        response = {
+            "choices": [{
+                "message": {
+                    "role": "assistant",
+                    "content": content
+                },
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+        if extra_usage:
+            response["usage"].update(extra_usage)
+        if sections:
+            response["choices"][0]["message"]["parsed"] = parse_sections(content, sections)
+        return response
+    
+    def _use_draft_model(self, generation_kwargs: Dict[str, Any]) -> bool:
+        """
+        判断本次生成是否使用投机解码：需要已加载草稿模型，且为贪心解码（输出与普通解码一致）
+        
+        Args:
+            generation_kwargs: 生成参数
+            
+        Returns:
+            是否使用投机解码
+        """
+        return self.draft_model is not None and not generation_kwargs.get("do_sample")
+    
+    def _generate_assisted(self, prompt: str,
+                           generation_kwargs: Dict[str, Any]) -> Tuple[str, int, int, Dict[str, float], Dict[str, Any]]:
+        """
+        使用草稿模型做投机解码：草稿模型一次提出多个候选token，主模型一次前向验证
+        
+        Args:
+            prompt: prompt字符串
+            generation_kwargs: 生成参数
+            
+        Returns:
+            (回复文本, prompt token数, 生成token数, 各阶段耗时, 投机解码统计)
+        """
+        tokenize_start = time.perf_counter()
+        inputs = self._encode_plain([prompt])
+        tokenize_time = time.perf_counter() - tokenize_start
+        
+        # 通过前向调用次数统计候选token数和验证轮数
+        calls = {"main": 0, "draft": 0}
+        def counter(name):
+            def hook(module, args, output):
+                calls[name] += 1
+            return hook
+        
+        with self._generate_lock, torch.no_grad():
+            handles = [
+                self.model.register_forward_hook(counter("main")),
+                self.draft_model.register_forward_hook(counter("draft"))
+            ]
+            try:
+                with _PrefillTimer(self.model) as timer:
+                    outputs = self.model.generate(
+                        **inputs,
+                        **generation_kwargs,
+                        assistant_model=self.draft_model
+                    )
+            finally:
+                for handle in handles:
+                    handle.remove()
+        
+        input_length = inputs.input_ids.shape[1]
+        generated = outputs[0][input_length:].tolist()
+        response_text = self.tokenizer.decode(generated, skip_special_tokens=True)
+        
+        # 每轮验证除接受的候选token外，主模型还会自己产出一个token
+        proposed = calls["draft"]
+        accepted = max(0, len(generated) - calls["main"])
+        stats = {
+            "draft_tokens": proposed,
+            "draft_accepted_tokens": accepted,
+            "draft_acceptance_rate": round(accepted / proposed, 4) if proposed else 0.0
+        }
+        timings = dict(timer.timings(), tokenize=tokenize_time)
+        return response_text, input_length, len(generated), timings, stats
+    
+    def _generate_structured(self, prompt: str, generation_kwargs: Dict[str, Any],
+                             sections: List[str]) -> Tuple[str, int, int, Dict[str, float]]:
+        """
+        按小节结构约束解码：第一个小节标题作为回复开头放入prompt，
+        其余标题在上一小节换行后强制输出，最后一个小节完成时停止生成
+        
+        Args:
+            prompt: prompt字符串
+            generation_kwargs: 生成参数
+            sections: 小节标题列表
+            
+        Returns:
+            (包含全部小节标题的回复文本, prompt token数, 生成token数, 分词/预填充/解码耗时)
+        """
+        header = f"{sections[0]}："
+        tokenize_start = time.perf_counter()
+        inputs, prefix = self._encode([prompt + header])
+        tokenize_time = time.perf_counter() - tokenize_start
+        
+        input_length = inputs.input_ids.shape[1]
+        constraint = SectionConstraint(
+            self.tokenizer, sections, input_length,
+            generation_kwargs["max_new_tokens"], generation_kwargs.get("eos_token_id")
+        )
+        with self._generate_lock, torch.no_grad():
+            prefill_start = time.perf_counter()
+            prefix_kwargs = self._prefix_kwargs(inputs, prefix)
+            with _PrefillTimer(self.model, prefill_start) as timer:
+                outputs = self.model.generate(
+                    **inputs,
+                    **prefix_kwargs,
+                    **generation_kwargs,
+                    logits_processor=LogitsProcessorList([constraint]),
+                    stopping_criteria=StoppingCriteriaList([SectionStoppingCriteria(constraint)])
+                )
+        timings = dict(timer.timings(), tokenize=tokenize_time)
+        
+        generated = outputs[0][input_length:].tolist()
+        response_text = header + self.tokenizer.decode(generated, skip_special_tokens=True)
+        return response_text.strip(), input_length, len(generated), timings
+    
+    def _generate_batch(self, prompts: List[str],
+                        generation_kwargs: Dict[str, Any]) -> List[Tuple[str, int, int, Dict[str, float]]]:
+        """
+        对一批prompt执行一次左填充的批量生成
+        
+        Args:
+            prompts: prompt列表
+            generation_kwargs: 生成参数
+            
+        Returns:
+            每个prompt对应的(回复文本, prompt token数, 生成token数, 分词/预填充/解码耗时)，同批次共享耗时
+        """
+        tokenize_start = time.perf_counter()
+        inputs, prefix = self._encode(prompts)
+        tokenize_time = time.perf_counter() - tokenize_start
+        
+        # 生成回复，使用更高效的参数；复用的前缀KV在此时计算，计入预填充耗时
+        with self._generate_lock, torch.no_grad():
+            prefill_start = time.perf_counter()
+            prefix_kwargs = self._prefix_kwargs(inputs, prefix)
+            with _PrefillTimer(self.model, prefill_start) as timer:
+                outputs = self.model.generate(
+                    **inputs,
+                    **prefix_kwargs,
+                    **generation_kwargs
+                )
+        timings = dict(timer.timings(), tokenize=tokenize_time)
+        
+        input_length = inputs.input_ids.shape[1]
+        eos_token_id = generation_kwargs.get("eos_token_id")
+        results = []
+        for i in range(len(prompts)):
+            generated = outputs[i][input_length:].tolist()
+            # 较早结束的序列会在EOS之后被填充，只统计到EOS为止的token
+            if eos_token_id in generated:
+                generated = generated[:generated.index(eos_token_id) + 1]
+            response_text = self.tokenizer.decode(generated, skip_special_tokens=True)
+            prompt_tokens = int(inputs.attention_mask[i].sum().item())
+            results.append((response_text, prompt_tokens, len(generated), dict(timings)))
+        
+        return results
+    
+    def _encode(self, prompts: List[str]) -> Tuple[BatchEncoding, Optional[Tuple[str, int]]]:
+        """
+        编码输入
+        
+        单条prompt且启用前缀缓存时，系统提示词前缀与其余内容分开编码，
+        以便复用前缀的past_key_values
+        
+        Args:
+            prompts: prompt列表
+            
+        Returns:
+            (编码后的输入, (前缀文本, 前缀token数)或None)
+        """
+        if len(prompts) == 1 and self.prefix_cache is not None:
+            prefix, suffix = self._split_prompt(prompts[0])
+            if prefix:
+                prefix_ids = self.tokenizer(prefix, return_tensors="pt").input_ids
+                prefix_length = prefix_ids.shape[1]
+                if prefix_length < self.config.LLM_MAX_INPUT_TOKENS:
+                    suffix_ids = self.tokenizer(
+                        suffix,
+                        return_tensors="pt",
+                        add_special_tokens=False,
+                        truncation=True,
+                        max_length=self.config.LLM_MAX_INPUT_TOKENS - prefix_length
+                    ).input_ids
+                    input_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+                    inputs = BatchEncoding({
+                        "input_ids": input_ids,
+                        "attention_mask": torch.ones_like(input_ids)
+                    }).to(self.model.device)
+                    return inputs, (prefix, prefix_length)
+        
+        return self._encode_plain(prompts), None
+    
+    def _encode_plain(self, prompts: List[str]) -> BatchEncoding:
+        """
+        完整编码prompt，不拆分前缀
+        
+        Args:
+            prompts: prompt列表
+            
+        Returns:
+            编码后的输入
+        """
+        # 编码输入，包含attention_mask
+        inputs = self.tokenizer(
+            prompts, 
+            return_tensors="pt", 
+            padding=True,
+            truncation=True,
+            max_length=self.config.LLM_MAX_INPUT_TOKENS
+        ).to(self.model.device)
+        
+        # 确保有attention_mask
+        if 'attention_mask' not in inputs:
+            inputs['attention_mask'] = torch.ones_like(inputs['input_ids'])
+        
+        return inputs
+    
+    def _prefix_kwargs(self, inputs: BatchEncoding,
+                       prefix: Optional[Tuple[str, int]]) -> Dict[str, Any]:
+        """
+        获取复用前缀KV所需的generate参数，需在持有生成锁时调用
+        
+        Args:
+            inputs: 编码后的输入
+            prefix: (前缀文本, 前缀token数)或None
+            
+        Returns:
+            包含past_key_values的参数字典，不复用前缀时为空
+        """
+        if prefix is None:
+            return {}
+        
+        prefix_text, prefix_length = prefix
+        
+        def compute():
+            # 只对系统提示词前缀做一次prefill
+            with torch.no_grad():
+                return self.model(
+                    input_ids=inputs.input_ids[:, :prefix_length],
+                    use_cache=True
+                ).past_key_values
+        
+        return {"past_key_values": self.prefix_cache.get_or_compute(
+            f"{self.model_path}\n{prefix_text}", compute
+        )}
+    
+    def _split_prompt(self, prompt: str) -> Tuple[str, str]:
+        """
+        将prompt拆分为系统提示词前缀和其余内容
+        
+        Args:
+            prompt: 构建好的prompt
+            
+        Returns:
+            (系统提示词前缀, 其余内容)，没有系统提示词时前缀为空
+        """
+        index = prompt.find("<|user|>")
+        if not prompt.startswith("<|system|>") or index < 0:
+            return "", prompt
+        return prompt[:index], prompt[index:]
+    
     def _build_prompt(self, messages: List[Dict[str, str]]) -> str:
         """
         构建prompt字符串
@@ -150,21 +866,51 @@ class LocalLLMClient:
         Returns:
             构建好的prompt字符串
         """
-        # 只使用最新的用户消息和系统消息，避免历史对话干扰
-        system_message = ""
-        user_message = ""
-        
-        for message in messages:
-            role = message.get("role", "")
-            content = message.get("content", "")
-            if role == "system":
-                system_message = content
-            elif role == "user":
-                user_message = content
-        
-        # 构建简洁的prompt，避免引入无关上下文
-        prompt = f"<|system|>\n{system_message}<|end|>\n<|user|>\n{user_message}<|end|>\n<|assistant|>\n"
-        return prompt
+        return build_prompt(messages)
+
+def build_prompt(messages: List[Dict[str, str]]) -> str:
+    """
+    构建prompt字符串
+    
+    Args:
+        messages: 消息列表
+        
+    Returns:
+        构建好的prompt字符串
+    """
+    # 只使用最新的用户消息和系统消息，避免历史对话干扰
+    system_message = ""
+    user_message = ""
+    
+    for message in messages:
+        role = message.get("role", "")
+        content = message.get("content", "")
+        if role == "system":
+            system_message = content
+        elif role == "user":
+            user_message = content
+    
+    # 构建简洁的prompt，避免引入无关上下文
+    prompt = f"<|system|>\n{system_message}<|end|>\n<|user|>\n{user_message}<|end|>\n<|assistant|>\n"
+    return prompt
+
+def input_token_limit(config: Settings, context_size: Optional[int],
+                      max_new_tokens: Optional[int] = None) -> int:
+    """
+    计算prompt可用的token上限
+    
+    Args:
+        config: 配置对象
+        context_size: 模型上下文长度，未知时为None
+        max_new_tokens: 最大生成token数，None表示使用配置值
+        
+    Returns:
+        prompt的token上限
+    """
+    limit = config.LLM_MAX_INPUT_TOKENS
+    if context_size:
+        limit = min(limit, context_size - (max_new_tokens or config.LLM_MAX_TOKENS))
+    return limit
 
 # 全局实例
 local_llm_client: Optional[LocalLLMClient] = None
@@ -0,0 +1,308 @@
+"""
+指标与链路追踪模块
+为流水线各阶段（各数据源爬取、分词、预填充、解码、报告、数据库写入）记录耗时，
+汇总token用量、生成速度以及队列和缓存统计，以Prometheus文本格式导出；
+当前请求开启追踪时，同时记录该请求各阶段的耗时明细
+"""
+
+import contextvars
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# 耗时直方图的分桶（秒），覆盖从单次数据库写入到完整报告生成
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# 生成速度直方图的分桶（tokens/s）
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# usage中记录的LLM生成阶段
+LLM_PHASES = ("queue", "tokenize", "prefill", "decode")
+
+# 采集函数返回的样本：(指标名, 类型, 说明, 标签, 值)
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+class _Histogram:
+    """累积分桶直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """进程内指标注册表"""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], _Histogram] = {}
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._collectors: List[Callable[[], List[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels: Any):
+        """
+        增加计数器
+
+        Args:
+            name: 指标名
+            value: 增量
+            help: 指标说明
+            labels: 标签
+        """
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._meta.setdefault(name, ("counter", help))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, help: str = "",
+                buckets: Tuple[float, ...] = DURATION_BUCKETS, **labels: Any):
+        """
+        记录直方图样本
+
+        Args:
+            name: 指标名
+            value: 样本值
+            help: 指标说明
+            buckets: 分桶上界
+            labels: 标签
+        """
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._meta.setdefault(name, ("histogram", help))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def register_collector(self, collector: Callable[[], List[Sample]]):
+        """
+        注册在导出时调用的采集函数，用于队列长度、缓存命中数等由其他组件维护的统计
+
+        Args:
+            collector: 返回样本列表的函数
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        以Prometheus文本格式导出所有指标
+
+        Returns:
+            指标文本
+        """
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            meta = dict(self._meta)
+            collectors = list(self._collectors)
+
+        written = set()
+
+        def header(name: str, kind: str, help: str):
+            if name not in written:
+                written.add(name)
+                lines.append(f"# HELP {name} {help or name}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, *meta[name])
+            lines.append(f"{name}{_format_labels(dict(labels))} {_format_value(value)}")
+
+        for (name, labels), histogram in histograms:
+            header(name, *meta[name])
+            labels = dict(labels)
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f"{name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(dict(labels, le='+Inf'))} {histogram.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for collector in collectors:
+            try:
+                samples = collector()
+            except Exception:
+                continue
+            for name, kind, help, labels, value in samples:
+                header(name, kind, help)
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """格式化标签，转义反斜杠、引号和换行"""
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    """格式化样本值"""
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Trace:
+    """单个请求的阶段耗时明细"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        """累加一个阶段的耗时，同一阶段多次出现时累计次数"""
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"seconds": 0.0, "count": 0})
+            entry["seconds"] += seconds
+            entry["count"] += 1
+
+    def breakdown(self) -> Dict[str, Any]:
+        """
+        获取耗时明细
+
+        Returns:
+            总耗时及各阶段的累计耗时和次数
+        """
+        with self._lock:
+            stages = {
+                stage: {"seconds": round(entry["seconds"], 4), "count": entry["count"]}
+                for stage, entry in sorted(self._stages.items())
+            }
+        return {"total_seconds": round(time.perf_counter() - self.started_at, 4), "stages": stages}
+
+
+# 当前请求的追踪，提交到线程池的任务需通过 contextvars.copy_context() 传递
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+@contextmanager
+def start_trace() -> Iterator[Trace]:
+    """
+    在上下文内为当前请求开启追踪
+
+    Yields:
+        Trace实例
+    """
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record_span(stage: str, seconds: float):
+    """
+    记录一个阶段的耗时到全局直方图和当前请求的追踪
+
+    Args:
+        stage: 阶段名，如 crawl.douyin、llm.prefill
+        seconds: 耗时（秒）
+    """
+    get_metrics().observe(
+        "bettafish_stage_duration_seconds", seconds,
+        help="流水线各阶段耗时（秒）", stage=stage
+    )
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    记录上下文内代码的耗时
+
+    Args:
+        stage: 阶段名
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start_time)
+
+
+def traced(stage: str) -> Callable:
+    """
+    记录被装饰函数耗时的装饰器
+
+    Args:
+        stage: 阶段名
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_completion(usage: Dict[str, Any]):
+    """
+    记录一次chat.completion的token用量、生成速度和各生成阶段耗时
+
+    Args:
+        usage: 响应中的usage字典
+    """
+    metrics = get_metrics()
+    cached = "true" if usage.get("cached") else "false"
+    metrics.inc("bettafish_llm_requests_total", help="LLM生成请求数", cached=cached)
+    metrics.inc("bettafish_llm_prompt_tokens_total", usage.get("prompt_tokens", 0),
+                help="prompt token总数", cached=cached)
+    metrics.inc("bettafish_llm_completion_tokens_total", usage.get("completion_tokens", 0),
+                help="生成token总数", cached=cached)
+    if usage.get("tokens_per_second"):
+        metrics.observe("bettafish_llm_tokens_per_second", usage["tokens_per_second"],
+                        help="单次生成的解码速度（tokens/s）", buckets=THROUGHPUT_BUCKETS)
+    if usage.get("draft_tokens"):
+        metrics.inc("bettafish_llm_draft_tokens_total", usage["draft_tokens"],
+                    help="投机解码草稿模型提出的token数")
+        metrics.inc("bettafish_llm_draft_accepted_tokens_total", usage.get("draft_accepted_tokens", 0),
+                    help="投机解码被接受的token数")
+    for phase, seconds in (usage.get("timings") or {}).items():
+        if phase in LLM_PHASES:
+            record_span(f"llm.{phase}", seconds)
+
+
+# 全局指标注册表
+_metrics_instance: Optional[MetricsRegistry] = None
+_metrics_lock = threading.Lock()
+
+def get_metrics() -> MetricsRegistry:
+    """
+    获取指标注册表（单例模式）
+
+    Returns:
+        MetricsRegistry实例
+    """
+    global _metrics_instance
+    if _metrics_instance is None:
+        with _metrics_lock:
+            if _metrics_instance is None:
+                _metrics_instance = MetricsRegistry()
+    return _metrics_instance
@@ -0,0 +1,153 @@
+"""
+模型生命周期管理模块
+负责在服务启动时预加载并预热模型，并在整个进程生命周期内复用同一个驻留模型
+"""
+
+import contextlib
+import threading
+import time
+from typing import Any, Dict, Optional
+from loguru import logger
+
+from config import Settings
+from local_llm import get_local_llm_client
+
+
+class ModelManager:
+    """模型生命周期管理器"""
+
+    def __init__(self, config: Settings):
+        """
+        初始化模型管理器
+
+        Args:
+            config: 配置对象
+        """
+        self.config = config
+        self.client = None
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self, background: bool = True):
+        """
+        开始加载模型，重复调用不会重复加载
+
+        Args:
+            background: 是否在后台线程中加载
+        """
+        with self._start_lock:
+            if self.state != "idle":
+                return
+            self.state = "loading"
+
+        if background:
+            threading.Thread(target=self._load, name="model-loader", daemon=True).start()
+        else:
+            self._load()
+
+    @contextlib.contextmanager
+    def use_client(self, client: Any):
+        """
+        在上下文内直接使用已就绪的LLM客户端而不加载模型（基准测试中注入模拟客户端），
+        退出时恢复原来的客户端和加载状态
+
+        Args:
+            client: 提供LocalLLMClient接口的客户端
+        """
+        with self._start_lock:
+            previous = (self.client, self.state, self.error, self._ready.is_set())
+            self.client = client
+            self.state = "ready"
+            self.error = None
+        self._ready.set()
+        try:
+            yield client
+        finally:
+            with self._start_lock:
+                self.client, self.state, self.error, ready = previous
+                if not ready:
+                    self._ready.clear()
+
+    def get_client(self, timeout: Optional[float] = None):
+        """
+        获取已就绪的LLM客户端，模型未加载时先触发加载并等待
+
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            LocalLLMClient 或 LLMWorkerPool 实例
+
+        Raises:
+            RuntimeError: 模型加载失败或等待超时
+        """
+        self.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("模型尚未加载完成")
+        if self.state != "ready":
+            raise RuntimeError(f"模型加载失败: {self.error}")
+        return self.client
+
+    def status(self) -> Dict[str, Any]:
+        """
+        获取模型状态
+
+        Returns:
+            状态信息
+        """
+        status = {
+            "state": self.state,
+            "error": self.error,
+            "replicas": self.config.LLM_REPLICAS,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "backend": getattr(self.client, "backend_info", None)
+        }
+        if hasattr(self.client, "stats"):
+            status["workers"] = self.client.stats()
+        return status
+
+    def _load(self):
+        """加载并预热模型"""
+        start_time = time.time()
+        try:
+            if self.config.LLM_REPLICAS > 1:
+                from llm_workers import LLMWorkerPool
+                client = LLMWorkerPool(self.config, self.config.LLM_REPLICAS)
+            else:
+                client = get_local_llm_client(self.config)
+            self.load_seconds = time.time() - start_time
+
+            self.warmup_seconds = client.warm_up()
+            self.client = client
+            self.state = "ready"
+            logger.info(f"模型已就绪，加载耗时 {self.load_seconds:.2f}s，预热耗时 {self.warmup_seconds:.2f}s")
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            logger.exception(f"模型加载失败: {e}")
+        finally:
+            self._ready.set()
+
+
+# 全局模型管理器实例
+_model_manager_instance: Optional[ModelManager] = None
+
+def get_model_manager(config: Settings) -> ModelManager:
+    """
+    获取模型管理器实例（单例模式）
+
+    Args:
+        config: 配置对象
+
+    Returns:
+        ModelManager实例
+    """
+    global _model_manager_instance
+    if _model_manager_instance is None:
+        _model_manager_instance = ModelManager(config)
+    return _model_manager_instance
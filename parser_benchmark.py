@@ -0,0 +1,66 @@
+"""
+页面解析基准测试模块
+在保存的（或生成的）搜索结果页面上比较BeautifulSoup实现与快速提取实现的解析耗时，并校验两者提取的内容一致
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from config import Settings
+from html_extract import parser_name
+
+
+def _time_parse(parse, html: str, max_items: int, repeat: int) -> float:
+    """多次解析取平均耗时（毫秒）"""
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        parse(html, max_items)
+    return (time.perf_counter() - start_time) / repeat * 1000
+
+
+def compare_parsers(pages_dir: Optional[str] = None, max_items: int = 10,
+                    repeat: int = 50) -> Dict[str, Any]:
+    """
+    比较各数据源页面的解析耗时
+
+    Args:
+        pages_dir: 保存页面的目录（douyin.html、baidu.html），为None时使用生成的页面
+        max_items: 最大提取条数
+        repeat: 每个页面的解析次数
+
+    Returns:
+        各数据源的页面大小、两种实现的平均耗时、加速比以及提取内容是否一致
+    """
+    from simple_crawler import SimpleCrawler
+    from pipeline_benchmark import build_stub_pages, load_recorded_pages
+
+    config = Settings()
+    config.CRAWLER_CACHE_ENABLED = False
+    crawler = SimpleCrawler(config)
+    if pages_dir:
+        pages = load_recorded_pages(pages_dir)
+    else:
+        pages = {name: page.replace("{topic}", "基准主题") for name, page in build_stub_pages().items()}
+
+    parsers = {
+        "douyin": (crawler._parse_douyin_soup, crawler._parse_douyin),
+        "baidu": (crawler._parse_baidu_soup, crawler._parse_baidu),
+    }
+    results = {"parser": parser_name(), "max_items": max_items, "repeat": repeat, "sources": {}}
+    for name, (soup_parse, fast_parse) in parsers.items():
+        html = pages[name]
+        soup_ms = _time_parse(soup_parse, html, max_items, repeat)
+        fast_ms = _time_parse(fast_parse, html, max_items, repeat)
+        # 点赞和评论数是随机估算的，只比较内容
+        same = (
+            [item["content"] for item in soup_parse(html, max_items)]
+            == [item["content"] for item in fast_parse(html, max_items)]
+        )
+        results["sources"][name] = {
+            "page_kb": round(len(html.encode("utf-8")) / 1024, 1),
+            "soup_ms": round(soup_ms, 3),
+            "fast_ms": round(fast_ms, 3),
+            "speedup": round(soup_ms / fast_ms, 2) if fast_ms else None,
+            "same_content": same
+        }
+    return results
@@ -0,0 +1,591 @@
+"""
+端到端流水线基准测试模块
+用本地桩HTTP服务器提供抖音/百度搜索页面、用可配置延迟的确定性模拟LLM代替本地模型，
+驱动 app.analyze_topic 或 web_app 的 /analyze 接口，统计各阶段延迟分位数、并发吞吐、
+内存峰值和数据库写入速率，结果保存为JSON以便与历史运行对比
+"""
+
+import contextlib
+import functools
+import io
+import itertools
+import math
+import os
+import queue
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from loguru import logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from config import Settings
+
+# 模拟LLM输出使用的文本，按需要的token数截取
+_FAKE_OUTPUT = (
+    "1. 热点话题：讨论集中在价格调整和服务质量上。\n"
+    "2. 主要观点：多数网友表示支持，也有部分网友担心后续影响。\n"
+    "3. 情感倾向：整体偏正面，负面声音主要来自价格方面。\n"
+    "4. 建议：相关方应及时回应关切，公开信息，持续跟踪舆论变化。\n"
+)
+
+# 合并生成请求的模拟输出，最后一节按需要的token数补齐
+_FAKE_FUSED_OUTPUT = (
+    "【洞察分析】\n"
+    "主要观点：多数网友表示支持，也有部分网友担心后续影响。\n"
+    "公众情绪：整体偏正面，负面声音主要来自价格方面。\n"
+    "【舆情报告】\n"
+    "热点话题：讨论集中在价格调整和服务质量上。\n"
+    "主要观点：支持与担忧并存。\n"
+    "公众情绪：整体偏正面。\n"
+    "影响程度：中等，热度持续上升。\n"
+    "应对策略：及时回应关切，公开信息。\n"
+    "建议措施："
+)
+
+# 生成桩页面内容使用的句子，带有不同的情感词，避免被去重合并
+_SENTENCES = [
+    "网友纷纷点赞，认为这次调整非常及时，值得推荐",
+    "有人质疑相关说明不够透明，担心后续还会涨价",
+    "现场情况稳定，多方表示会持续跟进",
+    "评论区出现大量投诉，部分用户表示非常失望",
+    "专家认为整体影响有限，建议理性看待",
+    "不少人分享了亲身经历，感谢工作人员的贴心服务",
+    "话题热度持续上升，相关视频播放量突破百万",
+    "也有声音认为处理方式敷衍，呼吁尽快公开调查结果",
+]
+
+
+def _prompt_sections(messages: List[Dict[str, str]]) -> Optional[tuple]:
+    """根据系统提示词中的输出格式判断请求要求的小节标题"""
+    from report_sections import INSIGHT_SECTIONS, REPORT_SECTIONS
+
+    for sections in (REPORT_SECTIONS, INSIGHT_SECTIONS):
+        if all(f"{section}：" in messages[0]["content"] for section in sections):
+            return sections
+    return None
+
+
+class FakeLLMClient:
+    """确定性的模拟LLM客户端，按prompt和生成token数模拟预填充与解码延迟"""
+
+    def __init__(self, config: Settings, token_latency: float = 0.002,
+                 prefill_latency: float = 0.0002, serialize: bool = True,
+                 fused_failure_rate: float = 0.0, overrun_tokens: int = 0):
+        """
+        初始化模拟客户端
+
+        Args:
+            config: 配置对象
+            token_latency: 每个生成token的耗时（秒）
+            prefill_latency: 每个prompt token的耗时（秒）
+            serialize: 是否像单个驻留模型一样同一时间只执行一次生成
+            fused_failure_rate: 合并生成输出缺少报告分段标记（无法拆分）的比例，用于计入退回两次调用的开销
+            overrun_tokens: 未约束解码时模型在最后一个小节之后继续输出的token数，约束解码在该处停止
+        """
+        self.config = config
+        self.token_latency = token_latency
+        self.prefill_latency = prefill_latency
+        self.fused_failure_rate = fused_failure_rate
+        self.overrun_tokens = overrun_tokens
+        # 按调用序号确定性地产生拆分失败，使多次运行结果可比
+        self._fused_calls = itertools.count(1)
+        self.backend_info = {"backend": "fake", "token_latency": token_latency}
+        self._generate_lock = threading.Lock() if serialize else contextlib.nullcontext()
+
+    def count_tokens(self, text: str) -> int:
+        """按字符数近似token数，中文文本大致一字一token"""
+        return len(text)
+
+    def count_prompt_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """prompt的token数：消息内容加上每条消息的模板开销"""
+        return sum(self.count_tokens(message["content"]) + 5 for message in messages) + 3
+
+    def input_token_limit(self, max_new_tokens: Optional[int] = None) -> int:
+        """prompt可用的token上限"""
+        return self.config.LLM_MAX_INPUT_TOKENS
+
+    def warm_up(self) -> float:
+        """模拟客户端无需预热"""
+        return 0.0
+
+    def _generate(self, messages: List[Dict[str, str]], max_new_tokens: Optional[int],
+                  sections: Optional[List[str]] = None) -> tuple:
+        """模拟一次生成，返回(回复文本, prompt token数, 生成token数)"""
+        from fused_pipeline import REPORT_MARKER
+
+        prompt_tokens = min(self.count_prompt_tokens(messages), self.config.LLM_MAX_INPUT_TOKENS)
+        max_tokens = max_new_tokens or self.config.LLM_MAX_TOKENS
+        output_sections = sections or _prompt_sections(messages)
+        if not sections and REPORT_MARKER in messages[0]["content"]:
+            text = _FAKE_FUSED_OUTPUT
+            call = next(self._fused_calls)
+            if int(call * self.fused_failure_rate) > int((call - 1) * self.fused_failure_rate):
+                # 模拟模型漏写报告分段标记，生成长度不变
+                text = text.replace(REPORT_MARKER, "")
+            text = (text + "持续跟踪舆论变化。" * max_tokens)[:max_tokens]
+            completion_tokens = len(text)
+        elif output_sections:
+            # 约束与否都输出相同的小节内容；未约束时模型在最后一个小节后多输出overrun_tokens个token
+            budget = max(1, max_tokens // len(output_sections) - len(output_sections[0]) - 2)
+            text = "\n".join(
+                f"{section}：{_SENTENCES[i % len(_SENTENCES)][:budget]}"
+                for i, section in enumerate(output_sections)
+            )
+            if not sections and self.overrun_tokens:
+                text += "\n" + ("持续跟踪舆论变化。" * self.overrun_tokens)[:self.overrun_tokens]
+            text = text[:max_tokens]
+            # 约束解码的第一个小节标题放在prompt中，不计入生成token数
+            completion_tokens = len(text) - (len(sections[0]) + 1 if sections else 0)
+        else:
+            text = (_FAKE_OUTPUT * (max_tokens // len(_FAKE_OUTPUT) + 1))[:max_tokens]
+            completion_tokens = len(text)
+        with self._generate_lock:
+            time.sleep(prompt_tokens * self.prefill_latency + completion_tokens * self.token_latency)
+        return text, prompt_tokens, completion_tokens
+
+    def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """模拟OpenAI的chat.completion接口"""
+        from report_sections import parse_sections
+
+        sections = kwargs.get("sections")
+        text, prompt_tokens, completion_tokens = self._generate(
+            messages, kwargs.get("max_new_tokens"), sections
+        )
+        message = {"role": "assistant", "content": text}
+        if sections:
+            message["parsed"] = parse_sections(text, sections)
+        return {
+            "choices": [{
+                "message": message,
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def stream_chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """模拟流式生成，生成完成后按小段返回"""
+        text, _, _ = self._generate(messages, kwargs.get("max_new_tokens"), kwargs.get("sections"))
+        for i in range(0, len(text), 8):
+            yield text[i:i + 8]
+
+
+def build_stub_pages(items: int = 20, padding: int = 50) -> Dict[str, str]:
+    """
+    生成符合爬虫解析规则的抖音/百度搜索结果页面
+
+    Args:
+        items: 每个页面的结果条数
+        padding: 页面中无关标记（导航、脚本等）的重复次数，使页面大小接近真实页面
+
+    Returns:
+        数据源名称 -> 页面HTML，页面中的 {topic} 在请求时替换为主题
+    """
+    filler = (
+        '<div class="nav"><ul><li><a href="#">首页</a></li><li><a href="#">热点</a></li></ul></div>'
+        '<script>window.__INIT__ = {"a": 1, "b": [1, 2, 3]};</script>'
+    ) * padding
+    douyin = "".join(
+        f'<div data-e2e="search-result-item"><a href="#"><h3>{{topic}} 视频{i}：'
+        f'{_SENTENCES[i % len(_SENTENCES)]}（{i}）</h3></a><span>作者{i}</span></div>'
+        for i in range(items)
+    )
+    baidu = "".join(
+        f'<div class="result c-container"><h3><a href="#">{{topic}} 新闻{i}</a></h3>'
+        f'<div class="c-row">{_SENTENCES[(i + 3) % len(_SENTENCES)]}，第{i}篇报道</div></div>'
+        for i in range(items)
+    )
+    return {
+        "douyin": f"<html><body>{filler}<div id='results'>{douyin}</div>{filler}</body></html>",
+        "baidu": f"<html><body>{filler}<div id='content_left'>{baidu}</div>{filler}</body></html>"
+    }
+
+
+def load_recorded_pages(directory: str) -> Dict[str, str]:
+    """
+    读取录制的搜索结果页面
+
+    Args:
+        directory: 包含 douyin.html 和 baidu.html 的目录
+
+    Returns:
+        数据源名称 -> 页面HTML
+    """
+    pages = {}
+    for source in ("douyin", "baidu"):
+        with open(os.path.join(directory, f"{source}.html"), encoding="utf-8") as f:
+            pages[source] = f.read()
+    return pages
+
+
+class StubCrawlServer:
+    """在本地端口上提供搜索结果页面的桩HTTP服务器"""
+
+    def __init__(self, pages: Dict[str, str], latency: float = 0.0):
+        """
+        启动桩服务器
+
+        Args:
+            pages: 数据源名称 -> 页面HTML
+            latency: 每个请求的模拟网络延迟（秒）
+        """
+        self.requests = 0
+        # 出现过的客户端连接（地址, 端口），用于确认爬虫复用了keep-alive连接
+        self.connections = set()
+        counter_lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parsed = urllib.parse.urlparse(self.path)
+                page = pages.get(parsed.path.strip("/"))
+                if page is None:
+                    self.send_error(404)
+                    return
+                topic = urllib.parse.parse_qs(parsed.query).get("q", [""])[0]
+                body = page.replace("{topic}", topic).encode("utf-8")
+                with counter_lock:
+                    server.requests += 1
+                    server.connections.add(self.client_address)
+                if latency:
+                    time.sleep(latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="stub-crawl-server", daemon=True).start()
+
+    def url(self, source: str) -> str:
+        """数据源的URL模板，与 CRAWLER_*_URL 配置格式一致"""
+        return f"http://127.0.0.1:{self.port}/{source}?q={{topic}}"
+
+    def close(self):
+        """关闭桩服务器"""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StageRecorder:
+    """记录各阶段每次调用的耗时"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        """记录一次耗时"""
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    @contextlib.contextmanager
+    def instrument(self):
+        """
+        在上下文内为流水线各阶段的方法计时：各数据源爬取、爬取合计、洞察分析、报告生成、合并生成、数据库写入
+        """
+        from simple_crawler import SimpleCrawler
+        from analyzer import Analyzer
+        from reporter import Reporter
+        from fused_pipeline import FusedGenerator
+        from db import SimpleDatabase
+
+        targets = [
+            (SimpleCrawler, "_crawl_source", lambda args: f"crawl.{args[1].name}"),
+            (SimpleCrawler, "crawl_topic", lambda args: "crawl"),
+            (Analyzer, "analyze", lambda args: "analyze"),
+            (Reporter, "generate_sections", lambda args: "report"),
+            (FusedGenerator, "generate", lambda args: "fused"),
+            (SimpleDatabase, "save_analysis_result", lambda args: "db_write"),
+        ]
+        originals = []
+        for cls, name, stage_of in targets:
+            original = getattr(cls, name)
+            originals.append((cls, name, original))
+            setattr(cls, name, self._timed(original, stage_of))
+        try:
+            yield self
+        finally:
+            for cls, name, original in originals:
+                setattr(cls, name, original)
+
+    def _timed(self, func: Callable, stage_of: Callable[[tuple], str]) -> Callable:
+        """包装方法，记录每次调用的耗时"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage_of(args), time.perf_counter() - start_time)
+        return wrapper
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """各阶段的调用次数与延迟分位数"""
+        with self._lock:
+            return {stage: latency_summary(samples) for stage, samples in sorted(self.samples.items())}
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """最近秩法计算分位数"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """
+    汇总延迟样本
+
+    Args:
+        samples: 耗时列表（秒）
+
+    Returns:
+        次数、平均值及p50/p95/p99（毫秒）
+    """
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2)
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程常驻内存的历史峰值（MB），平台不支持时为None"""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _run_clients(topics: List[str], clients: int, run_one: Callable[[str], None]) -> List[float]:
+    """
+    以多个并发客户端处理主题列表
+
+    Args:
+        topics: 主题列表
+        clients: 并发客户端数
+        run_one: 处理单个主题的函数
+
+    Returns:
+        每个主题的端到端耗时
+    """
+    pending: "queue.Queue[str]" = queue.Queue()
+    for topic in topics:
+        pending.put(topic)
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            try:
+                topic = pending.get_nowait()
+            except queue.Empty:
+                return
+            start_time = time.perf_counter()
+            try:
+                run_one(topic)
+            except Exception as e:
+                logger.error(f"基准测试主题 '{topic}' 失败: {e}")
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start_time)
+
+    threads = [threading.Thread(target=client, name=f"bench-client-{i}") for i in range(max(1, clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def _cli_runner(config: Settings) -> Callable[[str], None]:
+    """通过 app.analyze_topic 分析单个主题"""
+    import app
+
+    def run_one(topic: str):
+        app.analyze_topic(topic, config)
+    return run_one
+
+
+def _web_runner(config: Settings, poll_interval: float = 0.01) -> Callable[[str], None]:
+    """通过 web_app 的 /analyze 接口提交任务并轮询结果"""
+    import web_app
+
+    web_app.config = config
+    web_app.initialize_app()
+
+    def run_one(topic: str):
+        client = web_app.app.test_client()
+        while True:
+            response = client.post("/analyze", json={"topic": topic})
+            if response.status_code != 429:
+                break
+            time.sleep(poll_interval)
+        if response.status_code != 202:
+            raise RuntimeError(f"提交分析任务失败: {response.status_code}")
+        job_id = response.get_json()["job_id"]
+        while True:
+            response = client.get(f"/jobs/{job_id}/result")
+            if response.status_code == 200:
+                return
+            if response.status_code != 202:
+                raise RuntimeError(f"分析任务失败: {response.get_json().get('message')}")
+            time.sleep(poll_interval)
+    return run_one
+
+
+def run_pipeline_benchmark(mode: str = "cli", topics: int = 20, clients: int = 1,
+                           token_latency: float = 0.002, prefill_latency: float = 0.0002,
+                           server_latency: float = 0.0, pages_dir: Optional[str] = None,
+                           fused: bool = False, fused_failure_rate: float = 0.0,
+                           structured: bool = False, overrun_tokens: int = 0,
+                           config: Optional[Settings] = None) -> Dict[str, Any]:
+    """
+    运行端到端基准测试
+
+    Args:
+        mode: cli（app.analyze_topic）或 web（web_app /analyze）
+        topics: 分析的主题数
+        clients: 并发客户端数
+        token_latency: 模拟LLM每个生成token的耗时（秒）
+        prefill_latency: 模拟LLM每个prompt token的耗时（秒）
+        server_latency: 桩服务器每个请求的模拟网络延迟（秒）
+        pages_dir: 录制页面目录，为None时使用生成的页面
+        fused: 是否使用合并生成（一次生成分析结果和报告）
+        fused_failure_rate: 模拟LLM合并生成输出无法拆分的比例
+        structured: 是否对分析和报告使用结构化约束解码
+        overrun_tokens: 模拟LLM未约束解码时在最后一个小节之后继续输出的token数
+        config: 配置对象，为None时使用默认配置
+
+    Returns:
+        基准测试结果
+    """
+    import db
+    from model_manager import get_model_manager
+
+    if mode not in ("cli", "web"):
+        raise ValueError(f"未知的基准测试模式: {mode}")
+
+    config = config or Settings()
+    pages = load_recorded_pages(pages_dir) if pages_dir else build_stub_pages()
+    server = StubCrawlServer(pages, latency=server_latency)
+
+    # 每次运行使用独立的临时数据库，关闭爬取缓存，使每个主题都完整经过爬虫阶段
+    config.CRAWLER_DOUYIN_URL = server.url("douyin")
+    config.CRAWLER_BAIDU_URL = server.url("baidu")
+    config.CRAWLER_CACHE_ENABLED = False
+    config.PIPELINE_FUSED_ENABLED = fused
+    config.LLM_STRUCTURED_OUTPUT = structured
+    workdir = tempfile.mkdtemp(prefix="bettafish-bench-")
+    previous_database = db._database_instance
+    db._database_instance = db.SimpleDatabase(os.path.join(workdir, "bench.db"))
+
+    llm_client = FakeLLMClient(config, token_latency, prefill_latency,
+                               fused_failure_rate=fused_failure_rate, overrun_tokens=overrun_tokens)
+
+    topic_list = [f"基准主题{i}" for i in range(topics)]
+    recorder = StageRecorder()
+    try:
+        with get_model_manager(config).use_client(llm_client):
+            run_one = _cli_runner(config) if mode == "cli" else _web_runner(config)
+            with recorder.instrument(), contextlib.redirect_stdout(io.StringIO()):
+                start_time = time.perf_counter()
+                latencies = _run_clients(topic_list, clients, run_one)
+                elapsed = time.perf_counter() - start_time
+    finally:
+        server.close()
+        db._database_instance = previous_database
+
+    stages = recorder.summary()
+    result = {
+        "mode": mode,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "parameters": {
+            "topics": topics,
+            "clients": clients,
+            "token_latency": token_latency,
+            "prefill_latency": prefill_latency,
+            "server_latency": server_latency,
+            "recorded_pages": bool(pages_dir),
+            "fused": fused,
+            "fused_failure_rate": fused_failure_rate,
+            "structured": structured,
+            "overrun_tokens": overrun_tokens,
+            "max_items": config.CRAWLER_MAX_ITEMS,
+            "max_tokens": config.LLM_MAX_TOKENS,
+            "job_workers": config.JOB_WORKERS
+        },
+        "elapsed": round(elapsed, 3),
+        "completed": len(latencies),
+        "failed": topics - len(latencies),
+        "throughput": {
+            "topics_per_min": round(len(latencies) / elapsed * 60, 2) if elapsed else 0.0
+        },
+        "end_to_end": latency_summary(latencies),
+        "stages": stages,
+        "memory": {"peak_rss_mb": peak_rss_mb()},
+        "crawl_requests": server.requests
+    }
+    # cli模式（app.analyze_topic）不保存分析结果，只有web模式统计数据库写入
+    if mode == "web":
+        db_writes = stages.get("db_write", {}).get("count", 0)
+        result["db"] = {
+            "writes": db_writes,
+            "writes_per_sec": round(db_writes / elapsed, 2) if elapsed else 0.0
+        }
+    return result
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """
+    对比两次运行的端到端与各阶段延迟及吞吐
+
+    Args:
+        current: 本次结果
+        baseline: 基准结果
+
+    Returns:
+        对比结果文本行，变化为正表示变慢（吞吐为变快）
+    """
+    def change(new: Optional[float], old: Optional[float]) -> str:
+        if not new or not old:
+            return "n/a"
+        return f"{(new - old) / old:+.1%}"
+
+    lines = []
+    sections = [("end_to_end", current.get("end_to_end", {}), baseline.get("end_to_end", {}))]
+    sections += [
+        (stage, summary, baseline.get("stages", {}).get(stage, {}))
+        for stage, summary in current.get("stages", {}).items()
+    ]
+    for name, new, old in sections:
+        lines.append(
+            f"{name:<16} p50 {new.get('p50_ms')}ms ({change(new.get('p50_ms'), old.get('p50_ms'))})  "
+            f"p95 {new.get('p95_ms')}ms ({change(new.get('p95_ms'), old.get('p95_ms'))})"
+        )
+    new_rate = current.get("throughput", {}).get("topics_per_min")
+    old_rate = baseline.get("throughput", {}).get("topics_per_min")
+    lines.append(f"{'throughput':<16} {new_rate} 主题/分钟 ({change(new_rate, old_rate)})")
+    return lines
@@ -0,0 +1,100 @@
+"""
+系统提示词前缀KV缓存模块
+预先计算固定系统提示词的past_key_values，后续生成只需对变化的用户内容做prefill
+"""
+
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+from loguru import logger
+
+
+class PrefixCache:
+    """按前缀哈希索引的有界KV缓存"""
+
+    def __init__(self, max_entries: int = 8):
+        """
+        初始化前缀KV缓存
+
+        Args:
+            max_entries: 最多保留的前缀数
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 命中统计
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(prefix: str) -> str:
+        """
+        计算前缀哈希
+
+        Args:
+            prefix: 前缀文本
+
+        Returns:
+            前缀哈希（SHA-256）
+        """
+        return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+    def get_or_compute(self, prefix: str, compute: Callable[[], Any]) -> Any:
+        """
+        获取前缀对应的past_key_values，不存在时计算并缓存
+
+        Args:
+            prefix: 前缀文本
+            compute: 计算past_key_values的函数
+
+        Returns:
+            past_key_values的副本，可安全地交给generate使用
+        """
+        key = self.make_key(prefix)
+        with self._lock:
+            past_key_values = self._entries.get(key)
+            if past_key_values is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if past_key_values is None:
+            past_key_values = compute()
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = past_key_values
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    evicted_key, _ = self._entries.popitem(last=False)
+                    logger.debug(f"淘汰前缀KV缓存条目: {evicted_key[:12]}")
+            logger.debug(f"已缓存系统提示词前缀KV: {key[:12]}")
+
+        return self._copy(past_key_values)
+
+    @staticmethod
+    def _copy(past_key_values: Any) -> Any:
+        """
+        复制past_key_values，避免生成过程原地扩展缓存的前缀
+
+        Args:
+            past_key_values: 缓存的past_key_values
+
+        Returns:
+            可供单次生成使用的past_key_values
+        """
+        # 旧版tuple格式的张量不会被原地修改，可直接共享；Cache对象会被原地追加，需要复制
+        if isinstance(past_key_values, tuple):
+            return past_key_values
+        return copy.deepcopy(past_key_values)
+
+    def stats(self) -> dict:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中/未命中计数及条目数
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
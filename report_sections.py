@@ -0,0 +1,68 @@
+"""
+分段输出解析模块
+洞察分析和舆情报告都要求按固定的小节标题输出，本模块将生成文本按小节标题拆分为字段
+"""
+
+import re
+from typing import Dict, Optional, Sequence
+
+# 洞察分析的小节标题
+INSIGHT_SECTIONS = ("主要观点", "公众情绪")
+
+# 舆情报告的小节标题
+REPORT_SECTIONS = ("热点话题", "主要观点", "公众情绪", "影响程度", "应对策略", "建议措施")
+
+_header_patterns: Dict[str, "re.Pattern"] = {}
+
+
+def _header_pattern(section: str) -> "re.Pattern":
+    """小节标题的匹配模式：行首（允许序号），标题后跟中文或英文冒号"""
+    pattern = _header_patterns.get(section)
+    if pattern is None:
+        pattern = _header_patterns[section] = re.compile(
+            rf"^[ \t]*(?:\d+[.、][ \t]*)?{re.escape(section)}[ \t]*[：:]", re.MULTILINE
+        )
+    return pattern
+
+
+def parse_sections(text: str, sections: Sequence[str]) -> Optional[Dict[str, str]]:
+    """
+    按小节标题顺序拆分文本
+
+    Args:
+        text: 生成的文本
+        sections: 小节标题，须按顺序出现
+
+    Returns:
+        {小节标题: 内容}，有小节缺失或内容为空时返回None
+    """
+    positions = []
+    pos = 0
+    for section in sections:
+        match = _header_pattern(section).search(text, pos)
+        if match is None:
+            return None
+        positions.append((match.start(), match.end()))
+        pos = match.end()
+
+    parsed = {}
+    for i, section in enumerate(sections):
+        end = positions[i + 1][0] if i + 1 < len(positions) else len(text)
+        content = text[positions[i][1]:end].strip()
+        if not content:
+            return None
+        parsed[section] = content
+    return parsed
+
+
+def format_sections(parsed: Dict[str, str]) -> str:
+    """
+    将小节字段还原为"标题：内容"的文本
+
+    Args:
+        parsed: {小节标题: 内容}
+
+    Returns:
+        按小节顺序拼接的文本
+    """
+    return "\n".join(f"{section}：{content}" for section, content in parsed.items())
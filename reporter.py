@@ -3,11 +3,18 @@
 使用本地LLM生成舆情分析报告
 """
 
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from loguru import logger
 from local_llm import LocalLLMClient
+from context_packer import get_context_packer
+from metrics import traced
+from report_sections import REPORT_SECTIONS
 import re
 
+# 生成失败时报告以该前缀开头，调用方据此区分失败
+REPORT_ERROR_PREFIX = "报告生成过程中发生错误"
+
 class Reporter:
     """报告生成器"""
     
@@ -21,7 +28,8 @@ class Reporter:
         self.llm_client = llm_client
         logger.info("报告生成器初始化完成")
     
-    def generate(self, topic: str, crawled_content: str, analysis_result: str) -> str:
+    def generate(self, topic: str, crawled_content: str, analysis_result: str,
+                 crawled_data: Optional[List[Dict[str, Any]]] = None) -> str:
         """
         生成舆情分析报告
         
@@ -29,12 +37,116 @@ class Reporter:
             topic: 报告主题
             crawled_content: 爬取的内容
             analysis_result: 分析结果
+            crawled_data: 爬取到的原始数据列表，提供时在token预算内挑选内容
             
         Returns:
             生成的报告
         """
+        return self.generate_sections(topic, crawled_content, analysis_result, crawled_data)[0]
+    
+    @traced("report")
+    def generate_sections(self, topic: str, crawled_content: str, analysis_result: str,
+                          crawled_data: Optional[List[Dict[str, Any]]] = None
+                          ) -> Tuple[str, Optional[Dict[str, str]]]:
+        """
+        生成舆情分析报告，开启结构化输出时同时返回约束解码得到的小节字段
+        
+        Args:
+            topic: 报告主题
+            crawled_content: 爬取的内容
+            analysis_result: 分析结果
+            crawled_data: 爬取到的原始数据列表，提供时在token预算内挑选内容
+            
+        Returns:
+            (生成的报告, {小节标题: 内容})，未开启结构化输出或生成失败时小节字段为None
+        """
         logger.info(f"开始生成报告: {topic}")
         
+        crawled_content = self._pack_content(topic, crawled_content, analysis_result, crawled_data)
+        messages = self._build_messages(topic, crawled_content, analysis_result)
+        
+        # 调用本地LLM生成报告
+        response = self.llm_client.chat_completion(messages, sections=self._output_sections())
+        
+        if response["choices"][0]["finish_reason"] == "error":
+            error_msg = response["choices"][0]["message"]["content"]
+            logger.error(f"报告生成过程中发生错误: {error_msg}")
+            return f"{REPORT_ERROR_PREFIX}: {error_msg}", None
+        
+        message = response["choices"][0]["message"]
+        logger.info(f"报告生成完成: {topic}")
+        
+        return message["content"], message.get("parsed")
+    
+    def generate_stream(self, topic: str, crawled_content: str, analysis_result: str,
+                        crawled_data: Optional[List[Dict[str, Any]]] = None,
+                        stop_event: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        流式生成舆情分析报告
+        
+        Args:
+            topic: 报告主题
+            crawled_content: 爬取的内容
+            analysis_result: 分析结果
+            crawled_data: 爬取到的原始数据列表，提供时在token预算内挑选内容
+            stop_event: 可选的停止事件，设置后中止生成
+            
+        Yields:
+            报告的文本片段
+        """
+        logger.info(f"开始流式生成报告: {topic}")
+        
+        try:
+            crawled_content = self._pack_content(topic, crawled_content, analysis_result, crawled_data)
+            messages = self._build_messages(topic, crawled_content, analysis_result)
+            for text in self.llm_client.stream_chat_completion(
+                messages, stop_event=stop_event, sections=self._output_sections()
+            ):
+                yield text
+        except Exception as e:
+            logger.error(f"报告生成过程中发生错误: {e}")
+            yield f"{REPORT_ERROR_PREFIX}: {e}"
+            return
+        
+        logger.info(f"报告生成完成: {topic}")
+    
+    def _output_sections(self) -> Optional[Tuple[str, ...]]:
+        """开启结构化输出时返回报告的小节标题，用于约束解码"""
+        return REPORT_SECTIONS if self.llm_client.config.LLM_STRUCTURED_OUTPUT else None
+    
+    def _pack_content(self, topic: str, crawled_content: str, analysis_result: str,
+                      crawled_data: Optional[List[Dict[str, Any]]]) -> str:
+        """
+        在扣除提示词和分析结果后的token预算内挑选爬取内容
+        
+        Args:
+            topic: 报告主题
+            crawled_content: 格式化后的爬取内容
+            analysis_result: 分析结果
+            crawled_data: 爬取到的原始数据列表，为None时原样使用格式化内容
+            
+        Returns:
+            放入prompt的爬取内容
+        """
+        if not crawled_data or not self.llm_client.config.CONTEXT_PACKING_ENABLED:
+            return crawled_content
+        packer = get_context_packer(self.llm_client)
+        budget = packer.budget(self._build_messages(topic, "", analysis_result), sections=self._output_sections())
+        return packer.pack(crawled_data, budget)
+    
+    def _build_messages(self, topic: str, crawled_content: str,
+                        analysis_result: str) -> List[Dict[str, str]]:
+        """
+        构造报告生成提示词
+        
+        Args:
+            topic: 报告主题
+            crawled_content: 爬取的内容
+            analysis_result: 分析结果
+            
+        Returns:
+            消息列表
+        """
         # 构造报告生成提示词，明确要求输出格式
         messages = [
             {
@@ -73,15 +185,4 @@ class Reporter:
             }
         ]
         
-        # 调用本地LLM生成报告
-        response = self.llm_client.chat_completion(messages)
-        
-        if response["choices"][0]["finish_reason"] == "error":
-            error_msg = response["choices"][0]["message"]["content"]
-            logger.error(f"报告生成过程中发生错误: {error_msg}")
-            return f"报告生成过程中发生错误: {error_msg}"
-        
-        report = response["choices"][0]["message"]["content"]
-        logger.info(f"报告生成完成: {topic}")
-        
-        return report
\ No newline at end of file
+        return messages
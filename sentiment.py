@@ -0,0 +1,172 @@
+"""
+情感与相关度预分类模块
+在调用LLM之前用词典快速为每条爬取内容打情感分和主题相关度，
+过滤无关内容，并立即给出量化的情感分布
+"""
+
+import math
+import re
+from typing import Any, Dict, List
+
+# 情感词典：只收录舆情内容中常见、含义明确的词
+POSITIVE_WORDS = [
+    "不错", "很好", "棒", "赞", "优秀", "出色", "精彩", "满意", "喜欢", "支持", "点赞", "感动", "温暖",
+    "开心", "高兴", "幸福", "厉害", "靠谱", "值得", "推荐", "良心", "给力", "成功",
+    "进步", "提升", "改善", "稳定", "放心", "安全", "感谢", "佩服", "骄傲", "自豪", "正能量",
+    "期待", "希望", "积极", "认可", "专业", "负责", "透明", "公正", "及时", "有效", "贴心",
+    "美好", "漂亮", "完美", "震撼", "加油", "好评", "实用", "划算", "惊喜", "暖心", "利好",
+]
+NEGATIVE_WORDS = [
+    "不好", "不行", "差劲", "烂", "坑", "骗", "垃圾", "失望", "愤怒", "生气", "恶心", "讨厌", "反对",
+    "抵制", "投诉", "维权", "质疑", "不满", "批评", "谴责", "丑闻", "黑幕", "造假", "欺诈",
+    "违法", "违规", "事故", "危险", "隐患", "担心", "担忧", "害怕", "恐慌", "焦虑",
+    "可怕", "离谱", "无语", "崩溃", "难过", "伤心", "心寒", "痛心", "糟糕", "差评", "翻车",
+    "暴雷", "下跌", "亏损", "裁员", "涨价", "敷衍", "甩锅", "推诿", "隐瞒", "删帖", "舆论危机",
+]
+NEGATIONS = ["不", "没", "无", "非", "别", "未", "莫", "毫无", "并不", "从不"]
+INTENSIFIERS = {"非常": 1.5, "特别": 1.5, "十分": 1.5, "极其": 2.0, "超级": 1.5, "太": 1.5, "很": 1.3, "真": 1.2}
+
+# 否定词和程度副词只在情感词之前的这几个字符内生效
+_MODIFIER_WINDOW = 3
+
+# 所有词典词编译为一个正则，长词优先，一次扫描完成匹配
+_WORD_POLARITY = {word: 1.0 for word in POSITIVE_WORDS}
+_WORD_POLARITY.update({word: -1.0 for word in NEGATIVE_WORDS})
+_LEXICON_PATTERN = re.compile(
+    "|".join(re.escape(word) for word in sorted(_WORD_POLARITY, key=len, reverse=True))
+)
+_NEGATION_PATTERN = re.compile("|".join(re.escape(word) for word in NEGATIONS))
+
+SENTIMENT_LABELS = ("positive", "neutral", "negative")
+
+# 主题中不参与相关度计算的泛化词，如"某某舆情"、"某某事件"
+TOPIC_STOPWORDS = ["舆情", "事件", "热点", "话题", "分析", "最新", "消息"]
+
+
+def sentiment_score(text: str) -> float:
+    """
+    计算文本的情感分
+
+    Args:
+        text: 文本
+
+    Returns:
+        -1（负面）到 1（正面）之间的情感分，没有情感词时为0
+    """
+    text = text.lower()
+    positive = negative = 0.0
+    previous_end = 0
+    for match in _LEXICON_PATTERN.finditer(text):
+        polarity = _WORD_POLARITY[match.group()]
+        # 修饰词窗口不跨过前一个情感词，避免"不错，值得"中的"不"否定"值得"
+        window = text[max(previous_end, match.start() - _MODIFIER_WINDOW):match.start()]
+        previous_end = match.end()
+        for word, weight in INTENSIFIERS.items():
+            if word in window:
+                polarity *= weight
+                # "非常"中的"非"不是否定词
+                window = window.replace(word, "")
+                break
+        if _NEGATION_PATTERN.search(window):
+            polarity = -polarity
+        if polarity > 0:
+            positive += polarity
+        else:
+            negative -= polarity
+
+    if positive + negative == 0:
+        return 0.0
+    return (positive - negative) / (positive + negative)
+
+
+def relevance_score(text: str, topic: str) -> float:
+    """
+    计算文本与主题的相关度：主题中的二元字组在文本中出现的比例
+
+    Args:
+        text: 文本
+        topic: 主题
+
+    Returns:
+        0~1之间的相关度
+    """
+    text = text.lower()
+    topic = "".join(topic.lower().split())
+    for word in TOPIC_STOPWORDS:
+        topic = topic.replace(word, "")
+    if not topic:
+        return 1.0
+    if topic in text:
+        return 1.0
+    grams = {topic[i:i + 2] for i in range(len(topic) - 1)} or {topic}
+    return sum(gram in text for gram in grams) / len(grams)
+
+
+def sentiment_label(score: float, threshold: float = 0.2) -> str:
+    """
+    将情感分映射为情感标签
+
+    Args:
+        score: 情感分
+        threshold: 判定为正面/负面的最小绝对值
+
+    Returns:
+        positive / neutral / negative
+    """
+    if score >= threshold:
+        return "positive"
+    if score <= -threshold:
+        return "negative"
+    return "neutral"
+
+
+def score_items(topic: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    为爬取内容打情感分和相关度
+
+    Args:
+        topic: 主题
+        items: 爬取到的内容列表
+
+    Returns:
+        附带 sentiment、sentiment_label、relevance 字段的内容列表
+    """
+    scored = []
+    for item in items:
+        content = item.get("content", "")
+        score = sentiment_score(content)
+        scored.append(dict(
+            item,
+            sentiment=round(score, 4),
+            sentiment_label=sentiment_label(score),
+            relevance=round(relevance_score(content, topic), 4)
+        ))
+    return scored
+
+
+def summarize_sentiment(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    汇总情感分布
+
+    Args:
+        items: 已打分的内容列表
+
+    Returns:
+        各情感标签的条数与占比、平均情感分及按互动量加权的平均情感分
+    """
+    scored = [item for item in items if item.get("sentiment") is not None]
+    counts = {label: 0 for label in SENTIMENT_LABELS}
+    for item in scored:
+        counts[item["sentiment_label"]] += 1
+
+    total = len(scored)
+    weights = [1 + math.log1p((item.get("likes") or 0) + (item.get("comments") or 0)) for item in scored]
+    return {
+        "count": total,
+        "counts": counts,
+        "ratios": {label: round(count / total, 4) if total else 0.0 for label, count in counts.items()},
+        "mean": round(sum(item["sentiment"] for item in scored) / total, 4) if total else 0.0,
+        "weighted_mean": round(
+            sum(weight * item["sentiment"] for weight, item in zip(weights, scored)) / sum(weights), 4
+        ) if total else 0.0
+    }
@@ -0,0 +1,142 @@
+"""
+共享权重模块
+将模型参数替换为对safetensors文件的内存映射视图，多个工作进程共享同一份页缓存而非各自持有一份权重
+"""
+
+import glob
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+import torch
+from loguru import logger
+
+# safetensors dtype标记与torch dtype的对应关系
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+class MappedSafetensors:
+    """以内存映射方式打开模型目录下的safetensors文件"""
+
+    def __init__(self, model_path: str):
+        """
+        打开并映射所有safetensors文件
+
+        Args:
+            model_path: 模型目录
+        """
+        self.files = sorted(glob.glob(os.path.join(model_path, "*.safetensors")))
+        if not self.files:
+            raise FileNotFoundError(f"模型目录中没有safetensors文件: {model_path}")
+
+        # 映射对象必须在模型生命周期内保持打开
+        self._maps: List[mmap.mmap] = []
+        self.tensors: Dict[str, torch.Tensor] = {}
+        for path in self.files:
+            self._map_file(path)
+
+    def _map_file(self, path: str):
+        """
+        解析safetensors头部，为每个张量创建零拷贝视图
+
+        Args:
+            path: safetensors文件路径
+        """
+        # 写时复制映射：只读使用时各进程共享同一份页缓存
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._maps.append(mapped)
+
+        header_size = struct.unpack("<Q", mapped[:8])[0]
+        header = json.loads(mapped[8:8 + header_size])
+        data_start = 8 + header_size
+
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            dtype = SAFETENSORS_DTYPES[info["dtype"]]
+            begin, end = info["data_offsets"]
+            count = (end - begin) // torch.tensor([], dtype=dtype).element_size()
+            tensor = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + begin)
+            self.tensors[name] = tensor.view(info["shape"])
+
+    def nbytes(self) -> int:
+        """映射的总字节数"""
+        return sum(len(mapped) for mapped in self._maps)
+
+
+def _read_header(path: str) -> Dict[str, Any]:
+    """只读取safetensors文件头部，不映射张量数据"""
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        return json.loads(f.read(header_size))
+
+
+def checkpoint_dtype(model_path: str) -> Optional[torch.dtype]:
+    """
+    检测safetensors文件中浮点权重的dtype
+
+    Args:
+        model_path: 模型目录
+
+    Returns:
+        按字节数占多数的浮点dtype，没有safetensors文件时返回None
+    """
+    sizes: Dict[torch.dtype, int] = {}
+    for path in sorted(glob.glob(os.path.join(model_path, "*.safetensors"))):
+        for name, info in _read_header(path).items():
+            if name == "__metadata__":
+                continue
+            dtype = SAFETENSORS_DTYPES.get(info["dtype"])
+            if dtype is None or not dtype.is_floating_point:
+                continue
+            begin, end = info["data_offsets"]
+            sizes[dtype] = sizes.get(dtype, 0) + end - begin
+    if not sizes:
+        return None
+    return max(sizes, key=sizes.get)
+
+
+def share_model_weights(model: torch.nn.Module, model_path: str) -> Tuple[MappedSafetensors, int]:
+    """
+    将模型参数替换为内存映射视图，释放进程私有的权重副本
+
+    只替换形状和dtype与文件完全一致的参数，其余参数保持原样
+
+    Args:
+        model: 已加载的模型
+        model_path: 模型目录
+
+    Returns:
+        (映射对象, 被替换的参数数)，映射对象需与模型一同保持存活
+    """
+    mapped = MappedSafetensors(model_path)
+    shared = 0
+    skipped = 0
+    with torch.no_grad():
+        for name, param in model.named_parameters():
+            tensor = mapped.tensors.get(name)
+            if tensor is None or tensor.shape != param.shape or tensor.dtype != param.dtype:
+                skipped += 1
+                continue
+            # 保持Parameter对象不变，绑定权重（如共享的embedding）会同时生效
+            param.data = tensor
+            shared += 1
+
+    logger.info(
+        f"已通过内存映射共享 {shared} 个参数（{mapped.nbytes() / 1024 ** 2:.0f} MB），"
+        f"未共享 {skipped} 个参数"
+    )
+    return mapped, shared
@@ -3,22 +3,123 @@
 爬取舆情相关信息
 """
 
+import contextvars
 import json
 import time
 import random
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from loguru import logger
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import urllib.parse
 import re
 
+from config import Settings
+from db import SimpleDatabase, get_database
+from dedup import deduplicate
+from sentiment import score_items
+from metrics import get_metrics, span, traced
+from html_extract import ResultSelector, extract_results
+
+# 各数据源搜索结果的提取规则，与 _parse_*_soup 中的BeautifulSoup查找方式一致
+DOUYIN_SELECTOR = ResultSelector(
+    container=("div", {"data-e2e": "search-result-item"}),
+    title=[("h3", None), ("a", None)],
+    content=[]
+)
+BAIDU_SELECTOR = ResultSelector(
+    container=("div", {"class": "result"}),
+    title=[("h3", None), ("a", None)],
+    content=[("span", "content-right_2snyr"), ("div", "c-row")]
+)
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# 各数据源共享的HTTP会话，复用keep-alive连接
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+# 正在后台刷新的缓存键
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def get_session(source: str, pool_size: int = 10) -> requests.Session:
+    """
+    获取数据源对应的连接池化HTTP会话
+    
+    Args:
+        source: 数据源名称
+        pool_size: 连接池大小
+        
+    Returns:
+        requests.Session实例
+    """
+    with _sessions_lock:
+        session = _sessions.get(source)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[source] = session
+        return session
+
+class CrawlSource:
+    """数据源定义"""
+    
+    def __init__(self, name: str, label: str,
+                 build_request: Callable[[str], Tuple[str, Dict[str, str]]],
+                 parse: Callable[[str, int], List[Dict[str, Any]]]):
+        """
+        初始化数据源
+        
+        Args:
+            name: 数据源名称
+            label: 日志中显示的名称
+            build_request: 构造请求的函数，接收topic，返回(URL, 请求头)
+            parse: 解析页面的函数，接收(html, max_items)，返回内容列表
+        """
+        self.name = name
+        self.label = label
+        self.build_request = build_request
+        self.parse = parse
+
 class SimpleCrawler:
     """简化版网络爬虫"""
     
-    def __init__(self):
-        """初始化爬虫"""
+    def __init__(self, config: Optional[Settings] = None,
+                 database: Optional[SimpleDatabase] = None):
+        """
+        初始化爬虫
+        
+        Args:
+            config: 配置对象，为None时使用默认配置
+            database: 缓存使用的数据库实例，为None时使用全局实例
+        """
         logger.info("初始化网络爬虫")
+        self.config = config or Settings()
+        
+        # 数据源注册表，按优先级排列：名称 -> CrawlSource
+        self.sources: Dict[str, CrawlSource] = {}
+        self.register_source(CrawlSource("douyin", "抖音", self._douyin_request, self._parse_douyin))
+        self.register_source(CrawlSource("baidu", "百度", self._baidu_request, self._parse_baidu))
+        
+        # 爬取结果缓存
+        self.database = None
+        if self.config.CRAWLER_CACHE_ENABLED:
+            self.database = database or get_database()
+    
+    def register_source(self, source: "CrawlSource"):
+        """
+        注册数据源
+        
+        Args:
+            source: 数据源定义
+        """
+        self.sources[source.name] = source
         
     def _clean_text(self, text: str) -> str:
         """
@@ -33,27 +134,24 @@ class SimpleCrawler:
         if not text:
             return ""
         # 去除多余空白字符
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_PATTERN.sub(' ', text)
         # 去除首尾空格
         text = text.strip()
         return text
     
-    def _crawl_douyin(self, topic: str, max_items: int = 10) -> List[Dict[str, Any]]:
+    def _douyin_request(self, topic: str) -> Tuple[str, Dict[str, str]]:
         """
-        从抖音爬取内容
+        构造抖音搜索请求
         
         Args:
             topic: 要爬取的主题
-            max_items: 最大爬取条数
             
         Returns:
-            爬取到的内容列表
+            (请求URL, 请求头)
         """
-        logger.info(f"尝试从抖音爬取主题 '{topic}' 的相关内容")
-        
         # 抖音搜索URL (注意：实际抖音有复杂的反爬虫机制)
         encoded_topic = urllib.parse.quote(topic)
-        url = f"https://www.douyin.com/search/{encoded_topic}"
+        url = self.config.CRAWLER_DOUYIN_URL.format(topic=encoded_topic)
         
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -62,141 +160,365 @@ class SimpleCrawler:
             'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
         }
+        return url, headers
+    
+    def _parse_douyin(self, html: str, max_items: int) -> List[Dict[str, Any]]:
+        """
+        解析抖音搜索结果页面
         
-        try:
-            # 发送GET请求
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            # 解析HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 查找视频内容 (注意：实际结构需要根据抖音页面结构调整)
-            video_items = soup.find_all('div', {'data-e2e': 'search-result-item'}, limit=max_items)
-            
-            result = []
-            for item in video_items:
-                # 尝试提取视频标题或描述
-                title_elem = item.find('h3') or item.find('a')
-                if title_elem:
-                    title = title_elem.get_text(strip=True)
-                    
-                    # 简单估算点赞和评论数
-                    likes = random.randint(0, 1000)
-                    comments = random.randint(0, 100)
-                    
-                    result.append({
-                        "content": title,
-                        "likes": likes,
-                        "comments": comments
-                    })
-                    
-                    if len(result) >= max_items:
-                        break
-                        
-            logger.info(f"从抖音获取到 {len(result)} 条相关数据")
-            return result
+        Args:
+            html: 页面HTML
+            max_items: 最大条数
             
-        except Exception as e:
-            logger.error(f"从抖音爬取数据时出错: {e}")
-            return []
+        Returns:
+            内容列表
+        """
+        if not self.config.CRAWLER_FAST_PARSER:
+            return self._parse_douyin_soup(html, max_items)
+        
+        result = []
+        for extracted in extract_results(html, DOUYIN_SELECTOR, max_items):
+            if extracted is None:
+                continue
+            title, _ = extracted
+            result.append({
+                "content": title,
+                "likes": random.randint(0, 1000),
+                "comments": random.randint(0, 100)
+            })
+        return result
+    
+    def _parse_douyin_soup(self, html: str, max_items: int) -> List[Dict[str, Any]]:
+        """
+        使用BeautifulSoup解析抖音搜索结果页面，作为快速提取的对照实现
+        
+        Args:
+            html: 页面HTML
+            max_items: 最大条数
             
-    def _crawl_baidu(self, topic: str, max_items: int = 10) -> List[Dict[str, Any]]:
+        Returns:
+            内容列表
         """
-        从百度搜索爬取内容
+        # 解析HTML
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # 查找视频内容 (注意：实际结构需要根据抖音页面结构调整)
+        video_items = soup.find_all('div', {'data-e2e': 'search-result-item'}, limit=max_items)
+        
+        result = []
+        for item in video_items:
+            # 尝试提取视频标题或描述
+            title_elem = item.find('h3') or item.find('a')
+            if title_elem:
+                title = title_elem.get_text(strip=True)
+                
+                # 简单估算点赞和评论数
+                likes = random.randint(0, 1000)
+                comments = random.randint(0, 100)
+                
+                result.append({
+                    "content": title,
+                    "likes": likes,
+                    "comments": comments
+                })
+                
+                if len(result) >= max_items:
+                    break
+        
+        return result
+    
+    def _baidu_request(self, topic: str) -> Tuple[str, Dict[str, str]]:
+        """
+        构造百度搜索请求
         
         Args:
             topic: 要爬取的主题
-            max_items: 最大爬取条数
             
         Returns:
-            爬取到的内容列表
+            (请求URL, 请求头)
         """
-        logger.info(f"尝试从百度爬取主题 '{topic}' 的相关内容")
-        
         # 百度搜索URL
         encoded_topic = urllib.parse.quote(topic)
-        url = f"https://www.baidu.com/s?wd={encoded_topic}"
+        url = self.config.CRAWLER_BAIDU_URL.format(topic=encoded_topic)
         
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'zh-CN,zh;q=0.8,en-US;q=0.5,en;q=0.3',
         }
+        return url, headers
+    
+    def _parse_baidu(self, html: str, max_items: int) -> List[Dict[str, Any]]:
+        """
+        解析百度搜索结果页面
         
-        try:
-            # 发送GET请求
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+        Args:
+            html: 页面HTML
+            max_items: 最大条数
             
-            # 解析HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
+        Returns:
+            内容列表
+        """
+        if not self.config.CRAWLER_FAST_PARSER:
+            return self._parse_baidu_soup(html, max_items)
+        
+        result = []
+        for extracted in extract_results(html, BAIDU_SELECTOR, max_items):
+            if extracted is None:
+                continue
+            title, content = extracted
+            content = content[:100]  # 限制长度
+            # 合并标题和内容并清理，忽略过短的内容
+            full_content = self._clean_text(f"{title} {content}" if title != content else content)
+            if len(full_content) < 5:
+                continue
+            result.append({
+                "content": full_content,
+                "likes": random.randint(0, 100),
+                "comments": random.randint(0, 50)
+            })
+        return result
+    
+    def _parse_baidu_soup(self, html: str, max_items: int) -> List[Dict[str, Any]]:
+        """
+        使用BeautifulSoup解析百度搜索结果页面，作为快速提取的对照实现
+        
+        Args:
+            html: 页面HTML
+            max_items: 最大条数
             
-            # 查找搜索结果
-            result_items = soup.find_all('div', class_='result', limit=max_items)
+        Returns:
+            内容列表
+        """
+        # 解析HTML
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # 查找搜索结果
+        result_items = soup.find_all('div', class_='result', limit=max_items)
+        
+        result = []
+        for item in result_items:
+            title_elem = item.find('h3') or item.find('a')
+            if title_elem:
+                title = title_elem.get_text(strip=True)
+                content_elem = item.find('span', class_='content-right_2snyr') or item.find('div', class_='c-row') or item
+                content = content_elem.get_text(strip=True)[:100]  # 限制长度
+                
+                # 合并标题和内容
+                full_content = f"{title} {content}" if title != content else content
+                # 清理内容
+                full_content = self._clean_text(full_content)
+                
+                # 忽略过短的内容
+                if len(full_content) < 5:
+                    continue
+                
+                # 简单估算点赞和评论数
+                likes = random.randint(0, 100)
+                comments = random.randint(0, 50)
+                
+                result.append({
+                    "content": full_content,
+                    "likes": likes,
+                    "comments": comments
+                })
+                
+                if len(result) >= max_items:
+                    break
+        
+        return result
+    
+    def _crawl_douyin(self, topic: str, max_items: int = 10) -> List[Dict[str, Any]]:
+        """
+        从抖音爬取内容
+        
+        Args:
+            topic: 要爬取的主题
+            max_items: 最大爬取条数
+            
+        Returns:
+            爬取到的内容列表
+        """
+        return self._crawl_source(self.sources["douyin"], topic, max_items)
             
-            result = []
-            for item in result_items:
-                title_elem = item.find('h3') or item.find('a')
-                if title_elem:
-                    title = title_elem.get_text(strip=True)
-                    content_elem = item.find('span', class_='content-right_2snyr') or item.find('div', class_='c-row') or item
-                    content = content_elem.get_text(strip=True)[:100]  # 限制长度
-                    
-                    # 合并标题和内容
-                    full_content = f"{title} {content}" if title != content else content
-                    # 清理内容
-                    full_content = self._clean_text(full_content)
-                    
-                    # 忽略过短的内容
-                    if len(full_content) < 5:
-                        continue
-                    
-                    # 简单估算点赞和评论数
-                    likes = random.randint(0, 100)
-                    comments = random.randint(0, 50)
-                    
-                    result.append({
-                        "content": full_content,
-                        "likes": likes,
-                        "comments": comments
-                    })
-                    
-                    if len(result) >= max_items:
-                        break
-                        
-            logger.info(f"从百度获取到 {len(result)} 条相关数据")
-            return result
+    def _crawl_baidu(self, topic: str, max_items: int = 10) -> List[Dict[str, Any]]:
+        """
+        从百度搜索爬取内容
+        
+        Args:
+            topic: 要爬取的主题
+            max_items: 最大爬取条数
+            
+        Returns:
+            爬取到的内容列表
+        """
+        return self._crawl_source(self.sources["baidu"], topic, max_items)
+    
+    def _crawl_source(self, source: "CrawlSource", topic: str, max_items: int,
+                      revalidate: bool = False) -> List[Dict[str, Any]]:
+        """
+        从指定数据源爬取内容，优先使用缓存
+        
+        缓存未过期时直接返回；已过期时先返回旧数据，并在后台刷新缓存
+        
+        Args:
+            source: 数据源定义
+            topic: 要爬取的主题
+            max_items: 最大爬取条数
+            revalidate: 缓存过期时同步做条件请求，不返回旧数据
             
+        Returns:
+            爬取到的内容列表
+        """
+        entry = {}
+        if self.database is not None:
+            entry = self.database.get_crawl_cache(source.name, topic, max_items)
+        
+        if entry:
+            ttl = self.config.CRAWLER_CACHE_TTL.get(source.name, self.config.CRAWLER_CACHE_DEFAULT_TTL)
+            if entry["age"] < ttl:
+                logger.info(f"{source.label}爬取缓存命中: '{topic}'")
+                return entry["items"]
+            if not revalidate and entry["age"] < ttl + self.config.CRAWLER_CACHE_MAX_STALE:
+                logger.info(f"{source.label}爬取缓存已过期，先返回旧数据并在后台刷新: '{topic}'")
+                self._refresh_in_background(source, topic, max_items, entry)
+                return entry["items"]
+        
+        try:
+            return self._fetch_source(source, topic, max_items, entry)
         except Exception as e:
-            logger.error(f"从百度爬取数据时出错: {e}")
+            logger.error(f"从{source.label}爬取数据时出错: {e}")
             return []
     
-    def crawl_topic(self, topic: str, max_items: int = 10) -> List[Dict[str, Any]]:
+    def _fetch_source(self, source: "CrawlSource", topic: str, max_items: int,
+                      entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        请求数据源并更新缓存，有缓存时携带ETag/Last-Modified做条件请求
+        
+        Args:
+            source: 数据源定义
+            topic: 要爬取的主题
+            max_items: 最大爬取条数
+            entry: 已有的缓存条目，没有时为空字典
+            
+        Returns:
+            爬取到的内容列表
+        """
+        logger.info(f"尝试从{source.label}爬取主题 '{topic}' 的相关内容")
+        
+        url, headers = source.build_request(topic)
+        if entry.get("etag"):
+            headers['If-None-Match'] = entry["etag"]
+        if entry.get("last_modified"):
+            headers['If-Modified-Since'] = entry["last_modified"]
+        
+        # 发送GET请求
+        session = get_session(source.name, self.config.CRAWLER_POOL_SIZE)
+        response = session.get(url, headers=headers, timeout=self.config.CRAWLER_TIMEOUT)
+        
+        if response.status_code == 304 and entry:
+            logger.info(f"{source.label}内容未变化，沿用缓存数据: '{topic}'")
+            self.database.touch_crawl_cache(source.name, topic, max_items)
+            return entry["items"]
+        
+        response.raise_for_status()
+        result = source.parse(response.text, max_items)
+        logger.info(f"从{source.label}获取到 {len(result)} 条相关数据")
+        
+        # 空结果多为反爬页面或临时故障，不写入缓存，下次请求重新爬取
+        if self.database is not None and result:
+            self.database.save_crawl_cache(
+                source.name, topic, max_items, result,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+        return result
+    
+    def _refresh_in_background(self, source: "CrawlSource", topic: str, max_items: int,
+                               entry: Dict[str, Any]):
+        """
+        在后台线程中刷新缓存，同一缓存键同时只刷新一次
+        
+        Args:
+            source: 数据源定义
+            topic: 要爬取的主题
+            max_items: 最大爬取条数
+            entry: 已过期的缓存条目
+        """
+        key = (source.name, topic, max_items)
+        with _refreshing_lock:
+            if key in _refreshing:
+                return
+            _refreshing.add(key)
+        
+        def refresh():
+            try:
+                self._fetch_source(source, topic, max_items, entry)
+            except Exception as e:
+                logger.error(f"后台刷新{source.label}爬取缓存失败: {e}")
+            finally:
+                with _refreshing_lock:
+                    _refreshing.discard(key)
+        
+        threading.Thread(target=refresh, name=f"crawl-refresh-{source.name}", daemon=True).start()
+    
+    @traced("crawl")
+    def crawl_topic(self, topic: str, max_items: int = 10,
+                    revalidate: bool = False) -> List[Dict[str, Any]]:
         """
         爬取特定主题的内容，尝试多种数据源
         
         Args:
             topic: 要爬取的主题
             max_items: 最大爬取条数
+            revalidate: 缓存过期时同步做条件请求而不是先返回旧数据（主题监控使用）
             
         Returns:
             爬取到的内容列表
         """
         logger.info(f"开始爬取主题 '{topic}' 的相关内容")
         
-        # 尝试从不同平台爬取数据
+        # 并发爬取所有数据源，超过全局时限后只使用已返回的数据；复制上下文使各数据源的耗时计入当前请求的追踪
+        executor = ThreadPoolExecutor(max_workers=max(1, len(self.sources)), thread_name_prefix="crawler")
+        
+        def crawl(source: CrawlSource) -> List[Dict[str, Any]]:
+            with span(f"crawl.{source.name}"):
+                items = self._crawl_source(source, topic, max_items, revalidate)
+            get_metrics().inc("bettafish_crawl_items_total", len(items), help="爬取到的内容条数", source=source.name)
+            return items
+        
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, crawl, source)
+            for name, source in self.sources.items()
+        }
+        done, not_done = wait(futures.values(), timeout=self.config.CRAWLER_DEADLINE)
+        executor.shutdown(wait=False)
+        
+        # 按数据源优先级合并结果
         crawled_data = []
+        for name, future in futures.items():
+            if future not in done:
+                logger.warning(f"数据源 {name} 超过爬取时限 {self.config.CRAWLER_DEADLINE}s，已跳过")
+                continue
+            try:
+                crawled_data.extend(future.result())
+            except Exception as e:
+                logger.error(f"数据源 {name} 爬取失败: {e}")
         
-        # 首先尝试从抖音爬取
-        if len(crawled_data) < max_items:
-            douyin_data = self._crawl_douyin(topic, max_items)
-            crawled_data.extend(douyin_data)
-            
-        # 如果抖音数据不足，尝试从百度爬取
-        if len(crawled_data) < max_items:
-            baidu_data = self._crawl_baidu(topic, max_items - len(crawled_data))
-            crawled_data.extend(baidu_data)
+        # 合并各数据源中转载、搬运的近似重复内容，腾出的名额留给不同的内容
+        if self.config.DEDUP_ENABLED:
+            before = len(crawled_data)
+            crawled_data = deduplicate(crawled_data, self.config.DEDUP_SIMILARITY, self._clean_text)
+            if len(crawled_data) < before:
+                logger.info(f"合并了 {before - len(crawled_data)} 条近似重复内容")
+        
+        # 词典预分类：打情感分和相关度，过滤与主题无关的内容
+        if self.config.SENTIMENT_ENABLED:
+            crawled_data = score_items(topic, crawled_data)
+            relevant = [item for item in crawled_data if item["relevance"] >= self.config.RELEVANCE_MIN]
+            if relevant and len(relevant) < len(crawled_data):
+                logger.info(f"过滤了 {len(crawled_data) - len(relevant)} 条与主题无关的内容")
+                crawled_data = relevant
         
         # 限制返回数量
         crawled_data = crawled_data[:max_items]
@@ -0,0 +1,117 @@
+"""
+结构化输出约束解码模块
+按固定的小节标题约束生成：第一个小节标题放在prompt末尾，每个小节写完一行后强制输出下一个小节标题，
+最后一个小节有内容之前禁止结束，最后一个小节写完后立即停止生成
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Union
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+
+class SectionConstraint(LogitsProcessor):
+    """单条生成的小节结构约束"""
+
+    def __init__(self, tokenizer: Any, sections: Sequence[str], prompt_length: int,
+                 max_new_tokens: int, eos_token_id: Optional[Union[int, List[int]]]):
+        """
+        初始化小节约束
+
+        Args:
+            tokenizer: 分词器
+            sections: 小节标题，按顺序输出
+            prompt_length: prompt的token数（含末尾的第一个小节标题）
+            max_new_tokens: 最大生成token数，用于为每个小节分配长度上限
+            eos_token_id: 结束token，最后一个小节有内容之前被屏蔽
+        """
+        self.tokenizer = tokenizer
+        self.sections = list(sections)
+        self.header_ids = [
+            tokenizer(f"{section}：", add_special_tokens=False).input_ids for section in self.sections
+        ]
+        self.newline_ids = tokenizer("\n", add_special_tokens=False).input_ids
+        eos_token_ids = eos_token_id if isinstance(eos_token_id, list) else [eos_token_id]
+        self.eos_token_ids = [token_id for token_id in eos_token_ids if token_id is not None]
+
+        # 为后续小节标题预留token后平均分配给各小节，小节超长时强制换到下一小节，保证所有小节都能输出
+        reserved = sum(len(ids) + len(self.newline_ids) for ids in self.header_ids[1:])
+        self.section_budget = max(1, (max_new_tokens - reserved) // len(self.sections))
+
+        self.index = 0
+        self.finished = False
+        self._section_tokens = 0
+        self._has_content = False
+        self._forced: List[int] = []
+        self._skip = 0
+        self._seen = prompt_length
+        self._token_text: Dict[int, str] = {}
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        self.update(input_ids)
+        if self._forced:
+            forced = torch.full_like(scores, float("-inf"))
+            forced[:, self._forced.pop(0)] = 0
+            self._skip += 1
+            return forced
+        if self.eos_token_ids and (self.index < len(self.sections) - 1 or not self._has_content):
+            scores[:, self.eos_token_ids] = float("-inf")
+        return scores
+
+    def update(self, input_ids: torch.LongTensor):
+        """
+        根据新生成的token推进小节状态
+
+        Args:
+            input_ids: 当前完整序列，批大小为1
+        """
+        for token_id in input_ids[0, self._seen:].tolist():
+            self._advance(token_id)
+        self._seen = input_ids.shape[1]
+
+    def _advance(self, token_id: int):
+        """处理一个生成的token，强制输出的标题token不计入小节内容"""
+        if self._skip:
+            self._skip -= 1
+            return
+        if self.finished:
+            return
+
+        text = self._token_text.get(token_id)
+        if text is None:
+            text = self._token_text[token_id] = self.tokenizer.decode([token_id])
+
+        # 小节已有内容后换行即视为小节结束
+        if "\n" in text and self._has_content:
+            self._next_section(newline=False)
+            return
+        if text.strip():
+            self._has_content = True
+        self._section_tokens += 1
+        if self._has_content and self._section_tokens >= self.section_budget:
+            self._next_section(newline=True)
+
+    def _next_section(self, newline: bool):
+        """结束当前小节，排队强制输出下一个小节标题；最后一个小节结束时标记完成"""
+        if self.index == len(self.sections) - 1:
+            self.finished = True
+            return
+        self.index += 1
+        self._section_tokens = 0
+        self._has_content = False
+        self._forced = (self.newline_ids if newline else []) + self.header_ids[self.index]
+
+
+class SectionStoppingCriteria(StoppingCriteria):
+    """最后一个小节完成后停止生成"""
+
+    def __init__(self, constraint: SectionConstraint):
+        """
+        Args:
+            constraint: 同一次生成使用的小节约束
+        """
+        self.constraint = constraint
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        # 最新的token尚未经过约束处理器，先推进状态
+        self.constraint.update(input_ids)
+        return self.constraint.finished
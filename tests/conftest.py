@@ -0,0 +1,45 @@
+"""
+测试公共夹具
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Settings
+from db import SimpleDatabase
+from pipeline_benchmark import StubCrawlServer, build_stub_pages
+
+
+@pytest.fixture
+def database(tmp_path):
+    """临时目录中的独立数据库"""
+    return SimpleDatabase(str(tmp_path / "test.db"))
+
+
+@pytest.fixture
+def stub_pages():
+    """每个数据源5条结果的桩页面"""
+    return build_stub_pages(items=5, padding=2)
+
+
+@pytest.fixture
+def stub_server(stub_pages):
+    """提供抖音/百度桩页面的本地服务器"""
+    server = StubCrawlServer(stub_pages)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def crawler_config(stub_server):
+    """指向桩服务器、关闭爬取缓存的爬虫配置"""
+    config = Settings()
+    config.CRAWLER_DOUYIN_URL = stub_server.url("douyin")
+    config.CRAWLER_BAIDU_URL = stub_server.url("baidu")
+    config.CRAWLER_CACHE_ENABLED = False
+    config.CRAWLER_MAX_ITEMS = 20
+    return config
@@ -0,0 +1,54 @@
+"""
+生成结果缓存测试
+"""
+
+from completion_cache import CompletionCache
+
+
+def test_make_key_depends_on_prompt_and_kwargs():
+    key = CompletionCache.make_key("model", "prompt", {"max_new_tokens": 10})
+
+    assert key == CompletionCache.make_key("model", "prompt", {"max_new_tokens": 10})
+    assert key != CompletionCache.make_key("model", "prompt", {"max_new_tokens": 11})
+    assert key != CompletionCache.make_key("model", "other", {"max_new_tokens": 10})
+    assert key != CompletionCache.make_key("other", "prompt", {"max_new_tokens": 10})
+
+
+def test_memory_hit_and_miss_are_counted():
+    cache = CompletionCache()
+    assert cache.get("key") is None
+
+    cache.put("key", "内容", 12, 3)
+
+    assert cache.get("key") == {"content": "内容", "prompt_tokens": 12, "completion_tokens": 3}
+    assert cache.stats() == {"memory_hits": 1, "db_hits": 0, "misses": 1, "memory_entries": 1}
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = CompletionCache(memory_size=2)
+    cache.put("a", "A", 1, 1)
+    cache.put("b", "B", 1, 1)
+    cache.get("a")
+    cache.put("c", "C", 1, 1)
+
+    assert cache.get("b") is None
+    assert cache.get("a")["content"] == "A"
+    assert cache.get("c")["content"] == "C"
+
+
+def test_database_backs_memory_cache(database):
+    CompletionCache(database).put("key", "持久化内容", 5, 2)
+
+    # 新实例的内存缓存为空，从数据库读取后回填内存
+    cache = CompletionCache(database)
+    assert cache.get("key")["content"] == "持久化内容"
+    assert cache.get("key")["content"] == "持久化内容"
+    assert cache.stats()["db_hits"] == 1
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_expired_entries_are_not_returned(database):
+    cache = CompletionCache(database, ttl=0)
+    cache.put("key", "内容", 1, 1)
+
+    assert cache.get("key") is None
@@ -0,0 +1,39 @@
+"""
+上下文打包token预算测试
+"""
+
+from context_packer import ContextPacker
+from report_sections import INSIGHT_SECTIONS
+
+
+class _CharClient:
+    """按字符计数token的LLM客户端"""
+
+    def input_token_limit(self, max_new_tokens=None):
+        return 100
+
+    def count_tokens(self, text):
+        return len(text)
+
+    def count_prompt_tokens(self, messages):
+        return sum(len(message["content"]) for message in messages)
+
+
+def test_budget_reserves_forced_section_header():
+    packer = ContextPacker(_CharClient())
+    messages = [{"role": "user", "content": "x" * 30}]
+
+    assert packer.budget(messages) == 70
+    # 约束解码时第一个小节标题追加在prompt末尾，占用预算
+    assert packer.budget(messages, sections=INSIGHT_SECTIONS) == 70 - len(f"{INSIGHT_SECTIONS[0]}：")
+
+
+def test_packed_content_fits_budget():
+    packer = ContextPacker(_CharClient())
+    items = [{"content": f"第{i}条内容" * 3, "likes": i, "comments": 0} for i in range(20)]
+
+    budget = packer.budget([{"role": "user", "content": ""}], sections=INSIGHT_SECTIONS)
+    packed = packer.pack(items, budget)
+
+    assert packed
+    assert len(packed) <= budget
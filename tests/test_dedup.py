@@ -0,0 +1,53 @@
+"""
+MinHash近似重复合并测试
+"""
+
+from dedup import deduplicate, minhash, pack_signature, signature_bands, similarity, unpack_signature
+
+BASE = "今天市中心的地铁线路因为设备故障临时停运，大量乘客滞留站内，运营方表示正在抢修"
+
+
+def test_similarity_of_near_duplicates_is_high():
+    assert similarity(minhash(BASE), minhash(BASE)) == 1.0
+    assert similarity(minhash(BASE), minhash(BASE + "！！")) > 0.8
+    assert similarity(minhash(BASE), minhash("网友分享了自己做的家常菜，评论区纷纷求菜谱")) < 0.2
+
+
+def test_signature_round_trip_and_bands():
+    signature = minhash(BASE)
+
+    assert unpack_signature(pack_signature(signature)) == signature
+    assert signature_bands(signature) == signature_bands(list(signature))
+
+
+def test_deduplicate_keeps_most_engaged_copy_in_first_position():
+    items = [
+        {"content": BASE, "likes": 1, "comments": 0},
+        {"content": "网友分享了自己做的家常菜，评论区纷纷求菜谱", "likes": 5, "comments": 0},
+        {"content": BASE + "（转）", "likes": 50, "comments": 3},
+    ]
+
+    result = deduplicate(items, 0.7)
+
+    assert [item["content"] for item in result] == [BASE + "（转）", items[1]["content"]]
+    assert result[0]["minhash"] == minhash(BASE + "（转）")
+
+
+def test_deduplicate_keeps_distinct_items():
+    items = [{"content": f"第{i}条完全不同的内容：{'甲乙丙丁戊己庚辛'[i]}" * 3, "likes": 0} for i in range(8)]
+
+    assert len(deduplicate(items, 0.7)) == 8
+
+
+def test_group_signature_does_not_drift_after_replacement():
+    # 第二条替换第一条成为代表后，组仍按第一条的签名匹配
+    items = [
+        {"content": BASE, "likes": 0},
+        {"content": BASE + "，现场图片", "likes": 10},
+        {"content": BASE, "likes": 0},
+    ]
+
+    result = deduplicate(items, 0.8)
+
+    assert len(result) == 1
+    assert result[0]["likes"] == 10
@@ -0,0 +1,51 @@
+"""
+合并生成输出拆分与流式分段测试
+"""
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from fused_pipeline import INSIGHT_MARKER, REPORT_MARKER, route_fused_output, split_fused_output
+from report_sections import REPORT_SECTIONS
+
+REPORT = "\n".join(f"{section}：{section}内容" for section in REPORT_SECTIONS)
+OUTPUT = f"好的，下面是分析结果：\n{INSIGHT_MARKER}\n主要观点：A很好\n公众情绪：正面\n{REPORT_MARKER}\n{REPORT}"
+
+
+def _stream(text: str, chunk_size: int = 3):
+    """按固定长度分片模拟流式输出，返回各部分实际推送的文本"""
+    emitted = {'insight': "", 'report': ""}
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    seen = ""
+    for chunk, final in [(chunk, False) for chunk in chunks] + [("", True)]:
+        seen += chunk
+        for part, content in zip(('insight', 'report'), route_fused_output(seen, final)):
+            # 已推送的文本必须是当前结果的前缀，否则推送内容与最终结果不一致
+            assert content.startswith(emitted[part])
+            emitted[part] = content
+    return emitted
+
+
+def test_split_fused_output():
+    result = split_fused_output(OUTPUT)
+
+    assert result['insight_result'] == "主要观点：A很好\n公众情绪：正面"
+    assert list(result['report_sections']) == list(REPORT_SECTIONS)
+
+
+def test_split_fails_without_report_marker():
+    assert split_fused_output(f"{INSIGHT_MARKER}\n主要观点：A\n公众情绪：B") is None
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7])
+def test_stream_skips_preamble_before_insight_marker(chunk_size):
+    emitted = _stream(OUTPUT, chunk_size)
+
+    assert emitted['insight'] == "主要观点：A很好\n公众情绪：正面\n"
+    assert emitted['report'] == REPORT
+
+
+def test_stream_without_markers_is_flushed_as_insight():
+    assert _stream("主要观点：A很好") == {'insight': "主要观点：A很好", 'report': ""}
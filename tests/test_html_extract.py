@@ -0,0 +1,57 @@
+"""
+搜索结果页面快速提取测试：与BeautifulSoup实现的结果保持一致
+"""
+
+import pytest
+
+from config import Settings
+from html_extract import ResultSelector, extract_results
+from pipeline_benchmark import build_stub_pages
+from simple_crawler import BAIDU_SELECTOR, DOUYIN_SELECTOR, SimpleCrawler
+
+
+@pytest.fixture
+def crawler():
+    config = Settings()
+    config.CRAWLER_CACHE_ENABLED = False
+    return SimpleCrawler(config)
+
+
+@pytest.fixture
+def pages():
+    return {name: page.replace("{topic}", "主题") for name, page in build_stub_pages(items=12).items()}
+
+
+@pytest.mark.parametrize("source", ["douyin", "baidu"])
+@pytest.mark.parametrize("max_items", [1, 5, 30])
+def test_fast_parser_matches_soup(crawler, pages, source, max_items):
+    fast = getattr(crawler, f"_parse_{source}")(pages[source], max_items)
+    soup = getattr(crawler, f"_parse_{source}_soup")(pages[source], max_items)
+
+    assert [item["content"] for item in fast] == [item["content"] for item in soup]
+    assert len(fast) == min(max_items, 12)
+
+
+def test_extract_stops_at_max_items(pages):
+    assert len(extract_results(pages["douyin"], DOUYIN_SELECTOR, 3)) == 3
+    assert extract_results(pages["douyin"], DOUYIN_SELECTOR, 0) == []
+
+
+def test_container_without_title_yields_none():
+    html = '<div class="result"><p>没有标题</p></div><div class="result"><h3>标题</h3><div class="c-row">正文</div></div>'
+
+    assert extract_results(html, BAIDU_SELECTOR, 10) == [None, ("标题", "正文")]
+
+
+def test_script_text_is_ignored():
+    selector = ResultSelector(container=("div", {"class": "item"}), title=[("h3", None)], content=[])
+    html = '<div class="item"><h3>标题<script>var x = 1;</script></h3></div>'
+
+    assert extract_results(html, selector, 10)[0][0] == "标题"
+
+
+def test_unclosed_container_at_end_of_page(crawler):
+    html = '<div class="result"><h3>无结束标签的结果'
+
+    assert extract_results(html, BAIDU_SELECTOR, 10) == [("无结束标签的结果", "无结束标签的结果")]
+    assert len(crawler._parse_baidu(html, 10)) == len(crawler._parse_baidu_soup(html, 10)) == 1
@@ -0,0 +1,100 @@
+"""
+小节输出解析与小节约束解码测试
+"""
+
+import pytest
+
+from report_sections import INSIGHT_SECTIONS, REPORT_SECTIONS, format_sections, parse_sections
+
+
+def test_parse_sections_in_order():
+    text = "主要观点：多数支持\n公众情绪：偏正面"
+
+    assert parse_sections(text, INSIGHT_SECTIONS) == {"主要观点": "多数支持", "公众情绪": "偏正面"}
+
+
+def test_parse_sections_accepts_numbering_and_ascii_colon():
+    text = "1. 主要观点: 多数支持\n2、公众情绪：偏正面\n"
+
+    assert parse_sections(text, INSIGHT_SECTIONS) == {"主要观点": "多数支持", "公众情绪": "偏正面"}
+
+
+def test_parse_sections_rejects_missing_or_empty_sections():
+    assert parse_sections("主要观点：多数支持", INSIGHT_SECTIONS) is None
+    assert parse_sections("主要观点：\n公众情绪：偏正面", INSIGHT_SECTIONS) is None
+    # 顺序颠倒时后一个标题找不到
+    assert parse_sections("公众情绪：偏正面\n主要观点：多数支持", INSIGHT_SECTIONS) is None
+
+
+def test_header_inside_a_line_is_not_a_section():
+    text = "主要观点：大家讨论公众情绪：话题\n公众情绪：偏正面"
+
+    assert parse_sections(text, INSIGHT_SECTIONS)["主要观点"] == "大家讨论公众情绪：话题"
+
+
+def test_format_round_trip():
+    parsed = {section: f"{section}内容" for section in REPORT_SECTIONS}
+
+    assert parse_sections(format_sections(parsed), REPORT_SECTIONS) == parsed
+
+
+class _CharTokenizer:
+    """逐字符分词，便于断言约束输出"""
+
+    def __init__(self, alphabet: str):
+        self.vocab = list(alphabet) + ["<eos>"]
+        self.eos_token_id = len(self.vocab) - 1
+
+    def __call__(self, text, add_special_tokens=False):
+        class Encoded:
+            input_ids = [self.vocab.index(ch) for ch in text]
+        return Encoded()
+
+    def decode(self, ids):
+        return "".join(self.vocab[i] for i in ids if i != self.eos_token_id)
+
+
+def _constrained_generate(model_text: str, sections, max_new_tokens: int = 40) -> str:
+    """模拟贪心解码：模型想输出model_text后结束，返回加上prompt末尾标题后的完整回复"""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from structured_decoding import SectionConstraint, SectionStoppingCriteria
+
+    tokenizer = _CharTokenizer("甲乙丙丁：\n" + "".join(sections))
+    prompt = [0, 1]
+    constraint = SectionConstraint(tokenizer, sections, len(prompt), max_new_tokens, tokenizer.eos_token_id)
+    stopping = SectionStoppingCriteria(constraint)
+
+    wanted = [tokenizer.vocab.index(ch) for ch in model_text]
+    sequence = list(prompt)
+    position = 0
+    for _ in range(max_new_tokens):
+        scores = torch.zeros(1, len(tokenizer.vocab))
+        scores[0, wanted[position] if position < len(wanted) else tokenizer.eos_token_id] = 1.0
+        token_id = int(constraint(torch.tensor([sequence]), scores).argmax())
+        if position < len(wanted) and token_id == wanted[position]:
+            position += 1
+        sequence.append(token_id)
+        if token_id == tokenizer.eos_token_id or stopping(torch.tensor([sequence]), scores):
+            break
+    return f"{sections[0]}：" + tokenizer.decode(sequence[len(prompt):])
+
+
+def test_constraint_stops_after_last_section():
+    text = _constrained_generate("甲乙\n丙丁\n甲甲甲", INSIGHT_SECTIONS)
+
+    assert parse_sections(text, INSIGHT_SECTIONS) == {"主要观点": "甲乙", "公众情绪": "丙丁"}
+
+
+def test_constraint_blocks_eos_until_all_sections_have_content():
+    text = _constrained_generate("甲乙", INSIGHT_SECTIONS)
+
+    assert parse_sections(text, INSIGHT_SECTIONS) is not None
+
+
+def test_section_budget_forces_next_header():
+    text = _constrained_generate("甲乙丙丁" * 10, INSIGHT_SECTIONS, max_new_tokens=20)
+
+    parsed = parse_sections(text, INSIGHT_SECTIONS)
+    assert parsed is not None
+    assert len(parsed["主要观点"]) < 20
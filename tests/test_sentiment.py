@@ -0,0 +1,45 @@
+"""
+词典情感分和相关度测试
+"""
+
+from sentiment import relevance_score, score_items, sentiment_label, sentiment_score, summarize_sentiment
+
+
+def test_sentiment_polarity():
+    assert sentiment_score("服务很好，值得推荐") > 0
+    assert sentiment_score("非常失望，大量投诉") < 0
+    assert sentiment_score("今天下午三点开会") == 0.0
+
+
+def test_negation_flips_polarity():
+    assert sentiment_score("不满意") < 0 < sentiment_score("满意")
+
+
+def test_intensifier_is_not_read_as_negation():
+    assert sentiment_score("非常满意") > 0
+
+
+def test_labels():
+    assert sentiment_label(0.5) == "positive"
+    assert sentiment_label(0.0) == "neutral"
+    assert sentiment_label(-0.5) == "negative"
+
+
+def test_relevance_ignores_generic_topic_words():
+    assert relevance_score("地铁停运，乘客滞留", "地铁停运舆情") == 1.0
+    assert relevance_score("网友分享家常菜", "地铁停运") == 0.0
+
+
+def test_summarize_sentiment_weights_by_engagement():
+    items = score_items("服务", [
+        {"content": "服务很好，值得推荐", "likes": 1000, "comments": 0},
+        {"content": "服务让人失望", "likes": 0, "comments": 0},
+        {"content": "服务时间调整", "likes": 0, "comments": 0},
+    ])
+
+    summary = summarize_sentiment(items)
+
+    assert summary["count"] == 3
+    assert summary["counts"] == {"positive": 1, "neutral": 1, "negative": 1}
+    assert summary["mean"] == 0.0
+    assert summary["weighted_mean"] > 0
@@ -0,0 +1,94 @@
+"""
+爬虫并发爬取、全局时限和连接复用测试
+"""
+
+import time
+
+from pipeline_benchmark import StubCrawlServer
+from simple_crawler import SimpleCrawler, get_session
+
+TOPIC = "测试主题"
+
+
+def test_crawl_topic_merges_sources_in_priority_order(crawler_config):
+    items = SimpleCrawler(crawler_config).crawl_topic(TOPIC, 20)
+
+    assert len(items) == 10
+    # 抖音优先于百度
+    assert all("视频" in item["content"] for item in items[:5])
+    assert all("新闻" in item["content"] for item in items[5:])
+    assert all(item["relevance"] == 1.0 for item in items)
+
+
+def test_crawl_topic_truncates_to_max_items(crawler_config):
+    items = SimpleCrawler(crawler_config).crawl_topic(TOPIC, 3)
+
+    assert [item["content"].split("：")[0] for item in items] == [
+        f"{TOPIC} 视频{i}" for i in range(3)
+    ]
+
+
+def test_crawl_topic_returns_partial_results_after_deadline(crawler_config, stub_pages):
+    slow_server = StubCrawlServer(stub_pages, latency=2.0)
+    try:
+        crawler_config.CRAWLER_BAIDU_URL = slow_server.url("baidu")
+        crawler_config.CRAWLER_DEADLINE = 0.5
+
+        start_time = time.perf_counter()
+        items = SimpleCrawler(crawler_config).crawl_topic(TOPIC, 20)
+        elapsed = time.perf_counter() - start_time
+    finally:
+        slow_server.close()
+
+    assert elapsed < 1.5
+    assert len(items) == 5
+    assert all("视频" in item["content"] for item in items)
+
+
+def test_crawl_topic_keeps_results_of_healthy_sources(crawler_config, stub_server):
+    # 不存在的页面返回404，该数据源记为失败
+    crawler_config.CRAWLER_BAIDU_URL = stub_server.url("missing")
+
+    items = SimpleCrawler(crawler_config).crawl_topic(TOPIC, 20)
+
+    assert len(items) == 5
+    assert all("视频" in item["content"] for item in items)
+
+
+def test_sessions_are_shared_per_source():
+    assert get_session("douyin") is get_session("douyin")
+    assert get_session("douyin") is not get_session("baidu")
+
+
+def test_repeated_crawls_reuse_connections(crawler_config, stub_server):
+    crawler = SimpleCrawler(crawler_config)
+    for _ in range(3):
+        assert crawler.crawl_topic(TOPIC, 20)
+
+    assert stub_server.requests == 6
+    # 每个数据源一条keep-alive连接
+    assert len(stub_server.connections) == 2
+
+
+def test_crawl_cache_serves_repeated_topics(crawler_config, stub_server, database):
+    crawler_config.CRAWLER_CACHE_ENABLED = True
+    crawler = SimpleCrawler(crawler_config, database)
+
+    first = crawler.crawl_topic(TOPIC, 20)
+    second = crawler.crawl_topic(TOPIC, 20)
+
+    assert stub_server.requests == 2
+    assert [item["content"] for item in second] == [item["content"] for item in first]
+
+
+def test_empty_results_are_not_cached(crawler_config, stub_server, database):
+    crawler_config.CRAWLER_CACHE_ENABLED = True
+    # 页面中没有匹配的结果容器，解析结果为空
+    crawler_config.CRAWLER_BAIDU_URL = stub_server.url("douyin")
+    crawler = SimpleCrawler(crawler_config, database)
+
+    crawler.crawl_topic(TOPIC, 20)
+    crawler.crawl_topic(TOPIC, 20)
+
+    assert stub_server.requests == 3
+    assert database.get_crawl_cache("baidu", TOPIC, 20) == {}
@@ -0,0 +1,68 @@
+"""
+主题监控增量分析测试
+"""
+
+import itertools
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from pipeline_benchmark import FakeLLMClient
+from report_sections import REPORT_SECTIONS
+from topic_monitor import TopicMonitor
+
+TOPIC = "测试主题"
+
+
+class _FailingClient(FakeLLMClient):
+    """指定序号的调用返回生成错误的模拟客户端"""
+
+    def __init__(self, config, failing_calls):
+        super().__init__(config, 0, 0)
+        self.failing_calls = set(failing_calls)
+        self._calls = itertools.count()
+
+    def chat_completion(self, messages, **kwargs):
+        if next(self._calls) in self.failing_calls:
+            return {
+                "choices": [{"message": {"role": "assistant", "content": "模型不可用"}, "finish_reason": "error"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            }
+        return super().chat_completion(messages, **kwargs)
+
+
+# 每轮依次调用分析和报告：第0次调用失败为分析出错，第1次调用失败为报告出错
+@pytest.mark.parametrize("failing_call", [0, 1])
+def test_failed_cycle_is_not_saved_and_items_stay_unseen(crawler_config, stub_server, database, failing_call):
+    # 关闭分段摘要，每轮只有分析和报告两次调用
+    crawler_config.ANALYZER_MAP_REDUCE_ENABLED = False
+    database.save_monitor(TOPIC, 3600)
+    monitor = TopicMonitor(crawler_config, database, lambda: client)
+    client = _FailingClient(crawler_config, [failing_call])
+
+    failed = monitor.run_cycle(TOPIC)
+
+    assert "模型不可用" in failed['error']
+    assert database.get_analysis_history(10, topic=TOPIC) == []
+
+    # 下一轮重新分析同一批内容，且不以错误文本作为上一次结论
+    retried = monitor.run_cycle(TOPIC)
+
+    assert retried['error'] is None
+    assert retried['new_items'] == failed['new_items'] > 0
+    assert retried['incremental'] is False
+    assert len(database.get_analysis_history(10, topic=TOPIC)) == 1
+
+
+def test_structured_cycle_stores_report_sections(crawler_config, stub_server, database):
+    crawler_config.LLM_STRUCTURED_OUTPUT = True
+    database.save_monitor(TOPIC, 3600)
+    monitor = TopicMonitor(crawler_config, database, lambda: FakeLLMClient(crawler_config, 0, 0))
+
+    result = monitor.run_cycle(TOPIC)
+
+    assert list(result['report_sections']) == list(REPORT_SECTIONS)
+    record_id = database.get_analysis_history(1, topic=TOPIC)[0]['id']
+    assert database.get_analysis_record(record_id)['report_sections'] == result['report_sections']
@@ -0,0 +1,188 @@
+"""
+主题监控模块
+按周期增量爬取监控列表中的主题，只对新出现的内容做增量分析，每轮的LLM开销与新增内容量相关
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+from config import Settings
+from db import SimpleDatabase
+from simple_crawler import SimpleCrawler
+from analyzer import ANALYSIS_ERROR_PREFIX, Analyzer
+from reporter import REPORT_ERROR_PREFIX, Reporter
+
+
+class TopicMonitor:
+    """主题监控调度器"""
+
+    def __init__(self, config: Settings, database: SimpleDatabase,
+                 client_provider: Callable[[], Any]):
+        """
+        初始化主题监控
+
+        Args:
+            config: 配置对象
+            database: 数据库实例，保存监控列表和已见内容
+            client_provider: 返回就绪LLM客户端的函数
+        """
+        self.config = config
+        self.database = database
+        self.client_provider = client_provider
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def run_cycle(self, topic: str) -> Dict[str, Any]:
+        """
+        执行一轮监控：爬取、过滤已见内容、基于上一次结论增量分析
+
+        Args:
+            topic: 监控主题
+
+        Returns:
+            本轮结果，没有新内容时insight_result和report为None；
+            分析或报告生成出错时error为错误信息，本轮结果不保存，新内容在下一轮重新分析
+        """
+        start_time = time.time()
+        crawler = SimpleCrawler(self.config, self.database)
+        crawled_data = crawler.crawl_topic(topic, self.config.CRAWLER_MAX_ITEMS, revalidate=True)
+        # 除完全相同的内容外，也过滤此前已见内容的转载和轻微改写
+        threshold = self.config.DEDUP_SIMILARITY if self.config.DEDUP_ENABLED else None
+        new_items = self.database.filter_unseen_items(topic, crawled_data, threshold)
+        logger.info(f"监控主题 '{topic}' 爬取到 {len(crawled_data)} 条，其中新内容 {len(new_items)} 条")
+
+        result = {
+            'topic': topic,
+            'crawled_items': len(crawled_data),
+            'new_items': len(new_items),
+            'incremental': False,
+            'insight_result': None,
+            'report': None,
+            'report_sections': None,
+            'error': None
+        }
+        if not new_items:
+            self.database.schedule_monitor(topic, new_items=0)
+            result['elapsed'] = round(time.time() - start_time, 3)
+            return result
+
+        llm_client = self.client_provider()
+        analyzer = Analyzer(llm_client)
+        reporter = Reporter(llm_client)
+        delta_content = crawler.format_crawled_data(new_items)
+
+        # 有历史结论时只把新增内容交给模型，否则做一次全量分析作为基线
+        previous = self.database.get_analysis_history(1, topic=topic)
+        previous_insight = None
+        if previous:
+            previous_insight = self.database.get_analysis_record(
+                previous[0]['id'], ("insight_result",)
+            ).get('insight_result')
+
+        if previous_insight:
+            insight_result = analyzer.update(topic, previous_insight, delta_content, new_items)
+            result['incremental'] = True
+        else:
+            insight_result = analyzer.analyze(topic, delta_content, new_items)
+
+        # 分析器和报告生成器在LLM出错时返回错误文本而不抛出异常；出错的结果不保存，
+        # 否则新内容会被记为已见而不再分析，错误文本也会作为下一轮的上一次结论
+        error = None
+        if insight_result.startswith(ANALYSIS_ERROR_PREFIX):
+            error = insight_result
+        else:
+            report, report_sections = reporter.generate_sections(topic, delta_content, insight_result, new_items)
+            if report.startswith(REPORT_ERROR_PREFIX):
+                error = report
+        if error:
+            logger.error(f"监控主题 '{topic}' 本轮分析失败: {error}")
+            self.database.schedule_monitor(topic)
+            result.update({'error': error, 'elapsed': round(time.time() - start_time, 3)})
+            return result
+
+        self.database.save_analysis_result(topic, new_items, delta_content, insight_result, report, report_sections)
+        self.database.schedule_monitor(topic, new_items=len(new_items))
+
+        result.update({
+            'crawled_content': delta_content,
+            'insight_result': insight_result,
+            'report': report,
+            'report_sections': report_sections,
+            'elapsed': round(time.time() - start_time, 3)
+        })
+        logger.info(f"监控主题 '{topic}' 本轮完成，耗时 {result['elapsed']}s")
+        return result
+
+    def run_pending(self) -> List[Dict[str, Any]]:
+        """
+        执行所有已到期的监控主题
+
+        Returns:
+            各主题本轮结果
+        """
+        results = []
+        for monitor in self.database.list_monitors(due_only=True):
+            topic = monitor['topic']
+            try:
+                results.append(self.run_cycle(topic))
+            except Exception as e:
+                logger.exception(f"监控主题 '{topic}' 执行失败: {e}")
+                # 失败后按正常周期重试，避免反复占用模型
+                self.database.schedule_monitor(topic)
+        return results
+
+    def trigger(self, topic: str) -> bool:
+        """
+        让监控主题在下一次调度时立即执行
+
+        Args:
+            topic: 监控主题
+
+        Returns:
+            主题是否存在
+        """
+        if not self.database.schedule_monitor(topic, delay=0):
+            return False
+        self._wakeup.set()
+        return True
+
+    def start(self):
+        """启动后台调度线程，重复调用不会重复启动"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="topic-monitor", daemon=True)
+            self._thread.start()
+        logger.info("主题监控调度已启动")
+
+    def _loop(self):
+        """后台调度主循环"""
+        while True:
+            self.run_pending()
+            self._wakeup.wait(self.config.MONITOR_POLL_INTERVAL)
+            self._wakeup.clear()
+
+
+# 全局主题监控实例
+_topic_monitor_instance: Optional[TopicMonitor] = None
+
+def get_topic_monitor(config: Settings, database: SimpleDatabase,
+                      client_provider: Callable[[], Any]) -> TopicMonitor:
+    """
+    获取主题监控实例（单例模式）
+
+    Args:
+        config: 配置对象
+        database: 数据库实例
+        client_provider: 返回就绪LLM客户端的函数
+
+    Returns:
+        TopicMonitor实例
+    """
+    global _topic_monitor_instance
+    if _topic_monitor_instance is None:
+        _topic_monitor_instance = TopicMonitor(config, database, client_provider)
+    return _topic_monitor_instance
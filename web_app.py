@@ -5,15 +5,22 @@
 
 import os
 import json
-from flask import Flask, render_template, request, jsonify
+import threading
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from loguru import logger
 
 from config import Settings
 from simple_crawler import SimpleCrawler
-from local_llm import get_local_llm_client
-from analyzer import Analyzer
-from reporter import Reporter
+from model_manager import get_model_manager
+from analyzer import ANALYSIS_ERROR_PREFIX, Analyzer
+from reporter import REPORT_ERROR_PREFIX, Reporter
+from fused_pipeline import FusedGenerator, analyze_and_report
+from report_sections import INSIGHT_SECTIONS, REPORT_SECTIONS, parse_sections
 from db import get_database
+from job_queue import QueueFullError, get_job_queue
+from topic_monitor import get_topic_monitor
+from sentiment import summarize_sentiment
+from metrics import get_metrics, span, start_trace
 
 # 创建Flask应用
 app = Flask(__name__, 
@@ -23,16 +30,43 @@ app = Flask(__name__,
 # 全局变量存储引擎实例
 config = None
 database = None
+job_queue = None
+model_manager = None
+topic_monitor = None
+metrics_registry = None
 
 def initialize_app():
     """初始化应用"""
-    global config, database
+    global config, database, job_queue, model_manager, topic_monitor, metrics_registry
     
     if config is None:
         config = Settings()
     
+    if model_manager is None:
+        model_manager = get_model_manager(config)
+        # 启动时在后台预加载并预热模型，避免第一个请求等待模型加载
+        if config.LLM_EAGER_LOAD:
+            model_manager.start()
+    
     if database is None:
         database = get_database()
+    
+    if job_queue is None:
+        job_queue = get_job_queue(
+            run_traced_analysis_pipeline,
+            database,
+            workers=config.JOB_WORKERS,
+            max_size=config.JOB_QUEUE_MAX_SIZE
+        )
+    
+    if topic_monitor is None:
+        topic_monitor = get_topic_monitor(config, database, model_manager.get_client)
+        topic_monitor.start()
+    
+    if metrics_registry is None:
+        metrics_registry = get_metrics()
+        # 导出时采集任务队列、模型状态等运行时指标
+        metrics_registry.register_collector(collect_runtime_metrics)
         
     logger.info("应用初始化完成")
 
@@ -43,9 +77,115 @@ def index():
     history = database.get_analysis_history()
     return render_template('index.html', history=history)
 
+def run_analysis_pipeline(job_id: str, topic: str) -> dict:
+    """
+    执行完整的分析流程（爬虫 → 洞察分析 → 报告生成），由任务队列的工作线程调用
+    
+    Args:
+        job_id: 任务ID
+        topic: 分析主题
+        
+    Returns:
+        分析结果字典
+    """
+    crawler = SimpleCrawler(config)
+    llm_client = model_manager.get_client()
+    
+    # 第一步：网络爬虫
+    logger.info("启动网络爬虫...")
+    crawled_data = crawler.crawl_topic(topic, config.CRAWLER_MAX_ITEMS)
+    crawled_content = crawler.format_crawled_data(crawled_data)
+    logger.info(f"网络爬虫获取到 {len(crawled_data)} 条相关数据")
+    
+    database.update_job_status(job_id, "crawled")
+    
+    # 第二、三步：洞察分析和生成报告（开启合并生成时一次完成）
+    logger.info("执行洞察分析并生成综合报告...")
+    insight_result, report_result, report_sections = analyze_and_report(
+        llm_client, topic, crawled_content, crawled_data,
+        on_analyzed=lambda: database.update_job_status(job_id, "analyzed")
+    )
+    # 分析器和报告生成器在LLM出错时返回错误文本而不抛出异常，抛出异常使任务记为失败且不保存结果
+    for result, prefix in ((insight_result, ANALYSIS_ERROR_PREFIX), (report_result, REPORT_ERROR_PREFIX)):
+        if result.startswith(prefix):
+            raise RuntimeError(result)
+    logger.info("洞察分析和报告生成成功完成")
+    
+    # 在同一个事务中保存爬虫数据和分析记录
+    try:
+        database.save_analysis_result(
+            topic, 
+            crawled_data, 
+            crawled_content, 
+            insight_result, 
+            report_result,
+            report_sections
+        )
+    except Exception as e:
+        logger.exception(f"保存分析结果到数据库时发生错误: {str(e)}")
+    
+    return {
+        'topic': topic,
+        'crawled_content': crawled_content,
+        'sentiment': summarize_sentiment(crawled_data) if config.SENTIMENT_ENABLED else None,
+        'insight_result': insight_result,
+        'report': report_result,
+        'report_sections': report_sections
+    }
+
+def run_traced_analysis_pipeline(job_id: str, topic: str) -> dict:
+    """
+    执行分析流程并记录各阶段耗时明细，明细随结果保存，查询结果时可选返回
+    
+    Args:
+        job_id: 任务ID
+        topic: 分析主题
+        
+    Returns:
+        附带timings字段的分析结果字典
+    """
+    with start_trace() as trace, span("pipeline"):
+        result = run_analysis_pipeline(job_id, topic)
+    result['timings'] = trace.breakdown()
+    return result
+
+# 组件统计中表示当前状态而非累计值的字段
+RUNTIME_GAUGES = {"memory_entries", "entries", "pending"}
+
+def collect_runtime_metrics() -> list:
+    """
+    导出指标时采集任务队列、模型状态以及缓存和批量调度的统计
+    
+    Returns:
+        (指标名, 类型, 说明, 标签, 值) 样本列表
+    """
+    samples = [
+        ("bettafish_job_queue_depth", "gauge", "排队中的分析任务数", {}, job_queue.depth()),
+        ("bettafish_stream_active", "gauge", "进行中的流式分析数", {}, job_queue.reserved()),
+        ("bettafish_model_ready", "gauge", "模型是否已就绪", {}, 1 if model_manager.state == "ready" else 0)
+    ]
+    client = model_manager.client
+    if hasattr(client, "runtime_stats"):
+        for component, stats in client.runtime_stats().items():
+            for name, value in stats.items():
+                # 命中/未命中、批次数等累计值按counter导出，条目数和等待数为gauge
+                if name in RUNTIME_GAUGES:
+                    samples.append((f"bettafish_{component}_{name}", "gauge", f"{component} {name}", {}, value))
+                else:
+                    samples.append((
+                        f"bettafish_{component}_{name}_total", "counter", f"{component} {name}", {}, value
+                    ))
+    if hasattr(client, "stats"):
+        for worker in client.stats():
+            samples.append((
+                "bettafish_llm_worker_in_flight", "gauge", "各LLM工作进程进行中的请求数",
+                {"pid": worker["pid"]}, worker["in_flight"]
+            ))
+    return samples
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
-    """分析请求处理"""
+    """分析请求处理：将分析任务加入队列并立即返回任务ID"""
     logger.info("收到新的分析请求")
     
     try:
@@ -67,85 +207,398 @@ def analyze():
                 'message': '未提供分析主题'
             }), 400
         
-        logger.info(f"开始分析主题: {topic}")
-        
-        # 初始化组件
         initialize_app()
-        crawler = SimpleCrawler()
-        llm_client = get_local_llm_client(config)
-        analyzer = Analyzer(llm_client)
-        reporter = Reporter(llm_client)
+        try:
+            job_id = job_queue.submit(topic)
+        except QueueFullError as e:
+            logger.warning(f"分析任务被拒绝: {e}")
+            return jsonify({
+                'status': 'error',
+                'message': '当前分析任务过多，请稍后重试'
+            }), 429
         
-        # 第一步：网络爬虫
-        logger.info("启动网络爬虫...")
-        crawled_data = crawler.crawl_topic(topic)
-        crawled_content = crawler.format_crawled_data(crawled_data)
-        logger.info(f"网络爬虫获取到 {len(crawled_data)} 条相关数据")
+        return jsonify({
+            'status': 'queued',
+            'job_id': job_id,
+            'topic': topic
+        }), 202
         
-        # 保存爬虫数据到数据库
-        try:
-            database.save_crawled_data(topic, crawled_data)
-            logger.info("爬虫数据已保存到数据库")
-        except Exception as e:
-            logger.exception(f"保存爬虫数据到数据库时发生错误: {str(e)}")
+    except Exception as e:
+        logger.exception(f"分析请求处理过程中发生未预期的错误: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'分析请求处理失败: {str(e)}'
+        }), 500
+
+def _sse_event(event: str, data: dict) -> str:
+    """
+    构造一条SSE事件
+    
+    Args:
+        event: 事件名称
+        data: 事件数据
         
-        # 第二步：洞察分析
-        logger.info("执行洞察分析...")
-        try:
-            insight_result = analyzer.analyze(topic, crawled_content)
-            logger.info("洞察分析成功完成")
-        except Exception as e:
-            logger.exception(f"洞察分析过程中发生错误: {str(e)}")
-            return jsonify({'status': 'error', 'message': f'洞察分析失败: {str(e)}'}), 500
+    Returns:
+        SSE格式的文本
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-        # 第三步：生成报告
-        logger.info("生成综合报告...")
-        try:
-            report_result = reporter.generate(topic, crawled_content, insight_result)
-            logger.info("报告生成成功")
-        except Exception as e:
-            logger.exception(f"报告生成过程中发生错误: {str(e)}")
-            return jsonify({'status': 'error', 'message': f'报告生成失败: {str(e)}'}), 500
+def _stream_error(message: str) -> str:
+    """
+    构造流式分析失败的error事件
+    
+    Args:
+        message: 分析或报告生成输出的错误信息
         
-        # 保存分析记录到数据库
+    Returns:
+        SSE事件文本
+    """
+    logger.error(f"流式分析失败: {message}")
+    return _sse_event('error', {
+        'status': 'error',
+        'message': f'分析请求处理失败: {message}'
+    })
+
+@app.route('/analyze/stream')
+def analyze_stream():
+    """
+    流式分析请求处理（Server-Sent Events）
+    
+    依次推送 crawl（爬虫结果）、insight（分析片段）、report（报告片段）、done（完整结果）事件，
+    合并生成的输出无法拆分时推送 reset 事件并重新推送分别生成的分析和报告，出错时推送 error 事件
+    """
+    topic = request.args.get('topic', '').strip()
+    if not topic:
+        logger.warning("未提供分析主题")
+        return jsonify({
+            'status': 'error',
+            'message': '未提供分析主题'
+        }), 400
+    
+    initialize_app()
+    # 流式分析在请求线程中执行，与排队任务共用名额上限
+    try:
+        release = job_queue.reserve()
+    except QueueFullError as e:
+        logger.warning(f"流式分析请求被拒绝: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': '当前分析任务过多，请稍后重试'
+        }), 429
+    logger.info(f"收到新的流式分析请求: {topic}")
+    # 客户端断开时通知生成线程停止，释放生成锁
+    stop_event = threading.Event()
+    
+    def generate():
         try:
-            database.save_analysis_record(
-                topic, 
-                crawled_content, 
-                insight_result, 
-                report_result
-            )
-            logger.info("分析记录已保存到数据库")
+            # 与排队任务一样记录各阶段耗时，流式分析的整体耗时计入pipeline阶段
+            with start_trace(), span("pipeline"):
+                crawler = SimpleCrawler(config)
+                llm_client = model_manager.get_client()
+                analyzer = Analyzer(llm_client)
+                reporter = Reporter(llm_client)
+                
+                # 第一步：网络爬虫
+                crawled_data = crawler.crawl_topic(topic, config.CRAWLER_MAX_ITEMS)
+                crawled_content = crawler.format_crawled_data(crawled_data)
+                # 词典预分类的情感分布在LLM生成之前即可返回
+                sentiment = summarize_sentiment(crawled_data) if config.SENTIMENT_ENABLED else None
+                yield _sse_event('crawl', {'crawled_content': crawled_content, 'sentiment': sentiment})
+                
+                # 第二步：洞察分析（开启合并生成时与报告在一次生成中输出）
+                parts = {'insight': [], 'report': []}
+                report_sections = None
+                fused_ok = False
+                if config.PIPELINE_FUSED_ENABLED:
+                    with span("fused"):
+                        fused = FusedGenerator(llm_client).generate_stream(
+                            topic, crawled_content, crawled_data, stop_event
+                        )
+                        for part, text in fused:
+                            parts[part].append(text)
+                            yield _sse_event(part, {'text': text})
+                    # 与analyze_and_report一致：输出无法拆分为分析和报告小节时，退回分析、报告分别生成
+                    report_sections = parse_sections(''.join(parts['report']), REPORT_SECTIONS)
+                    fused_ok = (report_sections is not None
+                                and parse_sections(''.join(parts['insight']), INSIGHT_SECTIONS) is not None)
+                    if not fused_ok:
+                        logger.info("流式合并生成的输出无法拆分，退回分析、报告分别生成")
+                        parts = {'insight': [], 'report': []}
+                        report_sections = None
+                        yield _sse_event('reset', {})
+                if not fused_ok:
+                    with span("analyze"):
+                        for text in analyzer.analyze_stream(topic, crawled_content, crawled_data, stop_event):
+                            parts['insight'].append(text)
+                            yield _sse_event('insight', {'text': text})
+                insight_result = ''.join(parts['insight'])
+                # 分析器和报告生成器在LLM出错时输出错误文本而不抛出异常，出错时推送错误事件且不保存结果
+                if insight_result.startswith(ANALYSIS_ERROR_PREFIX):
+                    yield _stream_error(insight_result)
+                    return
+                
+                # 第三步：生成报告（合并生成成功时已在上一步输出）
+                if not fused_ok:
+                    with span("report"):
+                        for text in reporter.generate_stream(topic, crawled_content, insight_result,
+                                                             crawled_data, stop_event):
+                            parts['report'].append(text)
+                            yield _sse_event('report', {'text': text})
+                report_result = ''.join(parts['report'])
+                # 约束解码的报告按小节标题输出，流结束后拆分为小节字段
+                if not fused_ok and config.LLM_STRUCTURED_OUTPUT:
+                    report_sections = parse_sections(report_result, REPORT_SECTIONS)
+                
+                if report_result.startswith(REPORT_ERROR_PREFIX):
+                    yield _stream_error(report_result)
+                    return
+                
+                # 在同一个事务中保存爬虫数据和分析记录
+                try:
+                    database.save_analysis_result(
+                        topic, 
+                        crawled_data, 
+                        crawled_content, 
+                        insight_result, 
+                        report_result,
+                        report_sections
+                    )
+                except Exception as e:
+                    logger.exception(f"保存分析结果到数据库时发生错误: {str(e)}")
+                
+                yield _sse_event('done', {
+                    'status': 'success',
+                    'topic': topic,
+                    'crawled_content': crawled_content,
+                    'sentiment': sentiment,
+                    'insight_result': insight_result,
+                    'report': report_result,
+                    'report_sections': report_sections
+                })
         except Exception as e:
-            logger.exception(f"保存分析记录到数据库时发生错误: {str(e)}")
-        
-        # 返回成功响应
+            logger.exception(f"流式分析过程中发生错误: {str(e)}")
+            yield _sse_event('error', {
+                'status': 'error',
+                'message': f'分析请求处理失败: {str(e)}'
+            })
+        finally:
+            stop_event.set()
+            release()
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # 生成器未开始迭代就被关闭时不会执行finally，在响应关闭时再释放一次
+    response.call_on_close(stop_event.set)
+    response.call_on_close(release)
+    return response
+
+@app.route('/jobs/<job_id>')
+def get_job_status(job_id):
+    """获取分析任务状态"""
+    initialize_app()
+    job = database.get_job(job_id)
+    if not job:
         return jsonify({
-            'status': 'success',
-            'topic': topic,
-            'crawled_content': crawled_content,
-            'insight_result': insight_result,
-            'report': report_result
-        })
-        
-    except Exception as e:
-        logger.exception(f"分析请求处理过程中发生未预期的错误: {str(e)}")
+            'status': 'error',
+            'message': '未找到指定的分析任务'
+        }), 404
+    
+    job.pop('result', None)
+    return jsonify({
+        'status': 'success',
+        'job': job,
+        'queue_depth': job_queue.depth()
+    })
+
+@app.route('/jobs/<job_id>/result')
+def get_job_result(job_id):
+    """获取分析任务结果"""
+    initialize_app()
+    job = database.get_job(job_id)
+    if not job:
         return jsonify({
             'status': 'error',
-            'message': f'分析请求处理失败: {str(e)}'
+            'message': '未找到指定的分析任务'
+        }), 404
+    
+    if job['status'] == 'failed':
+        return jsonify({
+            'status': 'error',
+            'message': f"分析任务失败: {job['error']}"
+        }), 500
+    
+    if job['status'] != 'succeeded':
+        return jsonify({
+            'status': 'pending',
+            'job_status': job['status']
+        }), 202
+    
+    result = json.loads(job['result'])
+    # 各阶段耗时明细只在请求 ?timings=1 时返回
+    if request.args.get('timings') not in ('1', 'true'):
+        result.pop('timings', None)
+    result['status'] = 'success'
+    return jsonify(result)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus格式的指标接口"""
+    initialize_app()
+    if not config.METRICS_ENABLED:
+        return jsonify({'status': 'error', 'message': '指标接口未启用'}), 404
+    return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready')
+def ready():
+    """就绪检查：模型加载并预热完成后返回200，否则返回503"""
+    initialize_app()
+    status = model_manager.status()
+    return jsonify({
+        'status': 'ready' if status['state'] == 'ready' else 'not_ready',
+        'model': status
+    }), 200 if status['state'] == 'ready' else 503
+
+@app.route('/monitors')
+def list_monitors():
+    """获取监控主题列表"""
+    initialize_app()
+    return jsonify({
+        'status': 'success',
+        'monitors': database.list_monitors()
+    })
+
+@app.route('/monitors', methods=['POST'])
+def add_monitor():
+    """添加监控主题，请求体: {"topic": ..., "interval": 秒}"""
+    data = request.get_json(silent=True) or {}
+    topic = str(data.get('topic', '')).strip()
+    if not topic:
+        return jsonify({
+            'status': 'error',
+            'message': '未提供监控主题'
+        }), 400
+    
+    try:
+        interval = int(data.get('interval') or 0)
+    except (TypeError, ValueError):
+        interval = 0
+    
+    initialize_app()
+    interval = interval if interval > 0 else config.MONITOR_DEFAULT_INTERVAL
+    if not database.save_monitor(topic, interval):
+        return jsonify({
+            'status': 'error',
+            'message': '保存监控主题失败'
         }), 500
+    topic_monitor.trigger(topic)
+    
+    return jsonify({
+        'status': 'success',
+        'topic': topic,
+        'interval': interval
+    }), 201
+
+@app.route('/monitors/<path:topic>', methods=['DELETE'])
+def remove_monitor(topic):
+    """移除监控主题"""
+    initialize_app()
+    if not database.delete_monitor(topic):
+        return jsonify({
+            'status': 'error',
+            'message': '未找到指定的监控主题'
+        }), 404
+    return jsonify({'status': 'success', 'topic': topic})
+
+@app.route('/monitors/<path:topic>/run', methods=['POST'])
+def run_monitor(topic):
+    """立即执行一轮监控（在后台调度线程中执行）"""
+    initialize_app()
+    if not topic_monitor.trigger(topic):
+        return jsonify({
+            'status': 'error',
+            'message': '未找到指定的监控主题'
+        }), 404
+    return jsonify({'status': 'scheduled', 'topic': topic}), 202
+
+@app.route('/history')
+def list_history():
+    """
+    分页获取分析历史记录
+    
+    查询参数: limit（每页条数）、cursor（上一页返回的next_cursor）、topic（按主题过滤）
+    """
+    initialize_app()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    topic = request.args.get('topic', '').strip() or None
+    
+    before = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            created_at, record_id = cursor.rsplit('|', 1)
+            before = (created_at, int(record_id))
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': '无效的分页游标'
+            }), 400
+    
+    records = database.get_analysis_history(limit, before=before, topic=topic)
+    next_cursor = None
+    if len(records) == limit:
+        last = records[-1]
+        next_cursor = f"{last['created_at']}|{last['id']}"
+    
+    return jsonify({
+        'status': 'success',
+        'records': records,
+        'next_cursor': next_cursor
+    })
+
+@app.route('/history/search')
+def search_history():
+    """
+    全文搜索分析历史记录
+    
+    查询参数: q（搜索关键词）、limit（返回条数）
+    """
+    initialize_app()
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            'status': 'error',
+            'message': '未提供搜索关键词'
+        }), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    
+    return jsonify({
+        'status': 'success',
+        'records': database.search_analysis_records(query, limit)
+    })
 
 @app.route('/history/<int:record_id>')
 def get_history_record(record_id):
     """获取历史记录详情"""
     try:
         initialize_app()
-        record = database.get_analysis_record(record_id)
+        # fields参数指定需要加载的正文字段，如 ?fields=report,insight_result
+        fields = request.args.get('fields')
+        if fields:
+            fields = tuple(field.strip() for field in fields.split(',') if field.strip())
+        record = database.get_analysis_record(record_id, fields or None)
         if not record:
             return jsonify({
                 'status': 'error',
                 'message': '未找到指定的历史记录'
             }), 404
+        
+        # 引用爬虫数据的记录在此格式化为文本，与旧记录保持相同的返回格式
+        crawled_items = record.pop('crawled_items', None)
+        if crawled_items is not None:
+            record['crawled_data'] = SimpleCrawler(config).format_crawled_data(crawled_items)
             
         return jsonify({
             'status': 'success',
@@ -161,4 +614,5 @@ def get_history_record(record_id):
 
 if __name__ == '__main__':
     initialize_app()
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # 关闭自动重载，避免重载器的父进程也预加载一份模型
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
\ No newline at end of file